@@ -1,114 +1,628 @@
 # analytics/calculations.py
 
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, delete, tuple_, case, literal, union_all
+
+from db.database import (
+    PendingConflict, consumption_staging, refresh_rollups, consumption_storage,
+    consumption_time_filters, misaligned_intervals, slot_of, floor_to_bucket, next_bucket, hp_condition,
+    read_hp_bounds, ROLLUP_TABLES, SLOT_SECONDS, DEFAULT_METER_ID
+)
+from db.aggregation import aggregated_select, read_aggregated, PANDAS_RESAMPLE_RULES
+from db.grid_cache import grid_exists, patch_grid, range_sums, GRID_CACHE_ENABLED
+from db.consumption_store import ensure_consumption_grid, get_backend, read_consumption, write_parquet_consumption
+from db.repository import read_consumption_arrays, read_consumption_values
+from analytics.metrics import is_hp_time
+from extraction.excel_extractor import ENEDIS_DATE_FORMAT
+
+# Format de stockage des DateTime SQLAlchemy sous SQLite
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Politiques de l'import "upsert" en cas d'intervalle déjà présent en base
+UPSERT_POLICIES = ("keep", "overwrite", "report")
+
+# Décisions possibles pour un conflit : garder la valeur existante ou prendre la nouvelle
+CONFLICT_CHOICES = ("existing", "new")
+
+# Table d'agrégats la plus grossière permettant chaque regroupement du tableau de bord
+ROLLUP_FOR_AGGREGATION = {"H": "H", "D": "D", "W": "D", "M": "M"}
+# Tables d'agrégats de la plus grossière à la plus fine, et leurs colonnes lues
+_ROLLUP_LEVELS = ("M", "D", "H")
+_ROLLUP_MEASURES = ('bucket', 'kwh_sum', 'kwh_min', 'kwh_max', 'row_count', 'kwh_hp', 'kwh_hc', 'hp_count')
+# Colonnes renvoyées par load_consumption_rollup
+_ROLLUP_COLUMNS = ['consumption_kwh', 'kwh_sum', 'kwh_min', 'kwh_max', 'row_count', 'kwh_hp', 'kwh_hc', 'is_hp']
 
-from db.database import ConsumptionRecord
+# Fusion de la table de staging dans consumption ("WHERE true" : requis par SQLite
+# pour lever l'ambiguïté entre INSERT ... SELECT et ON CONFLICT)
+_MERGE_STAGING_SQL = (
+    "INSERT INTO consumption (meter_id, start_time, end_time, consumption_kwh) "
+    "SELECT meter_id, start_time, end_time, consumption_kwh FROM consumption_staging WHERE true"
+)
+_ON_CONFLICT_CLAUSES = {
+    None: "",
+    "ignore": " ON CONFLICT (meter_id, start_time, end_time) DO NOTHING",
+    "update": " ON CONFLICT (meter_id, start_time, end_time) DO UPDATE SET consumption_kwh = excluded.consumption_kwh",
+}
+# Mêmes requêtes vers le schéma compact (CONSO_ELEC_COMPACT_STORAGE=1) : clé (meter_id, créneau)
+_MERGE_STAGING_COMPACT_SQL = (
+    "INSERT INTO consumption_slots (meter_id, slot, consumption_kwh) "
+    f"SELECT meter_id, CAST(strftime('%s', start_time) AS INTEGER) / {SLOT_SECONDS}, consumption_kwh "
+    "FROM consumption_staging WHERE true"
+)
+_ON_CONFLICT_COMPACT_CLAUSES = {
+    None: "",
+    "ignore": " ON CONFLICT (meter_id, slot) DO NOTHING",
+    "update": " ON CONFLICT (meter_id, slot) DO UPDATE SET consumption_kwh = excluded.consumption_kwh",
+}
 
-def import_data_to_db(df, session: Session):
+def parse_enedis_dataframe(df: pd.DataFrame, divisor: float = 1.0) -> pd.DataFrame:
     """
-    Importer les données d'un DataFrame dans la base de données,
-    en prenant 'Début', 'Fin' et 'Valeur (en kW)' comme colonnes Excel.
+    Convertit en une seule passe vectorisée les colonnes Excel 'Début', 'Fin'
+    et 'Valeur (en kW)' en un DataFrame typé (start_time, end_time, consumption_kwh).
+    La valeur est divisée par `divisor` (2.0 pour passer d'une puissance
+    moyenne sur 30 min à une énergie en kWh).
+    """
+    values = df['Valeur (en kW)']
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values.astype(str).str.replace(',', '.', regex=False))
+
+    return pd.DataFrame({
+        'start_time': _parse_enedis_datetimes(df['Début']).to_numpy(),
+        'end_time': _parse_enedis_datetimes(df['Fin']).to_numpy(),
+        'consumption_kwh': values.astype(float).to_numpy() / divisor,
+    })
+
+def _parse_enedis_datetimes(series: pd.Series) -> pd.Series:
+    """ Parse une colonne de dates au format Excel Enedis "dd/mm/YYYY HH:MM:SS". """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, format=ENEDIS_DATE_FORMAT)
+
+def _stage_records(session: Session, parsed: pd.DataFrame, meter_id: str) -> None:
     """
-    records = []
-    for _, row in df.iterrows():
-        # Récupérer les valeurs dans le DataFrame
-        start_str = row['Début']
-        end_str = row['Fin']
-        consumption_str = str(row['Valeur (en kW)']).replace(',', '.')
-
-        # Convertir en float la consommation
-        consumption = float(consumption_str)
-
-        # Parser les dates/heure ; votre Excel semble au format "dd/mm/YYYY HH:MM:SS"
-        start_time = datetime.strptime(start_str, "%d/%m/%Y %H:%M:%S")
-        end_time = datetime.strptime(end_str, "%d/%m/%Y %H:%M:%S")
-
-        # Créer l'objet pour SQLAlchemy
-        record = ConsumptionRecord(
-            start_time=start_time,
-            end_time=end_time,
-            consumption_kwh=consumption
+    Charge un DataFrame parsé dans la table temporaire consumption_staging,
+    pour le compteur `meter_id`.
+    La table temporaire vit hors du fichier principal : la remplir ne prend
+    pas le verrou d'écriture de la base lue par l'application Dash.
+    Les dates sont formatées en une passe vectorisée au format de stockage de
+    SQLAlchemy et insérées via l'executemany natif du driver SQLite.
+    """
+    connection = session.connection()
+    consumption_staging.create(connection, checkfirst=True)
+    connection.execute(consumption_staging.delete())
+
+    rows = zip(
+        [meter_id] * len(parsed),
+        parsed['start_time'].dt.strftime(SQLITE_DATETIME_FORMAT).tolist(),
+        parsed['end_time'].dt.strftime(SQLITE_DATETIME_FORMAT).tolist(),
+        parsed['consumption_kwh'].tolist()
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO consumption_staging (meter_id, start_time, end_time, consumption_kwh) VALUES (?, ?, ?, ?)",
+        list(rows)
+    )
+
+def _validate_staging(session: Session) -> None:
+    """
+    Vérifie les lignes en staging avant fusion : intervalles de temps cohérents et,
+    avec le schéma compact, demi-heures alignées sur les créneaux.
+    """
+    invalid = session.execute(
+        select(func.count()).select_from(consumption_staging).where(
+            consumption_staging.c.end_time <= consumption_staging.c.start_time
         )
-        records.append(record)
+    ).scalar()
+    if invalid:
+        raise ValueError(f"{invalid} lignes ont une fin antérieure ou égale à leur début : import annulé.")
+    if consumption_storage()['compact']:
+        misaligned = session.execute(
+            select(func.count()).select_from(consumption_staging).where(misaligned_intervals(consumption_staging))
+        ).scalar()
+        if misaligned:
+            raise ValueError(f"{misaligned} lignes ne sont pas des demi-heures alignées (schéma compact) : import annulé.")
 
-    # Insérer en base
-    session.bulk_save_objects(records)
+def _find_staging_conflicts(session: Session) -> list[dict]:
+    """
+    Compare la table de staging aux enregistrements existants par une jointure
+    SQL (index unique (meter_id, start_time, end_time), ou clé (meter_id, créneau)
+    du schéma compact) et retourne les conflits : même compteur et même
+    intervalle de temps, mais consommation différente.
+    """
+    storage = consumption_storage()
+    stored = storage['table']
+    if storage['compact']:
+        same_interval = (stored.c.meter_id == consumption_staging.c.meter_id) \
+            & (stored.c.slot == slot_of(consumption_staging.c.start_time))
+    else:
+        same_interval = (stored.c.meter_id == consumption_staging.c.meter_id) \
+            & (stored.c.start_time == consumption_staging.c.start_time) \
+            & (stored.c.end_time == consumption_staging.c.end_time)
+    rows = session.execute(
+        select(
+            consumption_staging.c.meter_id,
+            consumption_staging.c.start_time,
+            consumption_staging.c.end_time,
+            stored.c.consumption_kwh,
+            consumption_staging.c.consumption_kwh
+        ).join(stored, same_interval).where(
+            func.abs(stored.c.consumption_kwh - consumption_staging.c.consumption_kwh) >= 1e-6
+        ).order_by(consumption_staging.c.start_time)
+    ).all()
+    return [
+        {
+            'meter_id': meter_id,
+            'start_time': start_time,
+            'end_time': end_time,
+            'existing_value': existing_value,
+            'new_value': new_value
+        }
+        for meter_id, start_time, end_time, existing_value, new_value in rows
+    ]
+
+def _merge_staging(session: Session, on_conflict: str | None = None) -> None:
+    """
+    Fusionne la table de staging dans la table de stockage (consumption, ou
+    consumption_slots avec le schéma compact) par un unique INSERT ... SELECT,
+    met à jour les données dérivées de la plage fusionnée, puis valide la
+    transaction : le verrou d'écriture n'est tenu que le temps de cette fusion.
+    `on_conflict` ("ignore" ou "update") s'appuie sur l'index unique
+    (meter_id, start_time, end_time) ou sur la clé (meter_id, créneau).
+    """
+    connection = session.connection()
+    staged_ranges = connection.execute(
+        select(
+            consumption_staging.c.meter_id,
+            func.min(consumption_staging.c.start_time),
+            func.max(consumption_staging.c.start_time)
+        ).group_by(consumption_staging.c.meter_id)
+    ).all()
+    if consumption_storage()['compact']:
+        connection.exec_driver_sql(_MERGE_STAGING_COMPACT_SQL + _ON_CONFLICT_COMPACT_CLAUSES[on_conflict])
+    else:
+        connection.exec_driver_sql(_MERGE_STAGING_SQL + _ON_CONFLICT_CLAUSES[on_conflict])
+    connection.execute(consumption_staging.delete())
+    _after_consumption_change(connection, staged_ranges)
     session.commit()
+    _after_consumption_commit(session, staged_ranges)
+
+def _after_consumption_change(connection, changed_ranges) -> None:
+    """
+    Met à jour, dans la transaction d'import, les données dérivées de la
+    consommation pour chaque plage modifiée (meter_id, premier début, dernier début).
+    """
+    for meter_id, first_start, last_start in changed_ranges:
+        refresh_rollups(connection, meter_id, first_start, last_start)
+
+def _after_consumption_commit(session: Session, changed_ranges) -> None:
+    """
+    Reporte les plages validées (meter_id, premier début, dernier début) dans les
+    caches hors base existants : le cache en grille n'est complété qu'après le
+    commit, pour ne jamais exposer de valeurs annulées.
+    """
+    for meter_id, first_start, last_start in changed_ranges:
+        if grid_exists(meter_id):
+            series = read_consumption_arrays(session, meter_id, first_start, last_start, inclusive_end=True)
+            patch_grid(meter_id, series['start_time'], series['consumption_kwh'])
+
+def import_data_to_db(df, session: Session, meter_id: str = DEFAULT_METER_ID):
+    """
+    Importer les données d'un DataFrame dans la base de données,
+    en prenant 'Début', 'Fin' et 'Valeur (en kW)' comme colonnes Excel.
+    Les colonnes sont parsées en une passe vectorisée, chargées dans la table
+    de staging puis fusionnées dans consumption en une seule requête.
+    """
+    parsed = parse_enedis_dataframe(df)
+    if parsed.empty:
+        return
+
+    _stage_records(session, parsed, meter_id)
+    _validate_staging(session)
+    _merge_staging(session)
 
-def import_data_with_duplicates_management(df, session: Session):
+def import_data_with_duplicates_management(df, session: Session, meter_id: str = DEFAULT_METER_ID):
     """
     Importer les données d'un DataFrame dans la base de données
     tout en gérant les doublons :
-    - si un enregistrement (start_time, end_time) existe déjà
+    - si un enregistrement (meter_id, start_time, end_time) existe déjà
       et que la valeur est identique, on ignore.
-    - si un enregistrement (start_time, end_time) existe déjà
+    - si un enregistrement (meter_id, start_time, end_time) existe déjà
       mais la valeur diffère, on soulève une exception (ou on
       renvoie un signal) pour permettre une décision à l'utilisateur.
+
+    Les lignes sont chargées dans la table de staging, comparées aux
+    enregistrements existants par une jointure SQL, puis seules les nouvelles
+    sont fusionnées dans consumption, dans une transaction courte.
     """
-    conflicts = []
-
-    for _, row in df.iterrows():
-        start_str = row['Début']
-        end_str = row['Fin']
-        consumption_str = str(row['Valeur (en kW)']).replace(',', '.')
-        consumption = float(consumption_str) / 2.0
-
-        start_time = datetime.strptime(start_str, "%d/%m/%Y %H:%M:%S")
-        end_time = datetime.strptime(end_str, "%d/%m/%Y %H:%M:%S")
-
-        existing_record = session.query(ConsumptionRecord).filter(
-            ConsumptionRecord.start_time == start_time,
-            ConsumptionRecord.end_time == end_time
-        ).one_or_none()
-
-        if existing_record:
-            # Doublon potentiel
-            if abs(existing_record.consumption_kwh - consumption) < 1e-6:
-                # Les valeurs sont identiques, on ne fait rien
-                continue
-            else:
-                # Conflit : même intervalle de temps, mais consommation différente
-                conflicts.append({
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'existing_value': existing_record.consumption_kwh,
-                    'new_value': consumption
-                })
-        else:
-            # Nouvel enregistrement
-            record = ConsumptionRecord(
-                start_time=start_time,
-                end_time=end_time,
-                consumption_kwh=consumption
-            )
-            session.add(record)
-
-    # Commit tout ce qui n’est pas en conflit
-    session.commit()
+    parsed = parse_enedis_dataframe(df, divisor=2.0)
+    parsed = parsed.drop_duplicates(subset=['start_time', 'end_time'], keep='first')
+    if parsed.empty:
+        return []
+
+    _stage_records(session, parsed, meter_id)
+    _validate_staging(session)
+    conflicts = _find_staging_conflicts(session)
+
+    # Fusionne tout ce qui n’est pas déjà présent (les conflits gardent la valeur existante)
+    _merge_staging(session, on_conflict="ignore")
 
     return conflicts
 
-def calculate_total_consumption(session: Session, start_dt, end_dt) -> float:
-    """ Retourne la somme de la consommation sur la période [start_dt, end_dt). """
-    total = session.query(
-        func.sum(ConsumptionRecord.consumption_kwh)
-    ).filter(
-        ConsumptionRecord.start_time >= start_dt,
-        ConsumptionRecord.start_time < end_dt
-    ).scalar()
+def import_data_with_upsert(df, session: Session, policy: str = "keep", meter_id: str = DEFAULT_METER_ID):
+    """
+    Importer les données d'un DataFrame en s'appuyant sur l'index unique
+    (meter_id, start_time, end_time) et sur INSERT ... ON CONFLICT de SQLite.
+    Réimporter un export qui recouvre des données existantes est idempotent.
+
+    Politiques en cas d'intervalle déjà présent :
+    - "keep" : on conserve la valeur existante (DO NOTHING) ;
+    - "overwrite" : on remplace par la nouvelle valeur (DO UPDATE) ;
+    - "report" : on conserve la valeur existante et on renvoie les conflits
+      (même format que import_data_with_duplicates_management).
+    """
+    if policy not in UPSERT_POLICIES:
+        raise ValueError(f"Politique d'import inconnue : {policy} (attendu : {', '.join(UPSERT_POLICIES)})")
+
+    parsed = parse_enedis_dataframe(df, divisor=2.0)
+    parsed = parsed.drop_duplicates(subset=['start_time', 'end_time'], keep='first')
+    if parsed.empty:
+        return []
+
+    _stage_records(session, parsed, meter_id)
+    _validate_staging(session)
+    conflicts = _find_staging_conflicts(session) if policy == "report" else []
+    _merge_staging(session, on_conflict="update" if policy == "overwrite" else "ignore")
 
+    return conflicts
+
+def import_dataframe(df, session: Session, policy: str | None = None, meter_id: str = DEFAULT_METER_ID):
+    """
+    Importe un DataFrame Enedis du compteur `meter_id` selon le mode choisi :
+    gestion des doublons en Python si `policy` vaut None,
+    sinon import "upsert" avec la politique indiquée (voir UPSERT_POLICIES).
+    Retourne la liste des conflits.
+    """
+    if policy is None:
+        return import_data_with_duplicates_management(df, session, meter_id=meter_id)
+    return import_data_with_upsert(df, session, policy=policy, meter_id=meter_id)
+
+def _choose_for_conflict(conflict: dict, default_choice: str, range_choices) -> str:
+    """ Décision pour un conflit : choix explicite, sinon première plage qui le contient, sinon défaut. """
+    if conflict.get('choice') is not None:
+        return conflict['choice']
+    for range_start, range_end, choice in range_choices:
+        if range_start <= conflict['start_time'] < range_end:
+            return choice
+    return default_choice
+
+def _discard_pending_conflicts(session: Session, decided: list[dict]) -> None:
+    """ Retire de pending_conflicts les conflits enregistrés qui viennent d'être tranchés. """
+    if not decided:
+        return
+    keys = {(c['meter_id'], c['start_time'], c['end_time']) for c in decided}
+    session.execute(
+        delete(PendingConflict).where(
+            tuple_(PendingConflict.meter_id, PendingConflict.start_time, PendingConflict.end_time).in_(keys)
+        )
+    )
+
+def _resolve_parquet_conflicts(session: Session, chosen: list[dict]) -> int:
+    """
+    Applique les nouvelles valeurs retenues au stockage Parquet (écrasement des
+    seules dates encore présentes, comme l'UPDATE SQLite). Retourne leur nombre.
+    """
+    updated = 0
+    chosen_df = pd.DataFrame(chosen, columns=['meter_id', 'start_time', 'end_time', 'new_value'])
+    for meter_id, group in chosen_df.groupby('meter_id'):
+        group = group.astype({'start_time': 'datetime64[us]', 'end_time': 'datetime64[us]'})
+        existing = read_consumption(
+            session, meter_id, group['start_time'].min(), group['start_time'].max() + timedelta(microseconds=1),
+            backend="parquet"
+        )
+        present = group.merge(existing[['start_time', 'end_time']], on=['start_time', 'end_time'])
+        if present.empty:
+            continue
+        write_parquet_consumption(
+            session,
+            present[['start_time', 'end_time', 'new_value']].rename(columns={'new_value': 'consumption_kwh'}),
+            meter_id,
+            overwrite=True
+        )
+        updated += len(present)
+    return updated
+
+def resolve_conflicts(
+        session: Session,
+        conflicts: list[dict],
+        default_choice: str = "existing",
+        range_choices: list[tuple] | None = None,
+        backend: str | None = None
+) -> int:
+    """
+    Résout en masse une liste de conflits (format renvoyé par les fonctions d'import).
+
+    Pour chaque conflit, la décision est, par ordre de priorité :
+    - sa clé 'choice' si elle est renseignée ("existing" ou "new") ;
+    - la décision de la première plage (start, end, choice) de `range_choices`
+      qui contient son start_time (intervalle [start, end)) ;
+    - `default_choice` ("existing" = tout conserver, "new" = tout remplacer).
+
+    Les nouvelles valeurs retenues sont chargées dans une table temporaire puis
+    appliquées par un unique UPDATE ... FROM, suivi d'un seul commit (avec le
+    stockage Parquet : réécriture des partitions concernées). Les conflits
+    tranchés explicitement (choix ou plage) sont retirés de pending_conflicts.
+    Retourne le nombre d'enregistrements mis à jour.
+    """
+    range_choices = range_choices or []
+    for choice in [default_choice] + [c for _, _, c in range_choices] + [c.get('choice') for c in conflicts]:
+        if choice is not None and choice not in CONFLICT_CHOICES:
+            raise ValueError(f"Décision inconnue : {choice} (attendu : {', '.join(CONFLICT_CHOICES)})")
+
+    chosen = [
+        conflict for conflict in conflicts
+        if _choose_for_conflict(conflict, default_choice, range_choices) == "new"
+    ]
+    _discard_pending_conflicts(session, [
+        conflict for conflict in conflicts
+        if conflict.get('choice') is not None
+        or any(range_start <= conflict['start_time'] < range_end for range_start, range_end, _ in range_choices)
+    ])
+    if not chosen:
+        session.commit()
+        return 0
+    if get_backend(backend) == "parquet":
+        session.commit()
+        return _resolve_parquet_conflicts(session, chosen)
+
+    updates = [
+        (
+            conflict['meter_id'],
+            conflict['start_time'].strftime(SQLITE_DATETIME_FORMAT),
+            conflict['end_time'].strftime(SQLITE_DATETIME_FORMAT),
+            conflict['new_value']
+        )
+        for conflict in chosen
+    ]
+
+    connection = session.connection()
+    connection.exec_driver_sql(
+        "CREATE TEMP TABLE IF NOT EXISTS conflict_resolution "
+        "(meter_id VARCHAR NOT NULL, start_time DATETIME NOT NULL, end_time DATETIME NOT NULL, new_value FLOAT NOT NULL)"
+    )
+    connection.exec_driver_sql("DELETE FROM conflict_resolution")
+    connection.exec_driver_sql("INSERT INTO conflict_resolution VALUES (?, ?, ?, ?)", updates)
+    if consumption_storage()['compact']:
+        update_sql = (
+            "UPDATE consumption_slots SET consumption_kwh = r.new_value "
+            "FROM conflict_resolution AS r "
+            "WHERE consumption_slots.meter_id = r.meter_id "
+            f"AND consumption_slots.slot = CAST(strftime('%s', r.start_time) AS INTEGER) / {SLOT_SECONDS}"
+        )
+    else:
+        update_sql = (
+            "UPDATE consumption SET consumption_kwh = r.new_value "
+            "FROM conflict_resolution AS r "
+            "WHERE consumption.meter_id = r.meter_id "
+            "AND consumption.start_time = r.start_time AND consumption.end_time = r.end_time"
+        )
+    updated = connection.exec_driver_sql(update_sql).rowcount
+    changed_ranges = connection.exec_driver_sql(
+        "SELECT meter_id, MIN(start_time), MAX(start_time) FROM conflict_resolution GROUP BY meter_id"
+    ).all()
+    connection.exec_driver_sql("DELETE FROM conflict_resolution")
+    changed_ranges = [
+        (meter_id, datetime.strptime(first_start, SQLITE_DATETIME_FORMAT), datetime.strptime(last_start, SQLITE_DATETIME_FORMAT))
+        for meter_id, first_start, last_start in changed_ranges
+    ]
+    _after_consumption_change(connection, changed_ranges)
+    session.commit()
+    _after_consumption_commit(session, changed_ranges)
+    return updated
+
+def _is_hp(start_times: pd.Series, hp_start, hp_end) -> np.ndarray:
+    """ Demi-heures commençant en heures pleines [hp_start, hp_end) d'une série de débuts d'intervalle. """
+    return is_hp_time(pd.DatetimeIndex(start_times), hp_start, hp_end)
+
+def _read_parquet_consumption(session: Session, meter_id: str, start_dt=None, end_dt=None, inclusive_end: bool = False) -> pd.DataFrame:
+    """ Consommation du compteur lue dans le stockage Parquet sur [start_dt, end_dt) ou [start_dt, end_dt]. """
+    if inclusive_end and end_dt is not None:
+        end_dt = end_dt + timedelta(microseconds=1)
+    return read_consumption(session, meter_id, start_dt, end_dt, backend="parquet")
+
+def calculate_total_consumption(
+        session: Session,
+        start_dt,
+        end_dt,
+        meter_id: str = DEFAULT_METER_ID,
+        backend: str | None = None
+) -> float:
+    """
+    Retourne la somme de la consommation du compteur sur la période [start_dt, end_dt),
+    lue dans les sommes cumulées du cache en grille (deux lectures) lorsqu'il est activé,
+    sinon sommée par SQLite (comparaisons d'entiers avec le schéma compact) ou, avec
+    le stockage Parquet, sur les partitions lues.
+    """
+    backend = get_backend(backend)
+    if GRID_CACHE_ENABLED:
+        ensure_consumption_grid(session, meter_id, backend)
+        return range_sums(meter_id, start_dt, end_dt)['total']
+    if backend == "parquet":
+        return float(_read_parquet_consumption(session, meter_id, start_dt, end_dt)['consumption_kwh'].sum())
+
+    storage = consumption_storage()
+    total = session.execute(
+        select(func.sum(storage['consumption_kwh'])).where(
+            storage['meter_id'] == meter_id, *consumption_time_filters(start_dt, end_dt)
+        )
+    ).scalar()
     return total if total else 0.0
 
-def calculate_base_load(session: Session) -> float:
+def calculate_consumption_hp_hc(
+        session: Session,
+        start_dt,
+        end_dt,
+        meter_id: str = DEFAULT_METER_ID,
+        inclusive_end: bool = False,
+        backend: str | None = None,
+        hp_start=None,
+        hp_end=None
+) -> dict:
+    """
+    Consommation du compteur sur [start_dt, end_dt) (ou [start_dt, end_dt] si
+    `inclusive_end`) : {'total', 'hp', 'hc'} en kWh, heures pleines des demi-heures
+    commençant dans [hp_start, hp_end) (celles des paramètres par défaut). Lue dans
+    les sommes cumulées du cache en grille lorsqu'il est activé, sinon agrégée par
+    SQLite ou sur les partitions Parquet lues.
+    """
+    backend = get_backend(backend)
+    if hp_start is None or hp_end is None:
+        hp_start, hp_end = read_hp_bounds(session)
+    if GRID_CACHE_ENABLED:
+        ensure_consumption_grid(session, meter_id, backend, hp_start, hp_end)
+        return range_sums(meter_id, start_dt, end_dt, inclusive_end)
+    if backend == "parquet":
+        df = _read_parquet_consumption(session, meter_id, start_dt, end_dt, inclusive_end)
+        total = float(df['consumption_kwh'].sum())
+        hp = float(df['consumption_kwh'][_is_hp(df['start_time'], hp_start, hp_end)].sum())
+        return {'total': total, 'hp': hp, 'hc': total - hp}
+
+    storage = consumption_storage()
+    kwh = storage['consumption_kwh']
+    is_hp = hp_condition(storage['day_seconds'], hp_start, hp_end)
+    total, hp = session.execute(
+        select(
+            func.coalesce(func.sum(kwh), 0.0),
+            func.coalesce(func.sum(case((is_hp, kwh), else_=0.0)), 0.0)
+        ).where(storage['meter_id'] == meter_id, *consumption_time_filters(start_dt, end_dt, inclusive_end))
+    ).one()
+    return {'total': total, 'hp': hp, 'hc': total - hp}
+
+def calculate_base_load(session: Session, meter_id: str = DEFAULT_METER_ID, backend: str | None = None) -> float:
     """
-    Exemple de calcul du talon sur l'ensemble de la base.
+    Exemple de calcul du talon sur l'ensemble des données du compteur.
     """
-    records = session.query(ConsumptionRecord.consumption_kwh).all()
-    consumptions = [r[0] for r in records]
-    if not consumptions:
+    if get_backend(backend) == "parquet":
+        consumptions = _read_parquet_consumption(session, meter_id)['consumption_kwh'].to_numpy()
+    else:
+        consumptions = read_consumption_values(session, meter_id)
+    if not len(consumptions):
         return 0.0
-    consumptions.sort()
     index_5pct = int(len(consumptions) * 0.05)
-    return consumptions[index_5pct]
\ No newline at end of file
+    return float(np.partition(consumptions, index_5pct)[index_5pct])
+
+def _rollup_pieces(meter_id: str, levels: tuple[str, ...], start_dt, end_dt, hp_bounds: tuple) -> list:
+    """
+    SELECT (bucket, kwh_sum, kwh_min, kwh_max, row_count, kwh_hp, kwh_hc, hp_count)
+    couvrant exactement [start_dt, end_dt) : les périodes entières de la table
+    d'agrégats la plus grossière de `levels`, les bords partiels par les tables plus
+    fines puis, sous l'heure, par les demi-heures stockées (heures pleines
+    `hp_bounds`, celles des agrégats).
+    """
+    if start_dt >= end_dt:
+        return []
+    if not levels:
+        storage = consumption_storage()
+        kwh = storage['consumption_kwh']
+        is_hp = hp_condition(storage['day_seconds'], *hp_bounds)
+        return [select(
+            storage['start_time'].label('bucket'), kwh.label('kwh_sum'), kwh.label('kwh_min'), kwh.label('kwh_max'),
+            literal(1).label('row_count'), case((is_hp, kwh), else_=0.0).label('kwh_hp'),
+            case((is_hp, 0.0), else_=kwh).label('kwh_hc'), case((is_hp, 1), else_=0).label('hp_count')
+        ).where(storage['meter_id'] == meter_id, *consumption_time_filters(start_dt, end_dt))]
+
+    granularity, finer = levels[0], levels[1:]
+    full_start = floor_to_bucket(start_dt, granularity)
+    if full_start < start_dt:
+        full_start = next_bucket(full_start, granularity)
+    full_end = floor_to_bucket(end_dt, granularity)
+    if full_start >= full_end:
+        return _rollup_pieces(meter_id, finer, start_dt, end_dt, hp_bounds)
+
+    rollup = ROLLUP_TABLES[granularity]
+    return (
+        _rollup_pieces(meter_id, finer, start_dt, full_start, hp_bounds)
+        + [select(*[rollup.c[name] for name in _ROLLUP_MEASURES]).where(
+            rollup.c.meter_id == meter_id, rollup.c.bucket >= full_start, rollup.c.bucket < full_end
+        )]
+        + _rollup_pieces(meter_id, finer, full_end, end_dt, hp_bounds)
+    )
+
+def _resample_rollup(df: pd.DataFrame, aggregation: str, hp_bounds: tuple) -> pd.DataFrame:
+    """
+    Mêmes colonnes que load_consumption_rollup, calculées par pandas resample sur
+    des demi-heures lues hors de SQLite (stockage Parquet) ; périodes vides retirées.
+    """
+    kwh = df.set_index('start_time')['consumption_kwh']
+    is_hp = pd.Series(_is_hp(df['start_time'], *hp_bounds), index=kwh.index)
+    grouped = pd.DataFrame({
+        'kwh': kwh,
+        'kwh_hp': kwh.where(is_hp, 0.0),
+        'kwh_hc': kwh.where(~is_hp, 0.0),
+        'hp': is_hp.astype(float),
+    }).resample(PANDAS_RESAMPLE_RULES[aggregation])
+    rollup = pd.DataFrame({
+        'consumption_kwh': grouped['kwh'].mean(),
+        'kwh_sum': grouped['kwh'].sum(),
+        'kwh_min': grouped['kwh'].min(),
+        'kwh_max': grouped['kwh'].max(),
+        'row_count': grouped['kwh'].count(),
+        'kwh_hp': grouped['kwh_hp'].sum(),
+        'kwh_hc': grouped['kwh_hc'].sum(),
+        'is_hp': grouped['hp'].mean(),
+    }, columns=_ROLLUP_COLUMNS)
+    rollup = rollup[rollup['row_count'] > 0]
+    rollup.index.name = 'bucket'
+    return rollup
+
+def load_consumption_rollup(
+        session: Session,
+        meter_id: str,
+        aggregation: str,
+        start_dt,
+        end_dt,
+        backend: str | None = None
+) -> pd.DataFrame:
+    """
+    Charge la consommation du compteur sur [start_dt, end_dt], regroupée selon
+    `aggregation` (H, D, W ou M) : les périodes entièrement couvertes sont lues dans
+    la table d'agrégats la plus grossière qui le permet, les bords de la plage dans
+    les tables plus fines (puis les demi-heures), comme la météo de aggregate_weather.
+    Le regroupement (semaines à partir des jours) et l'étiquetage des périodes sont faits par SQLite.
+
+    L'index suit les étiquettes de pandas resample : début d'heure ou de jour,
+    dimanche de fin de semaine, dernier jour du mois. Colonnes : consumption_kwh
+    (moyenne des demi-heures, comme resample().mean()), kwh_sum, kwh_min, kwh_max,
+    row_count, kwh_hp, kwh_hc et is_hp (part des demi-heures en heures pleines,
+    celles des paramètres). Avec le stockage Parquet, mêmes colonnes calculées par
+    pandas sur les partitions lues.
+    """
+    hp_bounds = read_hp_bounds(session)
+    if get_backend(backend) == "parquet":
+        return _resample_rollup(
+            _read_parquet_consumption(session, meter_id, start_dt, end_dt, inclusive_end=True), aggregation, hp_bounds
+        )
+
+    levels = _ROLLUP_LEVELS[_ROLLUP_LEVELS.index(ROLLUP_FOR_AGGREGATION[aggregation]):]
+    # Fin incluse, comme aggregate_weather et les données brutes du tableau de bord
+    pieces = _rollup_pieces(meter_id, levels, start_dt, end_dt + timedelta(microseconds=1), hp_bounds)
+    if not pieces:
+        return pd.DataFrame(columns=_ROLLUP_COLUMNS, index=pd.DatetimeIndex([], name='bucket'))
+    rollup = union_all(*pieces).subquery()
+    row_count = func.sum(rollup.c.row_count)
+    return read_aggregated(session, aggregated_select(
+        rollup.c.bucket,
+        {
+            'consumption_kwh': func.sum(rollup.c.kwh_sum) / row_count,
+            'kwh_sum': func.sum(rollup.c.kwh_sum),
+            'kwh_min': func.min(rollup.c.kwh_min),
+            'kwh_max': func.max(rollup.c.kwh_max),
+            'row_count': row_count,
+            'kwh_hp': func.sum(rollup.c.kwh_hp),
+            'kwh_hc': func.sum(rollup.c.kwh_hc),
+            'is_hp': func.sum(rollup.c.hp_count) * 1.0 / row_count,
+        },
+        aggregation,
+    ))
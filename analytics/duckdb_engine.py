@@ -0,0 +1,207 @@
+# analytics/duckdb_engine.py
+"""
+Moteur SQL analytique embarqué (DuckDB, en processus, sans serveur), optionnel :
+
+    pip install "conso-elec[analytics]"
+
+Les séries de consommation et de météo du stockage configuré sont exposées
+dans DuckDB sous les vues `consumption` et `weather` :
+- stockage Parquet : lecture directe des fichiers partitionnés (read_parquet) ;
+- stockage SQLite : base attachée via l'extension sqlite de DuckDB, ou, si
+  l'extension n'est pas disponible (poste hors ligne), séries chargées une fois
+  via analytics.storage puis enregistrées dans DuckDB.
+
+Les totaux, talon, répartition HP/HC et métriques PV y sont calculés en SQL
+vectorisé, avec les mêmes définitions que analytics.metrics.
+"""
+
+import logging
+import os
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from analytics.storage import read_consumption, read_weather, STORAGE_BACKEND, WEATHER_VARIABLES
+from db.database import consumption_storage, SLOT_SECONDS, DEFAULT_METER_ID
+from db.parquet_store import PARQUET_STORE_DIR
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+DUCKDB_AVAILABLE = duckdb is not None
+
+# Passe à False au premier échec de l'extension sqlite (ex. téléchargement impossible),
+# pour ne pas retenter à chaque connexion
+_sqlite_extension_usable = True
+
+def connect_duckdb(session: Session, backend: str | None = None, parquet_root: str = PARQUET_STORE_DIR):
+    """
+    Ouvre une connexion DuckDB en mémoire exposant les vues `consumption`
+    (meter_id, start_time, end_time, consumption_kwh) et `weather` (time, variables météo).
+    """
+    if duckdb is None:
+        raise ImportError("DuckDB n'est pas installé : pip install \"conso-elec[analytics]\".")
+    backend = backend or STORAGE_BACKEND
+    con = duckdb.connect()
+
+    if backend == "parquet":
+        for dataset in ("consumption", "weather"):
+            dataset_dir = os.path.join(parquet_root, dataset)
+            if not os.path.isdir(dataset_dir):
+                con.register(dataset, _empty_frame(dataset))
+                continue
+            hive_types = ", hive_types = {'meter_id': VARCHAR}" if dataset == "consumption" else ""
+            con.execute(
+                f"CREATE VIEW {dataset} AS SELECT * FROM read_parquet('{os.path.join(dataset_dir, '**', '*.parquet')}', "
+                f"hive_partitioning = true{hive_types})"
+            )
+        return con
+
+    global _sqlite_extension_usable
+    db_file = session.get_bind().url.database
+    try:
+        if not _sqlite_extension_usable:
+            raise duckdb.IOException("échec précédent")
+        con.execute("INSTALL sqlite; LOAD sqlite")
+        con.execute(f"ATTACH '{db_file}' AS source (TYPE sqlite, READ_ONLY)")
+        if consumption_storage()['compact']:
+            # Schéma compact : début et fin reconstitués depuis le numéro de créneau
+            con.execute(
+                f"CREATE VIEW consumption AS SELECT meter_id, "
+                f"TIMESTAMP '1970-01-01' + to_seconds(slot * {SLOT_SECONDS}) AS start_time, "
+                f"TIMESTAMP '1970-01-01' + to_seconds((slot + 1) * {SLOT_SECONDS}) AS end_time, "
+                "consumption_kwh FROM source.consumption_slots"
+            )
+        else:
+            con.execute(
+                "CREATE VIEW consumption AS SELECT meter_id, CAST(start_time AS TIMESTAMP) AS start_time, "
+                "CAST(end_time AS TIMESTAMP) AS end_time, consumption_kwh FROM source.consumption"
+            )
+        con.execute("CREATE VIEW weather AS SELECT * REPLACE (CAST(time AS TIMESTAMP) AS time) FROM source.weather")
+    except duckdb.Error as error:
+        if _sqlite_extension_usable:
+            logging.warning(f"Extension sqlite de DuckDB indisponible ({str(error).splitlines()[0]}) : séries chargées en mémoire.")
+        _sqlite_extension_usable = False
+        consumption_df = read_consumption(session, meter_id=None, backend="sqlite")
+        weather_df = read_weather(session, backend="sqlite")
+        con.register("consumption", consumption_df.astype(_empty_frame("consumption").dtypes.to_dict()))
+        con.register("weather", weather_df.astype({name: float for name in WEATHER_VARIABLES}))
+    return con
+
+def _empty_frame(dataset: str) -> pd.DataFrame:
+    """ DataFrame vide typé, enregistré à la place d'un jeu de données absent. """
+    if dataset == "consumption":
+        columns = {'meter_id': 'string', 'start_time': 'datetime64[us]', 'end_time': 'datetime64[us]', 'consumption_kwh': float}
+    else:
+        columns = {'time': 'datetime64[us]', **{name: float for name in WEATHER_VARIABLES}}
+    return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in columns.items()})
+
+def _range_filter(start_dt, end_dt) -> tuple[str, list]:
+    """ Clause et paramètres du filtre de plage [start_dt, end_dt) sur start_time. """
+    clause, params = "", []
+    if start_dt is not None:
+        clause += " AND c.start_time >= ?"
+        params.append(start_dt)
+    if end_dt is not None:
+        clause += " AND c.start_time < ?"
+        params.append(end_dt)
+    return clause, params
+
+def _hp_condition(hp_start, hp_end) -> str:
+    """ Condition SQL "en heures pleines" sur c.start_time, la plage pouvant passer minuit. """
+    seconds = "(hour(c.start_time) * 3600 + minute(c.start_time) * 60 + second(c.start_time))"
+    start = hp_start.hour * 3600 + hp_start.minute * 60 + hp_start.second
+    end = hp_end.hour * 3600 + hp_end.minute * 60 + hp_end.second
+    if start < end:
+        return f"({seconds} >= {start} AND {seconds} < {end})"
+    return f"({seconds} >= {start} OR {seconds} < {end})"
+
+def total_consumption(con, start_dt, end_dt, meter_id: str = DEFAULT_METER_ID) -> float:
+    """ Équivalent de calculate_total_consumption. """
+    clause, params = _range_filter(start_dt, end_dt)
+    total = con.execute(
+        f"SELECT SUM(c.consumption_kwh) FROM consumption c WHERE c.meter_id = ?{clause}", [meter_id, *params]
+    ).fetchone()[0]
+    return total if total else 0.0
+
+def base_load(con, meter_id: str = DEFAULT_METER_ID, start_dt=None, end_dt=None) -> float:
+    """
+    Équivalent de calculate_base_load / compute_talon_on_df : valeur de rang
+    int(n * 0.05) dans la série triée (ORDER BY ... OFFSET).
+    """
+    clause, params = _range_filter(start_dt, end_dt)
+    value = con.execute(
+        f"""
+        SELECT consumption_kwh FROM (
+            SELECT c.consumption_kwh,
+                   ROW_NUMBER() OVER (ORDER BY c.consumption_kwh) - 1 AS rank,
+                   COUNT(*) OVER () AS n
+            FROM consumption c WHERE c.meter_id = ?{clause}
+        ) WHERE rank = CAST(FLOOR(n * 0.05) AS BIGINT)
+        """,
+        [meter_id, *params]
+    ).fetchone()
+    return value[0] if value else 0.0
+
+def compute_meter_metrics(
+        con,
+        meter_id: str,
+        hp_cost: float,
+        hc_cost: float,
+        hp_start,
+        hp_end,
+        solar_wc: float = 0.0,
+        solar_efficiency: float = 0.0,
+        start_dt=None,
+        end_dt=None
+) -> dict:
+    """
+    Calcule en SQL les métriques de compute_all_metrics et de compute_pv_metrics
+    (mêmes clés) pour le compteur, sur [start_dt, end_dt) : une agrégation
+    (consommation, HP/HC, PV joint à la météo) puis le talon.
+    """
+    clause, params = _range_filter(start_dt, end_dt)
+    pv_factor = (solar_wc / 1000) * (solar_efficiency / 100) / 1000
+    row = con.execute(
+        f"""
+        WITH series AS (
+            SELECT c.consumption_kwh AS kwh,
+                   {_hp_condition(hp_start, hp_end)} AS is_hp,
+                   COALESCE(w.shortwave_radiation, 0) * ? AS pv
+            FROM consumption c
+            LEFT JOIN weather w ON w.time = c.start_time
+            WHERE c.meter_id = ?{clause}
+        )
+        SELECT SUM(kwh),
+               SUM(kwh) FILTER (WHERE is_hp),
+               SUM(kwh) FILTER (WHERE NOT is_hp),
+               SUM(pv),
+               SUM(LEAST(kwh, pv)),
+               SUM(GREATEST(pv - kwh, 0)),
+               COUNT(*)
+        FROM series
+        """,
+        [pv_factor, meter_id, *params]
+    ).fetchone()
+    total_conso, kwh_hp, kwh_hc, pv_production, pv_used, pv_lost, rows = [value or 0.0 for value in row]
+    if not rows:
+        return {
+            "talon": 0.0, "total_conso": 0.0, "cost": 0.0, "cost_hp": 0.0, "cost_hc": 0.0,
+            "pv_production": 0.0, "pv_used": 0.0, "pv_lost": 0.0,
+            "auto_consumption_pct": 0.0, "coverage_pct": 0.0
+        }
+    cost_hp, cost_hc = kwh_hp * hp_cost, kwh_hc * hc_cost
+    return {
+        "talon": base_load(con, meter_id, start_dt, end_dt),
+        "total_conso": total_conso,
+        "cost": cost_hp + cost_hc,
+        "cost_hp": cost_hp,
+        "cost_hc": cost_hc,
+        "pv_production": pv_production,
+        "pv_used": pv_used,
+        "pv_lost": pv_lost,
+        "auto_consumption_pct": pv_used / pv_production * 100 if pv_production > 0 else 0.0,
+        "coverage_pct": pv_used / total_conso * 100 if total_conso > 0 else 0.0
+    }
@@ -0,0 +1,124 @@
+# analytics/fleet.py
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from analytics.metrics import compute_all_metrics, compute_pv_metrics
+from analytics.storage import read_consumption, read_weather, list_meters
+from db.database import get_engine, create_tables, get_session, get_or_create_settings, MeterSummary
+
+logging.basicConfig(level=logging.INFO)
+
+def _load_meter_frame(session, meter_id: str) -> pd.DataFrame:
+    """
+    Charge la consommation d'un compteur (index start_time) jointe au
+    rayonnement solaire, depuis le stockage configuré.
+    """
+    df = read_consumption(session, meter_id)[["start_time", "consumption_kwh"]]
+    if not df.empty:
+        weather = read_weather(
+            session, df["start_time"].min(), df["start_time"].max() + pd.Timedelta(minutes=30), ["shortwave_radiation"]
+        )
+        df = df.merge(weather.rename(columns={"time": "start_time"}), on="start_time", how="left")
+    else:
+        df["shortwave_radiation"] = pd.Series(dtype=float)
+    df["start_time"] = pd.to_datetime(df["start_time"])
+    return df.set_index("start_time")
+
+def _compute_partition(db_path: str, meter_ids: list[str], params: dict) -> list[dict]:
+    """
+    Calcule (dans un processus du pool) l'ensemble des métriques pour une partition
+    de compteurs, avec sa propre connexion à la base.
+    """
+    session = get_session(get_engine(db_path))
+    summaries = []
+    try:
+        for meter_id in meter_ids:
+            df = _load_meter_frame(session, meter_id)
+            metrics = compute_all_metrics(df, params["hp_cost"], params["hc_cost"], params["hp_start"], params["hp_end"])
+            summaries.append({
+                "meter_id": meter_id,
+                "row_count": len(df),
+                "start_time": df.index.min().to_pydatetime() if not df.empty else None,
+                "end_time": df.index.max().to_pydatetime() if not df.empty else None,
+                "talon": float(metrics["talon"]),
+                "total_conso": float(metrics["total_conso"]),
+                "cost": float(metrics["cost"]),
+                "cost_hp": float(metrics.get("cost_hp", 0.0)),
+                "cost_hc": float(metrics.get("cost_hc", 0.0)),
+                **compute_pv_metrics(df, params["solar_wc"], params["solar_efficiency"]),
+            })
+    finally:
+        session.close()
+    return summaries
+
+def _partition(items: list, n_parts: int) -> list[list]:
+    """ Répartit une liste en au plus `n_parts` partitions de tailles équilibrées. """
+    n_parts = max(1, min(n_parts, len(items)))
+    return [items[i::n_parts] for i in range(n_parts)]
+
+def run_fleet_analytics(
+        db_path: str = "sqlite:///consumption.db",
+        meter_ids: list[str] | None = None,
+        max_workers: int | None = None
+) -> dict:
+    """
+    Calcule les métriques complètes (talon, consommation, coûts HP/HC, PV) de
+    chaque compteur en répartissant les compteurs sur un pool de processus,
+    puis écrit le résultat dans la table meter_summary (une ligne par compteur).
+
+    Retourne {'meters', 'seconds', 'meters_per_second', 'summaries'}.
+    """
+    engine = get_engine(db_path)
+    create_tables(engine)
+    session = get_session(engine)
+    settings = get_or_create_settings(session)
+    params = {
+        "hp_cost": settings.hp_cost,
+        "hc_cost": settings.hc_cost,
+        "hp_start": settings.hp_start,
+        "hp_end": settings.hp_end,
+        "solar_wc": settings.solar_wc,
+        "solar_efficiency": settings.solar_efficiency,
+    }
+    if meter_ids is None:
+        meter_ids = list_meters(session)
+
+    start = time.perf_counter()
+    summaries = []
+    if meter_ids:
+        workers = max_workers or os.cpu_count() or 1
+        # Plusieurs partitions par processus pour lisser les écarts de taille entre compteurs
+        partitions = _partition(meter_ids, workers * 4)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_compute_partition, db_path, partition, params) for partition in partitions]
+            for future in as_completed(futures):
+                summaries.extend(future.result())
+
+    session.execute(MeterSummary.__table__.delete().where(MeterSummary.meter_id.in_(meter_ids)))
+    if summaries:
+        session.execute(MeterSummary.__table__.insert(), summaries)
+    session.commit()
+    session.close()
+
+    seconds = time.perf_counter() - start
+    meters_per_second = len(summaries) / seconds if seconds else 0.0
+    logging.info(f"{len(summaries)} compteurs analysés en {seconds:.2f} s ({meters_per_second:.1f} compteurs/s)")
+    return {
+        "meters": len(summaries),
+        "seconds": seconds,
+        "meters_per_second": meters_per_second,
+        "summaries": summaries,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcul parallèle des métriques de tous les compteurs.")
+    parser.add_argument("--db", default="sqlite:///consumption.db", help="URL de la base de données")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus")
+    args = parser.parse_args()
+
+    run_fleet_analytics(args.db, max_workers=args.workers)
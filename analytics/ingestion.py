@@ -0,0 +1,235 @@
+# analytics/ingestion.py
+
+import argparse
+import io
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from analytics.calculations import parse_enedis_dataframe, UPSERT_POLICIES
+from analytics.storage import read_consumption, write_consumption
+from db.database import ImportLedger, DEFAULT_METER_ID
+from extraction.file_reader import iter_consumption_chunks, iter_consumption_files_parallel, list_consumption_files
+from extraction.parsed_cache import compute_file_hash
+
+logging.basicConfig(level=logging.INFO)
+
+def find_ledger_entry(
+        session: Session,
+        file_hash: str,
+        sheet_index: int = 1,
+        meter_id: str = DEFAULT_METER_ID
+) -> ImportLedger | None:
+    """ Retourne l'entrée du registre d'import correspondant à ce fichier, s'il a déjà été importé pour ce compteur. """
+    return session.query(ImportLedger).filter(
+        ImportLedger.file_hash == file_hash,
+        ImportLedger.sheet_index == sheet_index,
+        ImportLedger.meter_id == meter_id
+    ).one_or_none()
+
+def _stored_mask(session: Session, parsed: pd.DataFrame, meter_id: str) -> pd.Series:
+    """
+    Lignes de `parsed` dont le créneau (meter_id, start_time) est déjà enregistré :
+    anti-jointure avec les débuts stockés sur la plage du fichier.
+    """
+    if parsed.empty:
+        return pd.Series(False, index=parsed.index)
+    first_start, last_start = parsed['start_time'].min(), parsed['start_time'].max()
+    # Fin de plage incluse
+    stored = read_consumption(session, meter_id, first_start, last_start + pd.Timedelta(microseconds=1))
+    return parsed['start_time'].isin(stored['start_time'])
+
+def _import_new_rows(
+        df: pd.DataFrame,
+        session: Session,
+        policy: str | None,
+        meter_id: str
+) -> dict:
+    """
+    Importe les lignes de `df` selon la politique d'import. Les créneaux déjà
+    enregistrés ne sont pas réécrits en mode "keep" ; avec les autres modes, ils
+    passent par la détection des conflits (None, "report") ou sont remplacés
+    ("overwrite"). `new_rows` compte les créneaux absents de la base.
+    Retourne {'rows', 'new_rows', 'conflicts', 'start_time', 'end_time'}.
+    """
+    parsed = parse_enedis_dataframe(df)
+    stored = _stored_mask(session, parsed, meter_id).to_numpy()
+
+    to_write = ~stored if policy == "keep" else np.ones(len(parsed), dtype=bool)
+    conflicts = []
+    if to_write.any():
+        conflicts = write_consumption(df[to_write], session, policy=policy, meter_id=meter_id)
+
+    return {
+        'rows': len(parsed),
+        'new_rows': int((~stored).sum()),
+        'conflicts': conflicts,
+        'start_time': parsed['start_time'].min() if not parsed.empty else None,
+        'end_time': parsed['end_time'].max() if not parsed.empty else None,
+    }
+
+def record_import(
+        session: Session,
+        file_hash: str,
+        file_name: str,
+        file_size: int,
+        sheet_index: int,
+        row_count: int,
+        start_time,
+        end_time,
+        meter_id: str = DEFAULT_METER_ID
+) -> ImportLedger:
+    """ Enregistre un fichier importé pour un compteur dans le registre. """
+    entry = ImportLedger(
+        file_hash=file_hash,
+        meter_id=meter_id,
+        file_name=file_name,
+        file_size=file_size,
+        sheet_index=sheet_index,
+        row_count=row_count,
+        start_time=start_time.to_pydatetime() if start_time is not None else None,
+        end_time=end_time.to_pydatetime() if end_time is not None else None,
+    )
+    session.add(entry)
+    session.commit()
+    return entry
+
+def import_file_with_ledger(
+        data: bytes,
+        file_name: str,
+        session: Session,
+        policy: str | None = None,
+        skip_rows: int | None = None,
+        sheet_index: int = 1,
+        meter_id: str = DEFAULT_METER_ID
+) -> dict:
+    """
+    Importe un export Enedis (.xlsx ou .csv, selon l'extension de `file_name`)
+    pour le compteur `meter_id`, en consultant le registre d'import :
+    - un fichier identique (même empreinte) est ignoré sans être parsé ;
+    - pour un fichier qui recouvre des imports précédents, les créneaux déjà
+      enregistrés sont comparés aux nouvelles valeurs (conflits) ou conservés
+      selon la politique, les autres sont ajoutés.
+
+    Retourne {'file_name', 'skipped', 'rows', 'new_rows', 'conflicts', 'preview'}.
+    """
+    result = {'file_name': file_name, 'skipped': False, 'rows': 0, 'new_rows': 0, 'conflicts': [], 'preview': None}
+
+    file_hash = compute_file_hash(data)
+    if find_ledger_entry(session, file_hash, sheet_index, meter_id) is not None:
+        result['skipped'] = True
+        return result
+
+    start_time, end_time = None, None
+    # Le cache Parquet évite de re-parser un XLSX (ex. réimport dans une base neuve)
+    for df in iter_consumption_chunks(io.BytesIO(data), file_name, skip_rows=skip_rows, sheet_index=sheet_index, file_hash=file_hash):
+        if result['preview'] is None:
+            result['preview'] = df.head()
+        chunk_result = _import_new_rows(df, session, policy, meter_id)
+        result['rows'] += chunk_result['rows']
+        result['new_rows'] += chunk_result['new_rows']
+        result['conflicts'].extend(chunk_result['conflicts'])
+        if chunk_result['start_time'] is not None:
+            start_time = min(start_time, chunk_result['start_time']) if start_time is not None else chunk_result['start_time']
+            end_time = max(end_time, chunk_result['end_time']) if end_time is not None else chunk_result['end_time']
+
+    record_import(session, file_hash, file_name, len(data), sheet_index, result['rows'], start_time, end_time, meter_id)
+    return result
+
+def import_folder(
+        folder_path: str,
+        session: Session,
+        policy: str | None = None,
+        skip_rows: int | None = None,
+        sheet_index: int = 1,
+        max_workers: int | None = None,
+        meter_id: str = DEFAULT_METER_ID
+) -> list[dict]:
+    """
+    Importe tous les exports Enedis (.xlsx, .csv) d'un dossier pour le compteur
+    `meter_id` : les fichiers déjà présents dans
+    le registre d'import sont ignorés avant parsing, le parsing des autres est
+    réparti sur un pool de processus et chaque fichier parsé est écrit en base
+    dès qu'il est disponible, par un unique écrivain (la session courante).
+
+    Retourne un rapport par fichier :
+    {'file_name', 'skipped', 'rows', 'new_rows', 'parse_seconds', 'import_seconds', 'conflicts', 'error'}.
+    """
+    report = []
+    to_parse = {}
+    for file_name in list_consumption_files(folder_path):
+        file_path = os.path.join(folder_path, file_name)
+        with open(file_path, "rb") as f:
+            data = f.read()
+        file_hash = compute_file_hash(data)
+        if find_ledger_entry(session, file_hash, sheet_index, meter_id) is not None:
+            logging.info(f"{file_name} : déjà importé, ignoré.")
+            report.append({
+                'file_name': file_name, 'skipped': True, 'rows': 0, 'new_rows': 0,
+                'parse_seconds': None, 'import_seconds': None, 'conflicts': [], 'error': None
+            })
+            continue
+        to_parse[file_path] = (file_hash, len(data))
+
+    for result in iter_consumption_files_parallel(list(to_parse), skip_rows, sheet_index, max_workers):
+        entry = {
+            'file_name': result['file_name'],
+            'skipped': False,
+            'rows': 0,
+            'new_rows': 0,
+            'parse_seconds': result['parse_seconds'],
+            'import_seconds': None,
+            'conflicts': [],
+            'error': result['error'],
+        }
+
+        if result['error'] is None:
+            start = time.perf_counter()
+            try:
+                import_result = _import_new_rows(result['df'], session, policy, meter_id)
+                file_hash, file_size = to_parse[result['file_path']]
+                record_import(
+                    session, file_hash, result['file_name'], file_size, sheet_index,
+                    import_result['rows'], import_result['start_time'], import_result['end_time'], meter_id
+                )
+                entry.update(
+                    rows=import_result['rows'],
+                    new_rows=import_result['new_rows'],
+                    conflicts=import_result['conflicts']
+                )
+            except Exception as e:
+                session.rollback()
+                entry['error'] = str(e)
+            entry['import_seconds'] = time.perf_counter() - start
+
+        if entry['error'] is None:
+            logging.info(
+                f"{entry['file_name']} : {entry['rows']} lignes ({entry['new_rows']} nouvelles), "
+                f"parsing {entry['parse_seconds']:.2f} s, import {entry['import_seconds']:.2f} s, "
+                f"{len(entry['conflicts'])} conflits"
+            )
+        else:
+            logging.error(f"{entry['file_name']} : échec de l'import ({entry['error']})")
+        report.append(entry)
+
+    return report
+
+if __name__ == "__main__":
+    from db.database import get_engine, create_tables, get_session
+
+    parser = argparse.ArgumentParser(description="Import parallèle d'un dossier d'exports Enedis (.xlsx, .csv).")
+    parser.add_argument("folder", help="Dossier contenant les exports Enedis")
+    parser.add_argument("--policy", choices=UPSERT_POLICIES, default=None,
+                        help="Politique upsert (par défaut : gestion des doublons avec signalement des conflits)")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus de parsing")
+    parser.add_argument("--meter", default=DEFAULT_METER_ID, help="Identifiant du compteur (PDL)")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    create_tables(engine)
+    session = get_session(engine)
+    import_folder(args.folder, session, policy=args.policy, max_workers=args.workers, meter_id=args.meter)
@@ -1,5 +1,7 @@
 # analytics/metrics.py
 
+import numpy as np
+
 def compute_cost_hp_hc(df, hp_cost, hc_cost, hp_start, hp_end):
     """
     Calcule le coût total selon que chaque enregistrement tombe en HP ou HC.
@@ -10,18 +12,10 @@ def compute_cost_hp_hc(df, hp_cost, hc_cost, hp_start, hp_end):
     if df.empty:
         return total_cost_hc, total_cost_hp, 0.0
 
-    for ts, row in df.iterrows():
-        time_of_day = ts.time()
-        if hp_start < hp_end:
-            in_hp = (time_of_day >= hp_start) and (time_of_day < hp_end)
-        else:
-            in_hp = (time_of_day >= hp_start) or (time_of_day < hp_end)
-
-        cost = row['consumption_kwh'] * (hp_cost if in_hp else hc_cost)
-        if in_hp:
-            total_cost_hp += cost
-        else:
-            total_cost_hc += cost
+    in_hp = is_hp_time(df.index, hp_start, hp_end)
+    consumption = df['consumption_kwh'].to_numpy()
+    total_cost_hp = float(consumption[in_hp].sum() * hp_cost)
+    total_cost_hc = float(consumption[~in_hp].sum() * hc_cost)
 
     total_cost = total_cost_hp + total_cost_hc
     return {
@@ -31,6 +25,21 @@ def compute_cost_hp_hc(df, hp_cost, hc_cost, hp_start, hp_end):
     }
 
 
+def is_hp_time(index, hp_start, hp_end):
+    """
+    Masque booléen (numpy) des horodatages de `index` (DatetimeIndex) situés
+    en heures pleines, la plage [hp_start, hp_end) pouvant passer minuit.
+    """
+    seconds = index.hour * 3600 + index.minute * 60 + index.second
+    start = hp_start.hour * 3600 + hp_start.minute * 60 + hp_start.second
+    end = hp_end.hour * 3600 + hp_end.minute * 60 + hp_end.second
+    if start < end:
+        in_hp = (seconds >= start) & (seconds < end)
+    else:
+        in_hp = (seconds >= start) | (seconds < end)
+    return np.asarray(in_hp)
+
+
 def compute_talon_on_df(df):
     """
     Exemple de calcul de talon : on prend le 5ᵉ percentile de la série
@@ -64,4 +73,34 @@ def compute_all_metrics(df, hp_cost, hc_cost, hp_start, hp_end):
         "cost": total_cost_val["total"],
         "cost_hp": total_cost_val["total_hp"],
         "cost_hc": total_cost_val["total_hc"]
-    }
\ No newline at end of file
+    }
+
+
+def compute_pv_metrics(df, solar_wc, solar_efficiency):
+    """
+    Calcule les métriques photovoltaïques à partir de la colonne
+    'shortwave_radiation' (W/m²) : production, part autoconsommée,
+    pertes (surproduction), taux d'autoconsommation et de couverture.
+    Même formule de production que le tableau de bord Dash.
+    """
+    if df.empty or "shortwave_radiation" not in df.columns:
+        return {
+            "pv_production": 0.0,
+            "pv_used": 0.0,
+            "pv_lost": 0.0,
+            "auto_consumption_pct": 0.0,
+            "coverage_pct": 0.0
+        }
+    production = (df["shortwave_radiation"].fillna(0).to_numpy() * (solar_wc / 1000) * (solar_efficiency / 100)) / 1000
+    consumption = df["consumption_kwh"].to_numpy()
+    used = np.minimum(consumption, production).sum()
+    total_pv = production.sum()
+    total_conso = consumption.sum()
+
+    return {
+        "pv_production": float(total_pv),
+        "pv_used": float(used),
+        "pv_lost": float(np.clip(production - consumption, 0, None).sum()),
+        "auto_consumption_pct": float(used / total_pv * 100) if total_pv > 0 else 0.0,
+        "coverage_pct": float(used / total_conso * 100) if total_conso > 0 else 0.0
+    }
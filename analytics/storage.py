@@ -0,0 +1,149 @@
+# analytics/storage.py
+"""
+API de lecture/écriture des séries de consommation et de météo, indépendante
+du stockage choisi par la variable d'environnement CONSO_ELEC_STORAGE_BACKEND :
+- "sqlite" (défaut) : tables consumption et weather, via les imports de
+  analytics.calculations (agrégats et données dérivées tenus à jour) ;
+- "parquet" : fichiers Parquet partitionnés par compteur, année et mois
+  (voir db.parquet_store), lus avec filtre sur la plage de dates.
+Le registre d'import et les paramètres restent dans la base SQLite. Le cache
+optionnel en grille de demi-heures (db.grid_cache) est complété après chaque écriture ;
+sa construction et la lecture de la consommation viennent de db.consumption_store,
+partagé avec analytics.calculations.
+"""
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from analytics.calculations import import_dataframe, parse_enedis_dataframe, UPSERT_POLICIES
+from db.database import Weather, get_meter_ids, DEFAULT_METER_ID
+from db.parquet_store import upsert_partitioned, read_partitioned, list_partition_values
+from db.grid_cache import read_grid, grid_frame, GRID_CACHE_ENABLED
+from db.consumption_store import (
+    read_consumption, write_parquet_consumption, ensure_consumption_grid, get_backend,
+    STORAGE_BACKENDS, STORAGE_BACKEND, CONSUMPTION_COLUMNS
+)
+from db.repository import read_consumption_frame, read_weather_arrays, read_weather_frame
+from db.aggregation import aggregate_weather, PANDAS_RESAMPLE_RULES
+
+WEATHER_VARIABLES = [column.name for column in Weather.__table__.columns if column.name not in ("id", "time")]
+
+def write_consumption(
+        df: pd.DataFrame,
+        session: Session,
+        policy: str | None = None,
+        meter_id: str = DEFAULT_METER_ID,
+        backend: str | None = None
+) -> list[dict]:
+    """
+    Enregistre un DataFrame Enedis ('Début', 'Fin', 'Valeur (en kW)') pour le
+    compteur, selon la politique d'import (voir import_dataframe).
+    Retourne les conflits (intervalles existants de valeur différente).
+    """
+    if get_backend(backend) == "sqlite":
+        return import_dataframe(df, session, policy=policy, meter_id=meter_id)
+
+    if policy is not None and policy not in UPSERT_POLICIES:
+        raise ValueError(f"Politique d'import inconnue : {policy} (attendu : {', '.join(UPSERT_POLICIES)})")
+    parsed = parse_enedis_dataframe(df, divisor=2.0)
+    parsed = parsed.drop_duplicates(subset=['start_time', 'end_time'], keep='first')
+    if parsed.empty:
+        return []
+    if (parsed['end_time'] <= parsed['start_time']).any():
+        raise ValueError("Des lignes ont une fin antérieure ou égale à leur début : import annulé.")
+
+    conflicts = write_parquet_consumption(session, parsed, meter_id, overwrite=policy == "overwrite")
+    # Comme import_dataframe : conflits renvoyés sans politique ou avec "report" seulement
+    if policy not in (None, "report"):
+        return []
+    return [
+        {
+            'meter_id': meter_id,
+            'start_time': row.start_time.to_pydatetime(),
+            'end_time': row.end_time.to_pydatetime(),
+            'existing_value': row.existing_value,
+            'new_value': row.new_value
+        }
+        for row in conflicts.itertuples(index=False)
+    ]
+
+def list_meters(session: Session, backend: str | None = None) -> list[str]:
+    """ Compteurs (PDL) pour lesquels des données de consommation existent. """
+    if get_backend(backend) == "parquet":
+        return list_partition_values("consumption", 'meter_id')
+    return get_meter_ids(session)
+
+def load_consumption_frame(
+        session: Session,
+        meter_id: str = DEFAULT_METER_ID,
+        start_dt=None,
+        end_dt=None,
+        inclusive_end: bool = False,
+        backend: str | None = None
+) -> pd.DataFrame:
+    """
+    Consommation du compteur en DataFrame indexé par start_time (colonne consumption_kwh),
+    sur [start_dt, end_dt) ou [start_dt, end_dt] si `inclusive_end`. Avec le cache en
+    grille activé (CONSO_ELEC_GRID_CACHE=1), lue dans le cache du compteur, construit
+    ou reconstruit depuis le stockage lorsqu'il manque ou a pris du retard.
+    """
+    backend = get_backend(backend)
+    if GRID_CACHE_ENABLED:
+        ensure_consumption_grid(session, meter_id, backend)
+        return grid_frame(read_grid(meter_id, start_dt, end_dt, inclusive_end))
+
+    if backend == "sqlite":
+        return read_consumption_frame(session, meter_id, start_dt, end_dt, inclusive_end)
+    if inclusive_end and end_dt is not None:
+        end_dt = end_dt + pd.Timedelta(microseconds=1)
+    df = read_consumption(session, meter_id, start_dt, end_dt, backend=backend)
+    return df.set_index('start_time')[['consumption_kwh']]
+
+def write_weather(weather_df: pd.DataFrame, session: Session, backend: str | None = None) -> None:
+    """ Enregistre des données météo (colonne 'time' et variables météo). """
+    if get_backend(backend) == "sqlite":
+        from extraction.weather import save_weather_data_to_db
+        save_weather_data_to_db(session, weather_df)
+        return
+    columns = ['time'] + [name for name in WEATHER_VARIABLES if name in weather_df.columns]
+    upsert_partitioned("weather", weather_df[columns], 'time', policy="overwrite")
+
+def read_weather(
+        session: Session,
+        start_dt=None,
+        end_dt=None,
+        variables: list[str] | None = None,
+        backend: str | None = None
+) -> pd.DataFrame:
+    """ Données météo sur [start_dt, end_dt), bornes optionnelles : colonne 'time' et `variables`. """
+    variables = WEATHER_VARIABLES if variables is None else variables
+    if get_backend(backend) == "parquet":
+        df = read_partitioned("weather", 'time', start_dt, end_dt).reindex(columns=['time'] + variables)
+        return df.astype({'time': 'datetime64[us]'})
+
+    return pd.DataFrame(read_weather_arrays(session, variables, start_dt, end_dt))
+
+def load_weather_frame(
+        session: Session,
+        variables: list[str],
+        start_dt,
+        end_dt,
+        aggregation: str | None = None,
+        backend: str | None = None
+) -> pd.DataFrame:
+    """
+    Variables météo sur [start_dt, end_dt] en DataFrame indexé par date, ou par
+    période si `aggregation` (H, D, W ou M) : moyennes regroupées par SQLite, ou
+    par pandas resample avec le stockage Parquet.
+    """
+    if get_backend(backend) == "sqlite":
+        if aggregation is not None:
+            return aggregate_weather(session, aggregation, start_dt, end_dt, variables)
+        return read_weather_frame(session, variables, start_dt, end_dt, inclusive_end=True)
+
+    df = read_weather(session, start_dt, end_dt + pd.Timedelta(microseconds=1), variables, backend).set_index('time')
+    if aggregation is None:
+        return df
+    df = df.resample(PANDAS_RESAMPLE_RULES[aggregation]).mean().dropna(how='all')
+    df.index.name = 'bucket'
+    return df
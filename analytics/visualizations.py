@@ -2,23 +2,24 @@
 
 import plotly.graph_objs as go
 from sqlalchemy.orm import Session
-from db.database import ConsumptionRecord
+from db.database import DEFAULT_METER_ID
+from db.repository import read_consumption_arrays
 from analytics.calculations import calculate_base_load
 
-def plot_consumption_over_time_plotly(session: Session):
+def plot_consumption_over_time_plotly(session: Session, meter_id: str = DEFAULT_METER_ID):
     """
-    Trace un graphique Plotly de la consommation
+    Trace un graphique Plotly de la consommation du compteur
     en fonction du temps (start_time).
     """
-    records = session.query(ConsumptionRecord).order_by(ConsumptionRecord.start_time).all()
-    if not records:
+    series = read_consumption_arrays(session, meter_id)
+    if not len(series['start_time']):
         return None
 
-    x = [r.start_time for r in records]
-    y = [r.consumption_kwh for r in records]
+    x = series['start_time']
+    y = series['consumption_kwh']
 
     # Calcul du talon, par exemple
-    base_load = calculate_base_load(session)
+    base_load = calculate_base_load(session, meter_id)
 
     # Création d'une figure Plotly
     fig = go.Figure()
@@ -41,8 +42,8 @@ def plot_consumption_over_time_plotly(session: Session):
     )
 
     # Mettre en évidence le point max
-    max_val = max(y)
-    max_index = y.index(max_val)
+    max_index = int(y.argmax())
+    max_val = y[max_index]
     max_time = x[max_index]
     fig.add_trace(go.Scatter(
         x=[max_time],
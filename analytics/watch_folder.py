@@ -0,0 +1,156 @@
+# analytics/watch_folder.py
+
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from analytics.calculations import UPSERT_POLICIES
+from analytics.ingestion import import_file_with_ledger
+from db.database import get_engine, create_tables, get_session, DEFAULT_METER_ID
+from extraction.file_reader import SUPPORTED_EXTENSIONS
+
+logging.basicConfig(level=logging.INFO)
+
+# Extensions des exports Enedis importés automatiquement
+WATCHED_EXTENSIONS = SUPPORTED_EXTENSIONS
+
+def is_importable_file(path: str) -> bool:
+    """
+    Indique si un fichier du dossier surveillé doit être importé
+    (on ignore les fichiers cachés et les fichiers de verrou Excel "~$...").
+    """
+    file_name = os.path.basename(path)
+    if file_name.startswith((".", "~$")):
+        return False
+    return file_name.lower().endswith(WATCHED_EXTENSIONS)
+
+class DropFolderHandler(FileSystemEventHandler):
+    """
+    Regroupe les événements d'écriture d'un même fichier : le fichier n'est mis
+    en file d'attente qu'après `debounce_seconds` sans nouvelle modification.
+    """
+
+    def __init__(self, files_queue: queue.Queue, debounce_seconds: float = 2.0):
+        super().__init__()
+        self.files_queue = files_queue
+        self.debounce_seconds = debounce_seconds
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._schedule(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._schedule(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._schedule(event.dest_path)
+
+    def _schedule(self, path: str) -> None:
+        if not is_importable_file(path):
+            return
+        with self._lock:
+            timer = self._timers.pop(path, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce_seconds, self._enqueue, args=[path])
+            timer.daemon = True
+            self._timers[path] = timer
+            timer.start()
+
+    def _enqueue(self, path: str) -> None:
+        with self._lock:
+            self._timers.pop(path, None)
+        self.files_queue.put(path)
+
+def _import_worker(files_queue: queue.Queue, db_path: str, policy: str | None, meter_id: str) -> None:
+    """
+    Importe un à un les fichiers mis en file d'attente, avec sa propre session.
+    Le registre d'import rend l'opération incrémentale : un fichier déjà importé
+    est ignoré et seules les nouvelles plages d'un fichier plus large sont traitées.
+    """
+    engine = get_engine(db_path)
+    create_tables(engine)
+    session = get_session(engine)
+
+    while True:
+        path = files_queue.get()
+        if path is None:
+            break
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            start = time.perf_counter()
+            result = import_file_with_ledger(data, os.path.basename(path), session, policy=policy, meter_id=meter_id)
+            if result['skipped']:
+                logging.info(f"{path} : déjà importé, ignoré.")
+            else:
+                logging.info(
+                    f"{path} : {result['new_rows']} nouvelles lignes sur {result['rows']}, "
+                    f"{len(result['conflicts'])} conflits ({time.perf_counter() - start:.2f} s)"
+                )
+        except Exception as e:
+            session.rollback()
+            logging.error(f"{path} : échec de l'import ({e})")
+        finally:
+            files_queue.task_done()
+
+    session.close()
+
+def run_watcher(
+        folder_path: str,
+        db_path: str = "sqlite:///consumption.db",
+        policy: str | None = None,
+        debounce_seconds: float = 2.0,
+        meter_id: str = DEFAULT_METER_ID
+) -> None:
+    """
+    Surveille un dossier de dépôt et importe automatiquement les nouveaux
+    exports Enedis pour le compteur `meter_id`. Les fichiers déjà présents au démarrage sont aussi
+    soumis (le registre d'import ignore ceux déjà importés).
+    Bloquant jusqu'à interruption (Ctrl+C).
+    """
+    files_queue = queue.Queue()
+    worker = threading.Thread(target=_import_worker, args=(files_queue, db_path, policy, meter_id), daemon=True)
+    worker.start()
+
+    for file_name in sorted(os.listdir(folder_path)):
+        path = os.path.join(folder_path, file_name)
+        if os.path.isfile(path) and is_importable_file(path):
+            files_queue.put(path)
+
+    observer = Observer()
+    observer.schedule(DropFolderHandler(files_queue, debounce_seconds), folder_path, recursive=False)
+    observer.start()
+    logging.info(f"Surveillance du dossier {folder_path} ...")
+    try:
+        while observer.is_alive():
+            observer.join(timeout=1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
+        files_queue.put(None)
+        worker.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import automatique des exports Enedis déposés dans un dossier.")
+    parser.add_argument("folder", help="Dossier de dépôt à surveiller")
+    parser.add_argument("--db", default="sqlite:///consumption.db", help="URL de la base de données")
+    parser.add_argument("--policy", choices=UPSERT_POLICIES, default=None,
+                        help="Politique upsert (par défaut : gestion des doublons avec signalement des conflits)")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Délai (s) sans écriture avant import")
+    parser.add_argument("--meter", default=DEFAULT_METER_ID, help="Identifiant du compteur (PDL)")
+    args = parser.parse_args()
+
+    run_watcher(args.folder, db_path=args.db, policy=args.policy, debounce_seconds=args.debounce, meter_id=args.meter)
@@ -1,17 +1,24 @@
-from db.database import ConsumptionRecord, Weather
-from extraction.weather import fetch_weather_data, resample_weather_data, save_weather_data_to_db
+from sqlalchemy import select
+
+from analytics.storage import read_consumption, read_weather, write_weather, STORAGE_BACKEND
+from db.database import Weather, consumption_storage
+from extraction.weather import fetch_weather_data, resample_weather_data
 
 def get_consumption_days(session):
     """
     Récupère les jours pour lesquels il existe des enregistrements de consommation.
     """
-    consumption_days = session.query(ConsumptionRecord.start_time).distinct().all()
+    if STORAGE_BACKEND == "parquet":
+        return set(read_consumption(session, meter_id=None)['start_time'].dt.date)
+    consumption_days = session.execute(select(consumption_storage()['start_time']).distinct()).all()
     return {record.start_time.date() for record in consumption_days}
 
 def get_weather_date(session):
     """
     Récupère les dates pour lesquelles il existe des données météo.
     """
+    if STORAGE_BACKEND == "parquet":
+        return set(read_weather(session, variables=[])['time'].dt.date)
     weather_dates = session.query(Weather.time).distinct().all()
     return {record.time.date() for record in weather_dates}
 
@@ -35,4 +42,4 @@ def integrate_weather_with_consumption(session, latitude, longitude):
     for day in days:
         weather_data = fetch_weather_data(latitude=latitude, longitude=longitude, start_date=day, end_date=day, variables=weather_data_to_collect())
         weather_resampled = resample_weather_data(weather_data)
-        save_weather_data_to_db(session, weather_resampled)
\ No newline at end of file
+        write_weather(weather_resampled, session)
\ No newline at end of file
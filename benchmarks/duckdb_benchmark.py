@@ -0,0 +1,115 @@
+# benchmarks/duckdb_benchmark.py
+"""
+Compare le calcul des métriques d'un compteur (talon, consommation, coûts HP/HC,
+PV) entre le chemin pandas actuel et le moteur DuckDB embarqué.
+
+    python -m benchmarks.duckdb_benchmark --years 10
+
+Les données (courbe de charge et rayonnement synthétiques au pas de 30 min)
+sont écrites dans une base SQLite et dans un stockage Parquet temporaires.
+Chemins mesurés :
+- pandas : lecture ORM ligne à ligne, jointure météo, compute_all_metrics + compute_pv_metrics ;
+- DuckDB sur SQLite : connexion (attache ou chargement de la base) puis calcul SQL ;
+- DuckDB sur Parquet : connexion (vues read_parquet) puis calcul SQL.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import time as day_time
+
+import numpy as np
+import pandas as pd
+
+from analytics.calculations import import_data_with_upsert, parse_enedis_dataframe
+from analytics.duckdb_engine import connect_duckdb, compute_meter_metrics
+from analytics.metrics import compute_all_metrics, compute_pv_metrics
+from benchmarks.synthetic_enedis import generate_enedis_frame
+from db.database import get_engine, create_tables, get_session, ConsumptionRecord, Weather, DEFAULT_METER_ID
+from db.parquet_store import upsert_partitioned
+
+PARAMS = {
+    "hp_cost": 0.27,
+    "hc_cost": 0.2068,
+    "hp_start": day_time(7, 15),
+    "hp_end": day_time(23, 30),
+    "solar_wc": 3000,
+    "solar_efficiency": 80.0,
+}
+
+def _prepare(work_dir: str, years: int):
+    """ Crée la base SQLite et le stockage Parquet avec `years` années de données. """
+    periods = 48 * 365 * years
+    df = generate_enedis_frame(start="2015-01-01", periods=periods)
+    engine = get_engine(f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+    create_tables(engine)
+    session = get_session(engine)
+    import_data_with_upsert(df, session)
+
+    times = pd.date_range("2015-01-01", periods=periods, freq="30min")
+    hours = times.hour.to_numpy() + times.minute.to_numpy() / 60
+    weather = pd.DataFrame({"time": times, "shortwave_radiation": np.clip(800 * np.sin((hours - 6) / 12 * np.pi), 0, None)})
+    session.execute(Weather.__table__.insert(), weather.to_dict(orient="records"))
+    session.commit()
+
+    parquet_root = os.path.join(work_dir, "parquet")
+    upsert_partitioned("consumption", parse_enedis_dataframe(df, divisor=2.0), "start_time", {"meter_id": DEFAULT_METER_ID}, root=parquet_root)
+    upsert_partitioned("weather", weather, "time", root=parquet_root)
+    return session, parquet_root, periods
+
+def _pandas_metrics(session) -> dict:
+    """ Chemin actuel : objets ORM, DataFrame, jointure météo, métriques pandas/numpy. """
+    records = session.query(ConsumptionRecord).filter(ConsumptionRecord.meter_id == DEFAULT_METER_ID).all()
+    df = pd.DataFrame({
+        "start_time": [r.start_time for r in records],
+        "consumption_kwh": [r.consumption_kwh for r in records],
+    }).set_index("start_time")
+    weather_records = session.query(Weather).all()
+    weather = pd.DataFrame({
+        "time": [w.time for w in weather_records],
+        "shortwave_radiation": [w.shortwave_radiation for w in weather_records],
+    }).set_index("time")
+    df = df.join(weather, how="left")
+    metrics = compute_all_metrics(df, PARAMS["hp_cost"], PARAMS["hc_cost"], PARAMS["hp_start"], PARAMS["hp_end"])
+    return {**metrics, **compute_pv_metrics(df, PARAMS["solar_wc"], PARAMS["solar_efficiency"])}
+
+def _duckdb_metrics(session, backend: str, parquet_root: str) -> tuple[dict, float]:
+    """ Connexion DuckDB puis calcul SQL ; retourne aussi la durée de la seule requête. """
+    con = connect_duckdb(session, backend=backend, parquet_root=parquet_root)
+    start = time.perf_counter()
+    metrics = compute_meter_metrics(con, DEFAULT_METER_ID, **PARAMS)
+    query_seconds = time.perf_counter() - start
+    con.close()
+    return metrics, query_seconds
+
+def run_benchmark(years: int, work_dir: str) -> list[dict]:
+    """ Mesure les trois chemins et vérifie qu'ils donnent les mêmes métriques. """
+    session, parquet_root, periods = _prepare(work_dir, years)
+    results = []
+
+    start = time.perf_counter()
+    reference = _pandas_metrics(session)
+    results.append({"path": "pandas (ORM)", "seconds": time.perf_counter() - start, "query_seconds": None, "metrics": reference})
+
+    for backend in ("sqlite", "parquet"):
+        start = time.perf_counter()
+        metrics, query_seconds = _duckdb_metrics(session, backend, parquet_root)
+        results.append({"path": f"duckdb ({backend})", "seconds": time.perf_counter() - start,
+                        "query_seconds": query_seconds, "metrics": metrics})
+
+    for result in results:
+        max_gap = max(abs(result["metrics"][key] - reference[key]) for key in reference)
+        query = f"{result['query_seconds']:8.3f} s" if result["query_seconds"] is not None else "       -  "
+        print(f"{years:>3} ans | {periods:>7} lignes | {result['path']:<18} | total {result['seconds']:8.3f} s | "
+              f"requête {query} | écart max {max_gap:.2e}", flush=True)
+    session.close()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark des métriques : pandas vs DuckDB.")
+    parser.add_argument("--years", type=int, default=10, help="Années de données au pas de 30 min")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_benchmark(args.years, tmp_dir)
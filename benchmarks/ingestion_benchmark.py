@@ -0,0 +1,109 @@
+# benchmarks/ingestion_benchmark.py
+"""
+Mesure les performances d'ingestion sur des classeurs Enedis synthétiques.
+
+    python -m benchmarks.ingestion_benchmark --sizes 1m 1y 10y
+
+Pour chaque taille : lecture du classeur (read_xlsx_and_return_df), import brut
+(import_data_to_db) et import avec gestion des doublons
+(import_data_with_duplicates_management) sur une base vide, partiellement
+recouvrante (moitié des données déjà présentes) et entièrement recouvrante.
+Chaque étape est exécutée une fois pour le temps, puis une fois sous
+tracemalloc pour le pic mémoire.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from analytics.calculations import import_data_to_db, import_data_with_duplicates_management
+from benchmarks.synthetic_enedis import generate_enedis_frame, write_enedis_workbook
+from db.database import get_engine, create_tables, get_session
+from extraction.excel_extractor import read_xlsx_and_return_df
+
+# Nombre de demi-heures par taille de fichier
+SIZES = {
+    "1m": 48 * 31,
+    "1y": 48 * 365,
+    "10y": 48 * 3652,
+}
+
+def _new_session(work_dir: str, name: str):
+    """ Crée une base SQLite neuve (fichier) et renvoie une session. """
+    db_file = os.path.join(work_dir, f"{name}.db")
+    engine = get_engine(f"sqlite:///{db_file}")
+    # Le moteur est partagé : ses connexions ouvertes sur l'ancien fichier sont fermées avant suppression
+    engine.dispose()
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    create_tables(engine)
+    return get_session(engine)
+
+def _measure(setup, step) -> tuple[float, float]:
+    """
+    Exécute `step(*setup())` une première fois pour le temps, puis une seconde
+    fois sous tracemalloc pour le pic mémoire. Retourne (secondes, pic en Mio).
+    """
+    args = setup()
+    start = time.perf_counter()
+    step(*args)
+    seconds = time.perf_counter() - start
+
+    args = setup()
+    tracemalloc.start()
+    step(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 2 ** 20
+
+def run_benchmarks(sizes: list[str], work_dir: str) -> list[dict]:
+    """ Lance tous les scénarios pour les tailles demandées et renvoie les résultats. """
+    results = []
+    for size in sizes:
+        periods = SIZES[size]
+        df = generate_enedis_frame(periods=periods)
+        workbook_path = os.path.join(work_dir, f"enedis_{size}.xlsx")
+        write_enedis_workbook(workbook_path, df)
+        half = df.iloc[: periods // 2]
+
+        def empty_db():
+            return (df, _new_session(work_dir, size))
+
+        def prefilled_db(prefill):
+            def setup():
+                session = _new_session(work_dir, size)
+                import_data_with_duplicates_management(prefill, session)
+                return (df, session)
+            return setup
+
+        scenarios = [
+            ("read_xlsx_and_return_df", lambda: (workbook_path,), lambda path: read_xlsx_and_return_df(path)),
+            ("import_data_to_db (base vide)", empty_db, import_data_to_db),
+            ("duplicates_management (base vide)", empty_db, import_data_with_duplicates_management),
+            ("duplicates_management (recouvrement 50 %)", prefilled_db(half), import_data_with_duplicates_management),
+            ("duplicates_management (recouvrement 100 %)", prefilled_db(df), import_data_with_duplicates_management),
+        ]
+        for name, setup, step in scenarios:
+            seconds, peak_mib = _measure(setup, step)
+            results.append({
+                "size": size,
+                "scenario": name,
+                "rows": periods,
+                "seconds": seconds,
+                "rows_per_second": periods / seconds if seconds else float("inf"),
+                "peak_mib": peak_mib,
+            })
+            print(f"{size:>4} | {name:<45} | {periods:>7} lignes | {seconds:8.3f} s | "
+                  f"{results[-1]['rows_per_second']:>10,.0f} lignes/s | {peak_mib:7.1f} Mio", flush=True)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark d'ingestion sur des classeurs Enedis synthétiques.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["1m", "1y"],
+                        help="Tailles de fichiers à mesurer (1m = 1 mois, 1y = 1 an, 10y = 10 ans)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_benchmarks(args.sizes, tmp_dir)
@@ -0,0 +1,109 @@
+# benchmarks/sqlite_profile_benchmark.py
+"""
+Mesure la latence des lectures pendant des imports concurrents, pour chaque
+profil de pragmas SQLite (SQLITE_PROFILES).
+
+    python -m benchmarks.sqlite_profile_benchmark --profiles default performance
+
+Pour chaque profil : une base est préremplie (une année au pas de 30 min), puis
+un processus séparé importe en boucle de nouvelles années (import_data_with_upsert,
+sur d'autres compteurs) pendant que le processus principal enchaîne des lectures
+(calculate_total_consumption sur un mois). On rapporte la médiane, le p95 et le
+maximum de la latence de lecture, ainsi que le nombre de lectures en échec
+("database is locked").
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from analytics.calculations import import_data_with_upsert, calculate_total_consumption
+from benchmarks.synthetic_enedis import generate_enedis_frame
+from db.database import get_engine, create_tables, get_session, SQLITE_PROFILES
+
+PERIODS = 48 * 365
+
+def _writer(db_url: str, profile: str, ready, stop, imports) -> None:
+    """ Importe des années complètes sur de nouveaux compteurs jusqu'à l'arrêt. """
+    session = get_session(get_engine(db_url, sqlite_profile=profile))
+    df = generate_enedis_frame(start="2023-01-01", periods=PERIODS, seed=1)
+    ready.set()
+    try:
+        while not stop.is_set():
+            import_data_with_upsert(df, session, meter_id=f"writer-{imports.value}")
+            imports.value += 1
+    finally:
+        session.close()
+
+def run_profile(profile: str, work_dir: str, reads: int) -> dict:
+    """ Lance le scénario lecture/écriture concurrent pour un profil et renvoie ses mesures. """
+    db_file = os.path.join(work_dir, f"{profile}.db")
+    db_url = f"sqlite:///{db_file}"
+    engine = get_engine(db_url, sqlite_profile=profile)
+    create_tables(engine)
+    session = get_session(engine)
+    import_data_with_upsert(generate_enedis_frame(start="2023-01-01", periods=PERIODS), session)
+
+    ready, stop = multiprocessing.Event(), multiprocessing.Event()
+    imports = multiprocessing.Value("i", 0)
+    writer = multiprocessing.Process(target=_writer, args=(db_url, profile, ready, stop, imports))
+    writer.start()
+    ready.wait()
+
+    latencies, failures = [], 0
+    try:
+        for i in range(reads):
+            month = i % 12 + 1
+            start_dt = datetime(2023, month, 1)
+            end_dt = datetime(2023, month + 1, 1) if month < 12 else datetime(2024, 1, 1)
+            start = time.perf_counter()
+            try:
+                calculate_total_consumption(session, start_dt, end_dt)
+                session.commit()
+            except OperationalError:
+                session.rollback()
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+    finally:
+        stop.set()
+        writer.join()
+        session.close()
+        engine.dispose()
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "profile": profile,
+        "reads": reads,
+        "imports": imports.value,
+        "median_ms": statistics.median(latencies_ms),
+        "p95_ms": latencies_ms[int(len(latencies_ms) * 0.95) - 1],
+        "max_ms": latencies_ms[-1],
+        "failures": failures,
+    }
+
+def run_benchmarks(profiles: list[str], work_dir: str, reads: int) -> list[dict]:
+    """ Mesure chacun des profils demandés et affiche une ligne par profil. """
+    results = []
+    for profile in profiles:
+        result = run_profile(profile, work_dir, reads)
+        results.append(result)
+        print(f"{profile:<12} | {result['reads']:>5} lectures | {result['imports']:>3} imports concurrents | "
+              f"médiane {result['median_ms']:8.2f} ms | p95 {result['p95_ms']:8.2f} ms | "
+              f"max {result['max_ms']:8.2f} ms | {result['failures']} échecs", flush=True)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latence de lecture SQLite pendant des imports concurrents.")
+    parser.add_argument("--profiles", nargs="+", choices=list(SQLITE_PROFILES), default=list(SQLITE_PROFILES),
+                        help="Profils de pragmas à comparer")
+    parser.add_argument("--reads", type=int, default=300, help="Nombre de lectures mesurées par profil")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_benchmarks(args.profiles, tmp_dir, args.reads)
@@ -0,0 +1,49 @@
+# benchmarks/synthetic_enedis.py
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from extraction.excel_extractor import ENEDIS_DATE_FORMAT
+
+def generate_enedis_frame(start: str = "2020-01-01", periods: int = 48 * 31, seed: int = 0) -> pd.DataFrame:
+    """
+    Génère une courbe de charge au pas de 30 min au format des exports Enedis :
+    colonnes 'Début', 'Fin' (texte "dd/mm/YYYY HH:MM:SS") et 'Valeur (en kW)'
+    (texte avec virgule décimale). Le profil combine un talon, un cycle
+    journalier, une saisonnalité hivernale et du bruit.
+    """
+    rng = np.random.default_rng(seed)
+    starts = pd.date_range(start, periods=periods, freq="30min")
+    hours = starts.hour.to_numpy() + starts.minute.to_numpy() / 60
+    day_of_year = starts.dayofyear.to_numpy()
+
+    base_load = 0.25
+    daily = 0.6 * np.exp(-((hours - 8) ** 2) / 4) + 1.1 * np.exp(-((hours - 20) ** 2) / 6)
+    seasonal = 0.5 * (1 + np.cos(2 * np.pi * day_of_year / 365))
+    values = base_load + daily * (1 + seasonal) + rng.gamma(2.0, 0.08, size=periods)
+
+    return pd.DataFrame({
+        "Début": starts.strftime(ENEDIS_DATE_FORMAT),
+        "Fin": (starts + pd.Timedelta(minutes=30)).strftime(ENEDIS_DATE_FORMAT),
+        "Valeur (en kW)": pd.Series(np.round(values, 3)).map(lambda v: f"{v:.3f}".replace(".", ",")),
+    })
+
+def write_enedis_workbook(path: str, df: pd.DataFrame, header_rows: int = 15) -> None:
+    """
+    Écrit un classeur au format Enedis : une première feuille d'informations,
+    puis la courbe de charge sur la seconde feuille, précédée de `header_rows`
+    lignes d'en-tête (lues par read_xlsx_and_return_df avec skip_rows=15).
+    """
+    workbook = Workbook(write_only=True)
+    info_sheet = workbook.create_sheet("Informations")
+    info_sheet.append(["Export de courbe de charge (données synthétiques)"])
+
+    sheet = workbook.create_sheet("Courbe de charge")
+    sheet.append(["Identifiant PRM", "00000000000000"])
+    for i in range(header_rows - 1):
+        sheet.append([f"Information {i + 1}"])
+    sheet.append(list(df.columns))
+    for row in df.itertuples(index=False):
+        sheet.append(list(row))
+    workbook.save(path)
@@ -7,8 +7,13 @@ import pandas as pd
 import datetime
 import dash_bootstrap_components as dbc
 
-from db.database import get_engine, get_session, ConsumptionRecord, Weather, get_or_create_settings
-from analytics.metrics import compute_talon_on_df
+from db.database import (
+    get_engine, session_scope, create_tables, get_or_create_settings
+)
+from analytics.calculations import load_consumption_rollup, calculate_consumption_hp_hc, ROLLUP_FOR_AGGREGATION
+from analytics.storage import load_consumption_frame, load_weather_frame, list_meters
+from db.grid_cache import GRID_CACHE_ENABLED
+from analytics.metrics import compute_talon_on_df, is_hp_time
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
 app.title = "Visualisation interactive - Dash"
@@ -247,63 +252,86 @@ def create_2column_card(title: str, val_col1: str, val_col2: str, help_text: str
 
 # -------------- LAYOUT --------------
 
-app.layout = dbc.Container(
-    [
-        dbc.Row(dbc.Col(html.H1("Visualisation interactive", className="text-center my-4 text-primary"))),
-
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    html.H5("Filtres", className="text-info"),
-                    html.Label("Date de début:", className="fw-bold"),
-                    dcc.DatePickerSingle(
-                        id='start-date',
-                        date=datetime.date(2024, 1, 1),
-                        display_format="DD/MM/YYYY",
-                        className="mb-3"
-                    ),
-                    html.Br(),
-                    html.Label("Date de fin:", className="fw-bold"),
-                    dcc.DatePickerSingle(
-                        id='end-date',
-                        date=datetime.date(2024, 1, 7),
-                        display_format="DD/MM/YYYY",
-                        className="mb-3"
-                    ),
-                    html.Br(),
-                    html.Label("Regrouper par :", className="fw-bold"),
-                    dcc.Dropdown(
-                        id='aggregation-dropdown',
-                        options=[
-                            {"label": "Brut (30 min)", "value": "30min"},
-                            {"label": "Heure", "value": "H"},
-                            {"label": "Jour", "value": "D"},
-                            {"label": "Semaine", "value": "W"},
-                            {"label": "Mois", "value": "M"},
-                        ],
-                        value="30min",
-                        clearable=False,
-                        className="mb-3"
-                    ),
-                    html.Br(),
-                    html.Label("Données météo à afficher :", className="fw-bold"),
-                    dcc.Checklist(
-                        id='weather-variables',
-                        options=[{"label": label, "value": key} for key, label in METEO_VARIABLES.items()],
-                        value=[],
-                        className="mb-3"
-                    )
-                ], className="bg-light p-3 rounded shadow-sm")
-            ], width=3),
-
-            dbc.Col(dcc.Graph(id='consumption-graph', config={'scrollZoom': True}), width=9),
-        ], className="my-3"),
-
-        dbc.Row(dbc.Col(html.Div(id='output-metrics'), className="mt-4")),
-        dbc.Row(id='extra-stats', className="mt-4")
-    ],
-    fluid=True
-)
+def serve_layout() -> dbc.Container:
+    """
+    Construit le layout à chaque chargement de page, pour proposer
+    les compteurs présents en base au moment de l'affichage.
+    """
+    with session_scope() as session:
+        meter_ids = list_meters(session)
+        default_meter = get_or_create_settings(session).meter_id
+    if default_meter not in meter_ids:
+        default_meter = meter_ids[0] if meter_ids else default_meter
+
+    return dbc.Container(
+        [
+            dbc.Row(dbc.Col(html.H1("Visualisation interactive", className="text-center my-4 text-primary"))),
+
+            dbc.Row([
+                dbc.Col([
+                    html.Div([
+                        html.H5("Filtres", className="text-info"),
+                        html.Label("Compteur (PDL) :", className="fw-bold"),
+                        dcc.Dropdown(
+                            id='meter-dropdown',
+                            options=[{"label": meter_id, "value": meter_id} for meter_id in meter_ids],
+                            value=default_meter,
+                            clearable=False,
+                            className="mb-3"
+                        ),
+                        html.Br(),
+                        html.Label("Date de début:", className="fw-bold"),
+                        dcc.DatePickerSingle(
+                            id='start-date',
+                            date=datetime.date(2024, 1, 1),
+                            display_format="DD/MM/YYYY",
+                            className="mb-3"
+                        ),
+                        html.Br(),
+                        html.Label("Date de fin:", className="fw-bold"),
+                        dcc.DatePickerSingle(
+                            id='end-date',
+                            date=datetime.date(2024, 1, 7),
+                            display_format="DD/MM/YYYY",
+                            className="mb-3"
+                        ),
+                        html.Br(),
+                        html.Label("Regrouper par :", className="fw-bold"),
+                        dcc.Dropdown(
+                            id='aggregation-dropdown',
+                            options=[
+                                {"label": "Brut (30 min)", "value": "30min"},
+                                {"label": "Heure", "value": "H"},
+                                {"label": "Jour", "value": "D"},
+                                {"label": "Semaine", "value": "W"},
+                                {"label": "Mois", "value": "M"},
+                            ],
+                            value="30min",
+                            clearable=False,
+                            className="mb-3"
+                        ),
+                        html.Br(),
+                        html.Label("Données météo à afficher :", className="fw-bold"),
+                        dcc.Checklist(
+                            id='weather-variables',
+                            options=[{"label": label, "value": key} for key, label in METEO_VARIABLES.items()],
+                            value=[],
+                            className="mb-3"
+                        )
+                    ], className="bg-light p-3 rounded shadow-sm")
+                ], width=3),
+
+                dbc.Col(dcc.Graph(id='consumption-graph', config={'scrollZoom': True}), width=9),
+            ], className="my-3"),
+
+            dbc.Row(dbc.Col(html.Div(id='output-metrics'), className="mt-4")),
+            dbc.Row(id='extra-stats', className="mt-4")
+        ],
+        fluid=True
+    )
+
+
+app.layout = serve_layout
 
 
 # -------------- CALLBACK --------------
@@ -315,6 +343,7 @@ app.layout = dbc.Container(
         Output('extra-stats', 'children')
     ],
     [
+        Input('meter-dropdown', 'value'),
         Input('start-date', 'date'),
         Input('end-date', 'date'),
         Input('aggregation-dropdown', 'value'),
@@ -322,65 +351,43 @@ app.layout = dbc.Container(
         Input('consumption-graph', 'relayoutData')
     ]
 )
-def update_graph_and_metrics(start_dt, end_dt, aggregation, weather_vars, relayout_data):
-    if not start_dt or not end_dt:
+def update_graph_and_metrics(meter_id, start_dt, end_dt, aggregation, weather_vars, relayout_data):
+    if not meter_id or not start_dt or not end_dt:
         return go.Figure(), "Veuillez sélectionner une période valide.", []
 
-    session = get_session(get_engine())
     s_date = datetime.datetime.fromisoformat(start_dt)
     e_date = datetime.datetime.fromisoformat(end_dt)
 
-    # 1) Données de consommation
-    records = session.query(ConsumptionRecord).filter(
-        ConsumptionRecord.start_time >= s_date,
-        ConsumptionRecord.start_time <= e_date
-    ).order_by(ConsumptionRecord.start_time).all()
-
-    if not records:
-        return go.Figure(), "Aucune donnée disponible pour cette période.", []
-
-    df = pd.DataFrame({
-        'start_time': [r.start_time for r in records],
-        'consumption_kwh': [r.consumption_kwh for r in records]
-    })
-    df.set_index('start_time', inplace=True)
-
-    # 2) Données météo
-    weather_records = session.query(Weather).filter(
-        Weather.time >= s_date,
-        Weather.time <= e_date
-    ).order_by(Weather.time).all()
-
-    if weather_records:
-        weather_df = pd.DataFrame([
-            {
-                "time": w.time,
-                **{key: getattr(w, key, None) for key in METEO_VARIABLES.keys()}
-            }
-            for w in weather_records
-        ])
-        weather_df.set_index('time', inplace=True)
-        df = df.join(weather_df, how='left')
-
-    # 3) Production PV
-    settings = get_or_create_settings(session)
-    df["solar_production"] = compute_solar_production(df, settings)
-
-    # 4) HP / HC
-    df["hour"] = df.index.hour
-    df["is_hp"] = df["hour"].apply(lambda x: True if 6 <= x < 22 else False)
-
-    # 5) Regroupement
-    if aggregation == "H":
-        df = df.resample("H").mean()
-    elif aggregation == "D":
-        df = df.resample("D").mean()
-    elif aggregation == "W":
-        df = df.resample("W").mean()
-    elif aggregation == "M":
-        df = df.resample("M").mean()
-
-    # 6) Zoom
+    # Session empruntée au pool du moteur partagé, rendue à la fin du chargement
+    with session_scope() as session:
+        # 1) Données de consommation : agrégats pré-calculés si un regroupement est demandé
+        if aggregation in ROLLUP_FOR_AGGREGATION:
+            df = load_consumption_rollup(session, meter_id, aggregation, s_date, e_date)
+        else:
+            df = load_consumption_frame(session, meter_id, s_date, e_date, inclusive_end=True)
+
+        if df.empty:
+            return go.Figure(), "Aucune donnée disponible pour cette période.", []
+
+        # 2) Données météo (regroupées comme la consommation)
+        weather_df = load_weather_frame(
+            session, list(METEO_VARIABLES.keys()), s_date, e_date,
+            aggregation if aggregation in ROLLUP_FOR_AGGREGATION else None
+        )
+
+        if not weather_df.empty:
+            df = df.join(weather_df, how='left')
+
+        # 3) Production PV
+        settings = get_or_create_settings(session)
+        df["solar_production"] = compute_solar_production(df, settings)
+
+    # 4) HP / HC des paramètres (les agrégats portent déjà la part d'heures pleines de chaque période)
+    if aggregation not in ROLLUP_FOR_AGGREGATION:
+        df["hour"] = df.index.hour
+        df["is_hp"] = is_hp_time(df.index, settings.hp_start, settings.hp_end)
+
+    # 5) Zoom
     if relayout_data and "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
         zoom_start = pd.to_datetime(relayout_data["xaxis.range[0]"])
         zoom_end = pd.to_datetime(relayout_data["xaxis.range[1]"])
@@ -390,7 +397,7 @@ def update_graph_and_metrics(start_dt, end_dt, aggregation, weather_vars, relayo
     else:
         df_zoom = df
 
-    # 7) TALO, PICS...
+    # 6) TALO, PICS...
     talon_value = compute_talon_on_df(df_zoom)  # Hypothétique
     peak_consumption = df_zoom["consumption_kwh"].max()
     peak_consumption_time = (
@@ -401,11 +408,26 @@ def update_graph_and_metrics(start_dt, end_dt, aggregation, weather_vars, relayo
         df_zoom["solar_production"].idxmax() if not df_zoom.empty else None
     )
 
-    # 8) Conso / Coût (SANS PV)
-    hp_consumption, hc_consumption, total_conso = compute_hp_hc_values(df_zoom, "consumption_kwh")
-    cost_hp, cost_hc, cost_no_pv = compute_cost_hp_hc(df_zoom, settings)
+    # 7) Conso / Coût (SANS PV) : en données brutes avec le cache en grille, totaux
+    # de la fenêtre lus dans ses sommes cumulées plutôt que re-sommés à chaque zoom
+    if aggregation not in ROLLUP_FOR_AGGREGATION and GRID_CACHE_ENABLED:
+        # Fenêtre zoomée rognée à la période chargée : le zoom peut déborder des données affichées
+        window_start, window_end = s_date, e_date
+        if df_zoom is not df:
+            window_start, window_end = max(zoom_start, pd.Timestamp(s_date)), min(zoom_end, pd.Timestamp(e_date))
+        with session_scope() as session:
+            sums = calculate_consumption_hp_hc(
+                session, window_start, window_end, meter_id, inclusive_end=True,
+                hp_start=settings.hp_start, hp_end=settings.hp_end
+            )
+        hp_consumption, hc_consumption, total_conso = sums['hp'], sums['hc'], sums['total']
+        cost_hp, cost_hc = hp_consumption * settings.hp_cost, hc_consumption * settings.hc_cost
+        cost_no_pv = cost_hp + cost_hc
+    else:
+        hp_consumption, hc_consumption, total_conso = compute_hp_hc_values(df_zoom, "consumption_kwh")
+        cost_hp, cost_hc, cost_no_pv = compute_cost_hp_hc(df_zoom, settings)
 
-    # 9) Conso / Coût (AVEC PV)
+    # 8) Conso / Coût (AVEC PV)
     hp_consumption_adj, hc_consumption_adj, total_conso_adj = (0, 0, 0)
     cost_hp_adj, cost_hc_adj, cost_with_pv = (0, 0, 0)
     if not df_zoom.empty:
@@ -417,13 +439,13 @@ def update_graph_and_metrics(start_dt, end_dt, aggregation, weather_vars, relayo
         hp_consumption_adj, hc_consumption_adj, total_conso_adj = compute_hp_hc_values(df_zoom_calc, "net_consumption")
         cost_hp_adj, cost_hc_adj, cost_with_pv = compute_cost_with_pv_hp_hc(df_zoom, settings)
 
-    # 10) Production solaire
+    # 9) Production solaire
     hp_production, hc_production, total_solar_production = compute_hp_hc_values(df_zoom, "solar_production")
 
-    # 11) Pertes solaires (kWh)
+    # 10) Pertes solaires (kWh)
     lost_hp_kwh, lost_hc_kwh, lost_total_kwh = compute_solar_loss_hp_hc(df_zoom)
 
-    # 12) Autres stats : autoconsommation + couverture + moyenne conso
+    # 11) Autres stats : autoconsommation + couverture + moyenne conso
     avg_consumption = df_zoom["consumption_kwh"].mean() if not df_zoom.empty else 0.0
     auto_consumption_pct = compute_auto_consumption_ratio(df_zoom)  # en %
     coverage_pct = compute_solar_coverage_ratio(df_zoom)            # en %
@@ -666,4 +688,6 @@ def update_graph_and_metrics(start_dt, end_dt, aggregation, weather_vars, relayo
 
 
 if __name__ == "__main__":
+    # Met à jour le schéma d'une base existante avant le premier affichage
+    create_tables(get_engine())
     app.run_server(debug=True, port=8050)
\ No newline at end of file
@@ -0,0 +1,63 @@
+# db/aggregation.py
+"""
+Construction de requêtes d'agrégation temporelle exécutées par SQLite :
+le regroupement par heure, jour, semaine ou mois et les sommes/moyennes par
+période sont calculés dans la base, qui ne renvoie qu'une ligne par période.
+"""
+
+import pandas as pd
+from sqlalchemy import select, func
+
+from db.database import Weather
+
+# Étiquette de période calculée par SQLite (strftime et modificateurs de date),
+# identique à celle de pandas resample : début d'heure, début de jour,
+# dimanche de fin de semaine (W-SUN), dernier jour du mois (ME)
+SQL_BUCKET_LABELS = {
+    "H": ('%Y-%m-%d %H:00:00',),
+    "D": ('%Y-%m-%d 00:00:00',),
+    "W": ('%Y-%m-%d 00:00:00', 'weekday 0'),
+    "M": ('%Y-%m-%d 00:00:00', 'start of month', '+1 month', '-1 day'),
+}
+
+# Mêmes périodes pour les séries lues hors de SQLite (stockage Parquet), en règles pandas resample
+PANDAS_RESAMPLE_RULES = {"H": "h", "D": "D", "W": "W-SUN", "M": "ME"}
+
+def bucket_label(time_column, aggregation: str):
+    """ Expression SQL de l'étiquette de période (H, D, W ou M) d'une colonne de dates. """
+    if aggregation not in SQL_BUCKET_LABELS:
+        raise ValueError(f"Regroupement inconnu : {aggregation} (attendu : {', '.join(SQL_BUCKET_LABELS)})")
+    label_format, *modifiers = SQL_BUCKET_LABELS[aggregation]
+    return func.strftime(label_format, time_column, *modifiers)
+
+def aggregated_select(time_column, measures: dict, aggregation: str, *filters):
+    """
+    Construit un SELECT regroupé par période : une colonne 'bucket' (étiquette
+    de période) puis une colonne par mesure {nom: expression d'agrégat SQL},
+    filtré par `filters` et trié par période.
+    """
+    bucket = bucket_label(time_column, aggregation).label('bucket')
+    return (
+        select(bucket, *[expression.label(name) for name, expression in measures.items()])
+        .where(*filters)
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+
+def read_aggregated(session, statement) -> pd.DataFrame:
+    """ Exécute une requête de aggregated_select et renvoie un DataFrame indexé par période. """
+    result = session.execute(statement)
+    df = pd.DataFrame(result.all(), columns=list(result.keys()))
+    df['bucket'] = pd.to_datetime(df['bucket'])
+    return df.set_index('bucket')
+
+def aggregate_weather(session, aggregation: str, start_dt, end_dt, variables: list[str]) -> pd.DataFrame:
+    """ Moyenne par période des variables météo demandées sur [start_dt, end_dt]. """
+    weather = Weather.__table__
+    return read_aggregated(session, aggregated_select(
+        weather.c.time,
+        {name: func.avg(weather.c[name]) for name in variables},
+        aggregation,
+        weather.c.time >= start_dt,
+        weather.c.time <= end_dt,
+    ))
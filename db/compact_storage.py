@@ -0,0 +1,112 @@
+# db/compact_storage.py
+"""
+Schéma compact de la consommation (table consumption_slots, WITHOUT ROWID,
+clé (meter_id, créneau de 30 min)) : lecture et mesure de taille.
+
+    CONSO_ELEC_COMPACT_STORAGE=1 python -m db.compact_storage [--db sqlite:///consumption.db] [--vacuum]
+
+Avec la variable d'environnement CONSO_ELEC_COMPACT_STORAGE=1, consumption_slots
+remplace la table consumption comme stockage de la consommation : migrate_schema
+y déplace les lignes existantes (et les ramène dans consumption si la variable
+est retirée), imports, conflits, agrégats et lectures passent par elle. Lancer
+la commande avec puis sans la variable (et --vacuum) compare les deux schémas.
+"""
+
+import argparse
+import logging
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+
+from db.database import (
+    get_engine, create_tables, get_session, consumption_slots, consumption_storage,
+    slot_range, SLOT_SECONDS, DEFAULT_DB_URL, DEFAULT_METER_ID
+)
+
+logging.basicConfig(level=logging.INFO)
+
+def load_compact_consumption(session, meter_id: str, start_dt: datetime, end_dt: datetime) -> pd.DataFrame:
+    """
+    Charge depuis la table compacte la consommation du compteur sur [start_dt, end_dt),
+    avec les colonnes start_time, end_time (reconstituées depuis le créneau) et consumption_kwh.
+    """
+    first_slot, end_slot = slot_range(start_dt, end_dt)
+    rows = session.execute(
+        select(consumption_slots.c.slot, consumption_slots.c.consumption_kwh).where(
+            consumption_slots.c.meter_id == meter_id,
+            consumption_slots.c.slot >= first_slot,
+            consumption_slots.c.slot < end_slot
+        ).order_by(consumption_slots.c.slot)
+    ).all()
+    df = pd.DataFrame(rows, columns=['slot', 'consumption_kwh'])
+    df['start_time'] = pd.to_datetime(df['slot'] * SLOT_SECONDS, unit='s')
+    df['end_time'] = df['start_time'] + pd.Timedelta(seconds=SLOT_SECONDS)
+    return df[['start_time', 'end_time', 'consumption_kwh']]
+
+def table_sizes(engine) -> dict:
+    """
+    Taille sur disque (octets) de chaque table et index, via la table virtuelle
+    dbstat de SQLite. Retourne un dictionnaire vide si dbstat n'est pas disponible.
+    """
+    try:
+        with engine.connect() as conn:
+            return dict(conn.exec_driver_sql("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").all())
+    except OperationalError:
+        return {}
+
+def compare_storage(engine, meter_id: str = DEFAULT_METER_ID) -> dict:
+    """
+    Taille des deux schémas (table consumption et ses index, table compacte), dont
+    un seul contient les données, et durée d'une somme sur toute la plage du
+    compteur dans le stockage actif.
+    """
+    sizes = table_sizes(engine)
+    consumption_bytes = sum(
+        size for name, size in sizes.items()
+        if name == 'consumption' or name == 'ux_consumption_meter_interval' or name.startswith('ix_consumption_')
+    )
+    compact_bytes = sum(size for name, size in sizes.items() if 'consumption_slots' in name)
+
+    storage = consumption_storage()
+    session = get_session(engine)
+    try:
+        first, last = session.execute(
+            select(func.min(storage['time_key']), func.max(storage['time_key'])).where(storage['meter_id'] == meter_id)
+        ).one()
+        timings = {}
+        if first is not None:
+            start = time.perf_counter()
+            session.execute(select(func.sum(storage['consumption_kwh'])).where(
+                storage['meter_id'] == meter_id, storage['time_key'] >= first, storage['time_key'] <= last
+            )).scalar()
+            timings['sum_seconds'] = time.perf_counter() - start
+    finally:
+        session.close()
+
+    return {
+        'storage': 'consumption_slots' if storage['compact'] else 'consumption',
+        'consumption_bytes': consumption_bytes, 'compact_bytes': compact_bytes, **timings
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesure la taille des schémas de stockage de la consommation.")
+    parser.add_argument("--db", default=DEFAULT_DB_URL, help="URL de la base de données (SQLite)")
+    parser.add_argument("--meter", default=DEFAULT_METER_ID, help="Compteur (PDL) utilisé pour la mesure de durée")
+    parser.add_argument("--vacuum", action="store_true", help="Rend au système de fichiers la place libérée par un déplacement")
+    args = parser.parse_args()
+
+    engine = get_engine(args.db)
+    # Déplace la consommation dans le stockage choisi par CONSO_ELEC_COMPACT_STORAGE
+    create_tables(engine)
+    if args.vacuum:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+    for key, value in compare_storage(engine, args.meter).items():
+        if isinstance(value, float):
+            value = f"{value:,.4f}"
+        elif isinstance(value, int):
+            value = f"{value:,}"
+        logging.info(f"{key}: {value}")
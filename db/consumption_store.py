@@ -0,0 +1,106 @@
+# db/consumption_store.py
+"""
+Lecture de la consommation dans le stockage choisi par la variable d'environnement
+CONSO_ELEC_STORAGE_BACKEND ("sqlite" par défaut, ou "parquet"), écriture dans le
+stockage Parquet, et construction du cache en grille (db.grid_cache) depuis ce
+même stockage.
+
+Module placé sous analytics.calculations et analytics.storage (il n'importe que
+db.*) : les deux s'appuient sur les mêmes routines, quel que soit le stockage.
+"""
+
+import os
+from datetime import time
+
+import pandas as pd
+
+from db.database import read_hp_bounds, DEFAULT_METER_ID
+from db.grid_cache import ensure_grid, grid_exists, patch_grid
+from db.parquet_store import read_partitioned, upsert_partitioned
+from db.repository import read_consumption_arrays, read_consumption_fingerprint
+
+STORAGE_BACKENDS = ("sqlite", "parquet")
+STORAGE_BACKEND = os.environ.get("CONSO_ELEC_STORAGE_BACKEND", "sqlite")
+
+CONSUMPTION_COLUMNS = ['meter_id', 'start_time', 'end_time', 'consumption_kwh']
+
+def get_backend(backend: str | None) -> str:
+    """ Stockage demandé, celui de CONSO_ELEC_STORAGE_BACKEND par défaut. """
+    backend = backend or STORAGE_BACKEND
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Stockage inconnu : {backend} (attendu : {', '.join(STORAGE_BACKENDS)})")
+    return backend
+
+def read_consumption(
+        session,
+        meter_id: str | None = DEFAULT_METER_ID,
+        start_dt=None,
+        end_dt=None,
+        backend: str | None = None
+) -> pd.DataFrame:
+    """
+    Consommation du compteur (tous les compteurs si None) sur [start_dt, end_dt),
+    bornes optionnelles, triée par date : colonnes meter_id, start_time, end_time, consumption_kwh.
+    """
+    if get_backend(backend) == "parquet":
+        partition_values = {'meter_id': meter_id} if meter_id is not None else {}
+        df = read_partitioned(
+            "consumption", 'start_time', start_dt, end_dt, partition_values,
+            partition_keys=['meter_id'], columns=CONSUMPTION_COLUMNS
+        )
+        return df.astype({'start_time': 'datetime64[us]', 'end_time': 'datetime64[us]', 'consumption_kwh': float})
+
+    return pd.DataFrame(read_consumption_arrays(session, meter_id, start_dt, end_dt, columns=tuple(CONSUMPTION_COLUMNS)))
+
+def write_parquet_consumption(session, parsed: pd.DataFrame, meter_id: str, overwrite: bool = False) -> pd.DataFrame:
+    """
+    Écrit dans le stockage Parquet les lignes parsées (start_time, end_time,
+    consumption_kwh) du compteur : une date déjà présente garde sa valeur, ou prend
+    la nouvelle si `overwrite`. Le cache en grille existant est complété des valeurs
+    conservées. Retourne les lignes existantes de valeur différente (start_time,
+    end_time, existing_value, new_value).
+    """
+    conflicts = upsert_partitioned(
+        "consumption", parsed, 'start_time', {'meter_id': meter_id},
+        policy="overwrite" if overwrite else "keep", compare_column='consumption_kwh'
+    )
+    if grid_exists(meter_id):
+        # Valeurs effectivement conservées sur la plage écrite (fin incluse)
+        stored = read_consumption(
+            session, meter_id, parsed['start_time'].min(), parsed['start_time'].max() + pd.Timedelta(microseconds=1),
+            backend="parquet"
+        )
+        patch_grid(meter_id, stored['start_time'].to_numpy(), stored['consumption_kwh'].to_numpy())
+    return conflicts.merge(parsed[['start_time', 'end_time']], on='start_time')
+
+def consumption_fingerprint(session, meter_id: str = DEFAULT_METER_ID, backend: str | None = None) -> tuple[int, float]:
+    """ Nombre de lignes et somme de la consommation du compteur dans le stockage (empreinte du cache en grille). """
+    if get_backend(backend) == "sqlite":
+        return read_consumption_fingerprint(session, meter_id)
+    df = read_consumption(session, meter_id, backend=backend)
+    return len(df), float(df['consumption_kwh'].sum())
+
+def ensure_consumption_grid(
+        session,
+        meter_id: str = DEFAULT_METER_ID,
+        backend: str | None = None,
+        hp_start: time | None = None,
+        hp_end: time | None = None
+) -> None:
+    """
+    Construit le cache en grille du compteur depuis le stockage choisi, ou le
+    reconstruit s'il ne correspond plus à ce stockage ou aux heures pleines
+    demandées, celles des paramètres par défaut (voir db.grid_cache.ensure_grid).
+    """
+    backend = get_backend(backend)
+    if hp_start is None or hp_end is None:
+        hp_start, hp_end = read_hp_bounds(session)
+
+    def read_series():
+        series = read_consumption(session, meter_id, backend=backend)
+        return series['start_time'].to_numpy(), series['consumption_kwh'].to_numpy()
+
+    ensure_grid(
+        meter_id, lambda: consumption_fingerprint(session, meter_id, backend), read_series,
+        hp_start=hp_start, hp_end=hp_end
+    )
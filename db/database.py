@@ -1,18 +1,92 @@
-from datetime import time
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
 
-from sqlalchemy import create_engine, Column, Integer, Float, DateTime, Time, UniqueConstraint
+from sqlalchemy import (
+    create_engine, event, make_url, inspect, text, select, update, func, case, cast, and_, or_, type_coerce,
+    Column, Integer, Float, String, DateTime, Time, UniqueConstraint, PrimaryKeyConstraint, Index, MetaData, Table
+)
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 Base = declarative_base()
 
+# URL de la base utilisée par défaut par les applications
+DEFAULT_DB_URL = "sqlite:///consumption.db"
+
+# Configuration par défaut du pool de connexions des moteurs partagés
+# (ignorée pour les bases SQLite en mémoire, servies par un pool à connexion unique)
+DEFAULT_POOL_OPTIONS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    "pool_pre_ping": True,
+}
+
+# Profils de pragmas SQLite appliqués à chaque nouvelle connexion :
+# - "default" : réglages de SQLite (journal rollback, lecteurs bloqués pendant les écritures) ;
+# - "performance" : journal WAL (lectures concurrentes des imports), synchronous=NORMAL
+#   (sûr en WAL, sans fsync à chaque commit), 256 Mio de mmap, 64 Mio de cache de pages,
+#   tables temporaires (staging) en mémoire, attente de 5 s sur un verrou au lieu d'une erreur.
+SQLITE_PROFILES = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 2 ** 20,
+        "cache_size": -64 * 2 ** 10,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+# Profil utilisé par défaut, modifiable par variable d'environnement
+DEFAULT_SQLITE_PROFILE = os.environ.get("CONSO_ELEC_SQLITE_PROFILE", "performance")
+
+# Registre des moteurs du processus : un seul moteur (et donc un seul pool) par URL
+_engines = {}
+_session_factories = {}
+_engines_lock = threading.Lock()
+
+# Compteur (PDL) utilisé pour les données importées avant la gestion multi-compteurs
+DEFAULT_METER_ID = "default"
+# Identifiants acceptés à la saisie : ils nomment aussi des fichiers et dossiers de cache
+METER_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Table de staging des imports : table temporaire (propre à la connexion, stockée hors
+# du fichier principal), elle n'est donc pas déclarée dans Base.metadata
+staging_metadata = MetaData()
+consumption_staging = Table(
+    'consumption_staging',
+    staging_metadata,
+    Column('meter_id', String, nullable=False),
+    Column('start_time', DateTime, nullable=False),
+    Column('end_time', DateTime, nullable=False),
+    Column('consumption_kwh', Float, nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
 class ConsumptionRecord(Base):
     __tablename__ = 'consumption'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    meter_id = Column(String, nullable=False, default=DEFAULT_METER_ID, server_default=DEFAULT_METER_ID)
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
     consumption_kwh = Column(Float, nullable=False)
 
+    # Index unique (et non contrainte de table) pour pouvoir l'ajouter aux bases existantes.
+    # Son préfixe (meter_id, start_time) sert aussi les requêtes par compteur et plage de dates.
+    __table_args__ = (
+        Index('ux_consumption_meter_interval', 'meter_id', 'start_time', 'end_time', unique=True),
+        # Index couvrant des sommes et quantiles par compteur et plage de dates : la valeur
+        # est lue dans l'index, sans accès à la table
+        Index('ix_consumption_meter_start_value', 'meter_id', 'start_time', 'consumption_kwh'),
+        # Requêtes tous compteurs confondus (jours de consommation, bornes de dates)
+        Index('ix_consumption_start_time', 'start_time'),
+    )
+
 class Settings(Base):
     __tablename__ = 'settings'
 
@@ -21,11 +95,15 @@ class Settings(Base):
     hc_cost = Column(Float, nullable=False)
     hp_start = Column(Time, nullable=False)
     hp_end = Column(Time, nullable=False)
+    # Heures pleines appliquées aux tables d'agrégats (voir sync_rollup_hp_bounds)
+    rollup_hp_start = Column(Time, nullable=True)
+    rollup_hp_end = Column(Time, nullable=True)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     solar_wc = Column(Float, nullable=False)
     solar_efficiency = Column(Float, nullable=False)
     solar_cost = Column(Float, nullable=False)
+    meter_id = Column(String, nullable=False, default=DEFAULT_METER_ID, server_default=DEFAULT_METER_ID)
 
 class Weather(Base):
     __tablename__ = 'weather'
@@ -43,17 +121,545 @@ class Weather(Base):
 
     __table_args__ = (UniqueConstraint('time', name='unique_time_weather'),)
 
+class ImportLedger(Base):
+    __tablename__ = 'import_ledger'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_hash = Column(String(64), nullable=False)
+    meter_id = Column(String, nullable=False, default=DEFAULT_METER_ID)
+    file_name = Column(String, nullable=True)
+    file_size = Column(Integer, nullable=False)
+    sheet_index = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    start_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=True)
+    imported_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (UniqueConstraint('file_hash', 'sheet_index', 'meter_id', name='unique_file_sheet_meter_ledger'),)
+
+class PendingConflict(Base):
+    """ Conflit de valeurs en attente de décision (ex. doublons divergents trouvés par la migration). """
+    __tablename__ = 'pending_conflicts'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    meter_id = Column(String, nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    existing_value = Column(Float, nullable=False)
+    new_value = Column(Float, nullable=False)
+    source = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class MeterSummary(Base):
+    __tablename__ = 'meter_summary'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    meter_id = Column(String, nullable=False, unique=True)
+    computed_at = Column(DateTime, nullable=False, default=datetime.now)
+    row_count = Column(Integer, nullable=False)
+    start_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=True)
+    talon = Column(Float, nullable=False)
+    total_conso = Column(Float, nullable=False)
+    cost = Column(Float, nullable=False)
+    cost_hp = Column(Float, nullable=False)
+    cost_hc = Column(Float, nullable=False)
+    pv_production = Column(Float, nullable=False)
+    pv_used = Column(Float, nullable=False)
+    pv_lost = Column(Float, nullable=False)
+    auto_consumption_pct = Column(Float, nullable=False)
+    coverage_pct = Column(Float, nullable=False)
+
+
+# Heures pleines par défaut, tant que les paramètres (Settings.hp_start, hp_end) n'existent pas
+DEFAULT_HP_START = time(7, 15)
+DEFAULT_HP_END = time(23, 30)
+
+def time_to_seconds(t: time) -> int:
+    """ Secondes depuis minuit d'une heure de la journée. """
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+def hp_condition(day_seconds, hp_start: time, hp_end: time):
+    """
+    Condition SQL "en heures pleines" sur une expression de secondes depuis minuit :
+    début dans [hp_start, hp_end), la plage pouvant passer minuit (comme analytics.metrics.is_hp_time).
+    """
+    start, end = time_to_seconds(hp_start), time_to_seconds(hp_end)
+    if start < end:
+        return and_(day_seconds >= start, day_seconds < end)
+    return or_(day_seconds >= start, day_seconds < end)
 
-def get_engine(db_path: str = "sqlite:///consumption.db"):
-    engine = create_engine(db_path, echo=False)
+def read_hp_bounds(conn) -> tuple[time, time]:
+    """ Heures pleines (début, fin) des paramètres, celles par défaut s'ils n'existent pas encore. """
+    row = conn.execute(select(Settings.hp_start, Settings.hp_end).order_by(Settings.id).limit(1)).first()
+    return (row.hp_start, row.hp_end) if row is not None else (DEFAULT_HP_START, DEFAULT_HP_END)
+
+def _rollup_table(name: str) -> Table:
+    """
+    Table d'agrégats de consommation d'un compteur par période (bucket = début
+    de la période) : somme, min, max, nombre de demi-heures, et répartition HP/HC.
+    """
+    return Table(
+        name,
+        Base.metadata,
+        Column('meter_id', String, nullable=False),
+        Column('bucket', DateTime, nullable=False),
+        Column('kwh_sum', Float, nullable=False),
+        Column('kwh_min', Float, nullable=False),
+        Column('kwh_max', Float, nullable=False),
+        Column('row_count', Integer, nullable=False),
+        Column('kwh_hp', Float, nullable=False),
+        Column('kwh_hc', Float, nullable=False),
+        Column('hp_count', Integer, nullable=False),
+        PrimaryKeyConstraint('meter_id', 'bucket'),
+    )
+
+# Agrégats horaires, journaliers et mensuels, tenus à jour à chaque import
+ROLLUP_TABLES = {
+    "H": _rollup_table('consumption_hourly'),
+    "D": _rollup_table('consumption_daily'),
+    "M": _rollup_table('consumption_monthly'),
+}
+
+# Début de période (au format de stockage des DateTime) calculé par SQLite
+_ROLLUP_BUCKET_FORMATS = {
+    "H": '%Y-%m-%d %H:00:00.000000',
+    "D": '%Y-%m-%d 00:00:00.000000',
+    "M": '%Y-%m-01 00:00:00.000000',
+}
+
+def floor_to_bucket(dt: datetime, granularity: str) -> datetime:
+    """ Début de la période (H, D ou M) contenant `dt`. """
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    if granularity in ("D", "M"):
+        dt = dt.replace(hour=0)
+    if granularity == "M":
+        dt = dt.replace(day=1)
+    return dt
+
+def next_bucket(bucket: datetime, granularity: str) -> datetime:
+    """ Début de la période suivant `bucket`. """
+    if granularity == "H":
+        return bucket + timedelta(hours=1)
+    if granularity == "D":
+        return bucket + timedelta(days=1)
+    return bucket.replace(year=bucket.year + bucket.month // 12, month=bucket.month % 12 + 1)
+
+def refresh_rollups(conn, meter_id: str | None = None, start: datetime | None = None, end: datetime | None = None):
+    """
+    Recalcule depuis la table consumption les agrégats du compteur `meter_id`
+    (tous les compteurs si None) dont la période recoupe [start, end]
+    (toute la plage si non précisée). Les périodes touchées sont supprimées puis
+    réinsérées par un INSERT ... SELECT ... GROUP BY, ce qui reste juste quelle
+    que soit la politique d'import (ajout, remplacement, conflits résolus).
+    La répartition HP/HC suit les heures pleines des paramètres ; un recalcul
+    complet les enregistre comme heures appliquées aux agrégats.
+    S'exécute dans la transaction de `conn`.
+    """
+    storage = consumption_storage()
+    kwh = storage['consumption_kwh']
+    hp_start, hp_end = read_hp_bounds(conn)
+    is_hp = hp_condition(storage['day_seconds'], hp_start, hp_end)
+
+    for granularity, rollup in ROLLUP_TABLES.items():
+        source_filters, rollup_filters = [], []
+        if meter_id is not None:
+            source_filters.append(storage['meter_id'] == meter_id)
+            rollup_filters.append(rollup.c.meter_id == meter_id)
+        lower = upper = None
+        if start is not None:
+            lower = floor_to_bucket(start, granularity)
+            rollup_filters.append(rollup.c.bucket >= lower)
+        if end is not None:
+            upper = next_bucket(floor_to_bucket(end, granularity), granularity)
+            rollup_filters.append(rollup.c.bucket < upper)
+        source_filters += consumption_time_filters(lower, upper)
+
+        bucket = func.strftime(_ROLLUP_BUCKET_FORMATS[granularity], storage['start_time'])
+        conn.execute(rollup.delete().where(*rollup_filters))
+        conn.execute(rollup.insert().from_select(
+            [c.name for c in rollup.columns],
+            select(
+                storage['meter_id'],
+                bucket,
+                func.sum(kwh),
+                func.min(kwh),
+                func.max(kwh),
+                func.count(),
+                func.sum(case((is_hp, kwh), else_=0.0)),
+                func.sum(case((is_hp, 0.0), else_=kwh)),
+                func.sum(case((is_hp, 1), else_=0)),
+            ).where(*source_filters).group_by(storage['meter_id'], bucket)
+        ))
+    if meter_id is None and start is None and end is None:
+        conn.execute(update(Settings).values(rollup_hp_start=hp_start, rollup_hp_end=hp_end))
+
+def sync_rollup_hp_bounds(conn) -> bool:
+    """
+    Recalcule entièrement les agrégats si leurs heures pleines ne sont plus celles
+    des paramètres (paramètres modifiés, base antérieure aux heures réglables).
+    Retourne True si les agrégats ont été recalculés.
+    """
+    row = conn.execute(
+        select(Settings.hp_start, Settings.hp_end, Settings.rollup_hp_start, Settings.rollup_hp_end)
+        .order_by(Settings.id).limit(1)
+    ).first()
+    if row is None or (row.rollup_hp_start, row.rollup_hp_end) == (row.hp_start, row.hp_end):
+        return False
+    refresh_rollups(conn)
+    logging.info(f"Tables d'agrégats recalculées pour les heures pleines {row.hp_start:%H:%M}-{row.hp_end:%H:%M}.")
+    return True
+
+
+# Schéma compact optionnel : une ligne par (compteur, demi-heure) sans rowid, le début
+# stocké en numéro de créneau (secondes depuis l'epoch // 1800), la fin étant le
+# créneau suivant. Activé, il remplace la table consumption comme stockage de la
+# consommation (migrate_schema y déplace les lignes, et les ramène s'il est désactivé).
+COMPACT_STORAGE_ENABLED = os.environ.get("CONSO_ELEC_COMPACT_STORAGE", "0") == "1"
+SLOT_SECONDS = 1800
+_SLOT_EPOCH = datetime(1970, 1, 1)
+
+consumption_slots = Table(
+    'consumption_slots',
+    Base.metadata,
+    Column('meter_id', String, nullable=False),
+    Column('slot', Integer, nullable=False),
+    Column('consumption_kwh', Float, nullable=False),
+    PrimaryKeyConstraint('meter_id', 'slot'),
+    sqlite_with_rowid=False,
+)
+
+def datetime_to_slot(dt: datetime) -> int:
+    """ Numéro du créneau de 30 min contenant `dt` (dates naïves, comptées comme UTC). """
+    return (dt - _SLOT_EPOCH) // timedelta(seconds=SLOT_SECONDS)
+
+def slot_to_datetime(slot: int) -> datetime:
+    """ Début du créneau `slot`. """
+    return _SLOT_EPOCH + timedelta(seconds=slot * SLOT_SECONDS)
+
+def slot_range(start: datetime, end: datetime) -> tuple[int, int]:
+    """
+    Créneaux [premier, dernier + 1) dont le début est dans l'intervalle [start, end)
+    (division entière exacte : une borne à la microseconde près reste juste).
+    """
+    slot = timedelta(seconds=SLOT_SECONDS)
+    return -(-(start - _SLOT_EPOCH) // slot), -(-(end - _SLOT_EPOCH) // slot)
+
+def slot_of(time_column):
+    """ Numéro de créneau (expression SQL) d'une colonne de dates au format de stockage. """
+    return cast(func.strftime('%s', time_column), Integer) // SLOT_SECONDS
+
+def _slot_start_time(slot_column, offset: int = 0):
+    """ Début du créneau `slot_column` + `offset` (expression SQL), au format de stockage des DateTime. """
+    return func.strftime('%Y-%m-%d %H:%M:%S.000000', (slot_column + offset) * SLOT_SECONDS, 'unixepoch')
+
+def consumption_storage() -> dict:
+    """
+    Table qui stocke la consommation (consumption_slots si le schéma compact est
+    activé, consumption sinon) et ses colonnes sous une forme commune :
+    {'table', 'compact', 'meter_id', 'start_time', 'end_time' (DateTime), 'consumption_kwh',
+    'day_seconds' (secondes du début depuis minuit, entier), 'time_key' (colonne
+    indexée qui ordonne les débuts)}.
+    """
+    if COMPACT_STORAGE_ENABLED:
+        slot = consumption_slots.c.slot
+        return {
+            'table': consumption_slots,
+            'compact': True,
+            'meter_id': consumption_slots.c.meter_id,
+            'start_time': type_coerce(_slot_start_time(slot), DateTime).label('start_time'),
+            'end_time': type_coerce(_slot_start_time(slot, 1), DateTime).label('end_time'),
+            'consumption_kwh': consumption_slots.c.consumption_kwh,
+            'day_seconds': slot % (86400 // SLOT_SECONDS) * SLOT_SECONDS,
+            'time_key': slot,
+        }
+    consumption = ConsumptionRecord.__table__
+    return {
+        'table': consumption,
+        'compact': False,
+        'meter_id': consumption.c.meter_id,
+        'start_time': consumption.c.start_time,
+        'end_time': consumption.c.end_time,
+        'consumption_kwh': consumption.c.consumption_kwh,
+        'day_seconds': cast(func.strftime('%s', consumption.c.start_time), Integer) % 86400,
+        'time_key': consumption.c.start_time,
+    }
+
+def consumption_time_filters(start: datetime | None = None, end: datetime | None = None, inclusive_end: bool = False) -> list:
+    """
+    Filtres de la table de stockage (voir consumption_storage) sur les débuts dans
+    [start, end) ou [start, end] si `inclusive_end`, bornes optionnelles : sur
+    start_time, ou sur le numéro de créneau (clé primaire) avec le schéma compact.
+    """
+    filters = []
+    if COMPACT_STORAGE_ENABLED:
+        slot = consumption_slots.c.slot
+        if start is not None:
+            filters.append(slot >= slot_range(start, start)[0])
+        if end is not None:
+            filters.append(slot <= datetime_to_slot(end) if inclusive_end else slot < slot_range(end, end)[0])
+        return filters
+    start_time = ConsumptionRecord.__table__.c.start_time
+    if start is not None:
+        filters.append(start_time >= start)
+    if end is not None:
+        filters.append(start_time <= end if inclusive_end else start_time < end)
+    return filters
+
+def misaligned_intervals(table):
+    """ Condition SQL des lignes de `table` qui ne sont pas une demi-heure alignée sur un créneau. """
+    start, end = cast(func.strftime('%s', table.c.start_time), Integer), cast(func.strftime('%s', table.c.end_time), Integer)
+    return or_(end - start != SLOT_SECONDS, start % SLOT_SECONDS != 0)
+
+def move_consumption_storage(conn, compact: bool) -> int:
+    """
+    Déplace la consommation dans la table de stockage choisie : de consumption vers
+    consumption_slots si `compact`, dans l'autre sens sinon (une seule ligne lue si
+    l'autre table est déjà vide). Les lignes déplacées remplacent les créneaux
+    existants, puis la table d'origine est vidée. Refuse d'activer le schéma compact
+    si des intervalles ne sont pas des demi-heures alignées. S'exécute dans la
+    transaction de `conn` ; retourne le nombre de lignes déplacées.
+    """
+    consumption = ConsumptionRecord.__table__
+    source = consumption if compact else consumption_slots
+    if conn.execute(select(source.c.meter_id).limit(1)).first() is None:
+        return 0
+
+    if compact:
+        invalid = conn.execute(select(func.count()).select_from(consumption).where(misaligned_intervals(consumption))).scalar()
+        if invalid:
+            raise ValueError(
+                f"Schéma compact impossible : {invalid} intervalles de la table consumption ne sont pas des "
+                "demi-heures alignées (désactiver CONSO_ELEC_COMPACT_STORAGE)."
+            )
+        moved = conn.execute(text(
+            "INSERT INTO consumption_slots (meter_id, slot, consumption_kwh) "
+            f"SELECT meter_id, CAST(strftime('%s', start_time) AS INTEGER) / {SLOT_SECONDS}, consumption_kwh "
+            "FROM consumption WHERE true "
+            "ON CONFLICT (meter_id, slot) DO UPDATE SET consumption_kwh = excluded.consumption_kwh"
+        )).rowcount
+    else:
+        moved = conn.execute(text(
+            "INSERT INTO consumption (meter_id, start_time, end_time, consumption_kwh) "
+            f"SELECT meter_id, strftime('%Y-%m-%d %H:%M:%S.000000', slot * {SLOT_SECONDS}, 'unixepoch'), "
+            f"strftime('%Y-%m-%d %H:%M:%S.000000', (slot + 1) * {SLOT_SECONDS}, 'unixepoch'), consumption_kwh "
+            "FROM consumption_slots WHERE true "
+            "ON CONFLICT (meter_id, start_time, end_time) DO UPDATE SET consumption_kwh = excluded.consumption_kwh"
+        )).rowcount
+    conn.execute(source.delete())
+    logging.info(
+        f"{moved} lignes de consommation déplacées vers {'consumption_slots' if compact else 'consumption'} "
+        "(VACUUM pour rendre la place libérée au système de fichiers)."
+    )
+    return moved
+
+
+def get_engine(db_path: str = DEFAULT_DB_URL, sqlite_profile: str | None = None, **pool_options):
+    """
+    Retourne le moteur partagé du processus pour cette URL, créé au premier appel
+    (avec DEFAULT_POOL_OPTIONS surchargées par `pool_options`, et pour SQLite les
+    pragmas du profil `sqlite_profile`, DEFAULT_SQLITE_PROFILE par défaut) puis
+    réutilisé : les appels suivants ne reconstruisent ni le pool ni le dialecte,
+    et ignorent donc leurs options.
+
+    Seules les bases SQLite sont prises en charge (import par table de staging
+    temporaire et ON CONFLICT, agrégats calculés avec strftime) : toute autre
+    URL lève une ValueError.
+    """
+    backend = make_url(db_path).get_backend_name()
+    if backend != "sqlite":
+        raise ValueError(f"Base de données non prise en charge : {backend} (seul SQLite est pris en charge).")
+    engine = _engines.get(db_path)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            options = {} if _is_memory_database(db_path) else {**DEFAULT_POOL_OPTIONS, **pool_options}
+            engine = create_engine(db_path, echo=False, **options)
+            _apply_sqlite_profile(engine, sqlite_profile or DEFAULT_SQLITE_PROFILE)
+            _engines[db_path] = engine
+            _session_factories[engine] = sessionmaker(bind=engine)
     return engine
 
+def _apply_sqlite_profile(engine, profile: str):
+    """ Exécute les pragmas du profil sur chaque connexion ouverte par le moteur. """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Profil SQLite inconnu : {profile} (attendu : {', '.join(SQLITE_PROFILES)})")
+    pragmas = SQLITE_PROFILES[profile]
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def _is_memory_database(db_path: str) -> bool:
+    url = make_url(db_path)
+    return url.database in (None, "", ":memory:")
+
+def dispose_engines(close: bool = True):
+    """
+    Libère les pools de tous les moteurs partagés. Avec close=False (après un fork),
+    les connexions héritées du parent sont abandonnées sans être fermées, pour ne pas
+    interférer avec celles que le parent continue d'utiliser.
+    """
+    for engine in list(_engines.values()):
+        engine.dispose(close=close)
+
+def _dispose_engines_after_fork():
+    dispose_engines(close=False)
+
+# Un processus enfant (ProcessPoolExecutor, serveur multi-workers) ne doit jamais
+# réutiliser une connexion SQLite ouverte par son parent
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
 def create_tables(engine):
     Base.metadata.create_all(engine)
+    migrate_schema(engine)
+
+def migrate_schema(engine):
+    """
+    Met à jour une base existante créée avec un schéma plus ancien :
+    - ajoute les colonnes manquantes (ex. meter_id, avec sa valeur par défaut) ;
+    - recrée le registre d'import s'il ne connaît pas les compteurs (il ne sert
+      qu'à éviter des re-parsings, le perdre est sans conséquence) ;
+    - remplace l'ancien index unique (start_time, end_time) par l'index
+      (meter_id, start_time, end_time), après suppression des doublons éventuels
+      (les valeurs divergentes deviennent des conflits à résoudre) ;
+    - crée les index temporels manquants, puis met à jour les statistiques de
+      l'optimiseur (ANALYZE) pour qu'il choisisse les nouveaux index ;
+    - déplace la consommation dans la table de stockage choisie par
+      CONSO_ELEC_COMPACT_STORAGE (consumption_slots ou consumption) ;
+    - construit les tables d'agrégats si elles sont vides alors que des consommations
+      existent, ou les recalcule si leurs heures pleines ne sont plus celles des paramètres.
+    """
+    with engine.begin() as conn:
+        for table in (ConsumptionRecord.__table__, Settings.__table__):
+            _add_missing_columns(conn, table)
+
+        ledger_columns = {col['name'] for col in inspect(conn).get_columns('import_ledger')}
+        if 'meter_id' not in ledger_columns:
+            ImportLedger.__table__.drop(conn)
+            ImportLedger.__table__.create(conn)
+            logging.info("Registre d'import recréé pour la gestion multi-compteurs.")
+
+        existing_indexes = {ix['name'] for ix in inspect(conn).get_indexes('consumption')}
+        if 'ux_consumption_interval' in existing_indexes:
+            conn.execute(text("DROP INDEX ux_consumption_interval"))
+        if 'ux_consumption_meter_interval' not in existing_indexes:
+            _remove_duplicate_intervals(conn)
+
+        created = [index for index in ConsumptionRecord.__table__.indexes if index.name not in existing_indexes]
+        for index in created:
+            index.create(conn, checkfirst=True)
+        if created:
+            conn.execute(text("ANALYZE"))
+            logging.info(f"Index créés : {', '.join(index.name for index in created)}.")
+
+        # Drapeau du schéma compact basculé : la consommation change de table
+        move_consumption_storage(conn, COMPACT_STORAGE_ENABLED)
+
+        # Agrégats absents d'une base antérieure : construits une fois depuis le stockage
+        hourly = ROLLUP_TABLES["H"]
+        storage = consumption_storage()
+        if conn.execute(select(hourly.c.meter_id).limit(1)).first() is None \
+                and conn.execute(select(storage['meter_id']).limit(1)).first() is not None:
+            refresh_rollups(conn)
+            logging.info("Tables d'agrégats (horaire, journalière, mensuelle) construites.")
+        else:
+            sync_rollup_hp_bounds(conn)
+
+def _remove_duplicate_intervals(conn):
+    """
+    Supprime les doublons (meter_id, start_time, end_time) avant la création de
+    l'index unique. Les doublons de même valeur sont simplement supprimés ; pour
+    des valeurs différentes, le premier enregistrement importé est conservé et
+    chaque autre valeur est enregistrée dans pending_conflicts, pour être
+    tranchée comme un conflit d'import (resolve_conflicts).
+    """
+    removed = conn.execute(text(
+        "DELETE FROM consumption WHERE id NOT IN "
+        "(SELECT MIN(id) FROM consumption GROUP BY meter_id, start_time, end_time, consumption_kwh)"
+    )).rowcount
+    if removed:
+        logging.info(f"{removed} doublons identiques (meter_id, start_time, end_time, valeur) supprimés de la table consumption.")
+
+    kept = "SELECT MIN(id) FROM consumption GROUP BY meter_id, start_time, end_time"
+    exported = conn.execute(text(
+        "INSERT INTO pending_conflicts (meter_id, start_time, end_time, existing_value, new_value, source, created_at) "
+        "SELECT c.meter_id, c.start_time, c.end_time, k.consumption_kwh, c.consumption_kwh, 'migration', :now "
+        "FROM consumption AS c JOIN consumption AS k "
+        "ON k.meter_id = c.meter_id AND k.start_time = c.start_time AND k.end_time = c.end_time "
+        f"WHERE c.id NOT IN ({kept}) AND k.id IN ({kept})"
+    ), {"now": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")}).rowcount
+    if exported:
+        conn.execute(text(f"DELETE FROM consumption WHERE id NOT IN ({kept})"))
+        logging.warning(
+            f"{exported} doublons de valeur différente retirés de la table consumption : "
+            "enregistrés comme conflits à résoudre (pending_conflicts)."
+        )
+
+def get_pending_conflicts(session) -> list[dict]:
+    """ Conflits enregistrés en attente de décision, au format des conflits d'import. """
+    rows = session.query(PendingConflict).order_by(PendingConflict.meter_id, PendingConflict.start_time).all()
+    return [
+        {
+            'meter_id': row.meter_id,
+            'start_time': row.start_time,
+            'end_time': row.end_time,
+            'existing_value': row.existing_value,
+            'new_value': row.new_value
+        }
+        for row in rows
+    ]
+
+def _add_missing_columns(conn, table):
+    """ Ajoute (ALTER TABLE) les colonnes du modèle absentes de la table existante. """
+    existing_columns = {col['name'] for col in inspect(conn).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing_columns:
+            continue
+        column_type = column.type.compile(dialect=conn.dialect)
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+        if column.server_default is not None:
+            ddl += f" NOT NULL DEFAULT '{column.server_default.arg}'"
+        conn.execute(text(ddl))
+        logging.info(f"Colonne {table.name}.{column.name} ajoutée.")
+
+def get_meter_ids(session) -> list[str]:
+    """ Liste les compteurs (PDL) pour lesquels des données de consommation existent. """
+    meter_id = consumption_storage()['meter_id']
+    rows = session.execute(select(meter_id).distinct().order_by(meter_id)).all()
+    return [row[0] for row in rows]
 
 def get_session(engine):
-    Session = sessionmaker(bind=engine)
-    return Session()
+    session_factory = _session_factories.get(engine)
+    if session_factory is None:
+        session_factory = sessionmaker(bind=engine)
+    return session_factory()
+
+@contextmanager
+def session_scope(db_path: str = DEFAULT_DB_URL):
+    """
+    Fournit une session sur le moteur partagé : validée en sortie normale, annulée
+    en cas d'exception, et toujours fermée (sa connexion retourne au pool).
+    Les objets chargés restent lisibles après la sortie du bloc.
+    """
+    session = get_session(get_engine(db_path))
+    session.expire_on_commit = False
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
 def get_or_create_settings(session):
     """
@@ -65,8 +671,11 @@ def get_or_create_settings(session):
         settings = Settings(
             hp_cost=0.27,
             hc_cost=0.2068,
-            hp_start=time(7, 15),
-            hp_end=time(23, 30),
+            hp_start=DEFAULT_HP_START,
+            hp_end=DEFAULT_HP_END,
+            # Agrégats éventuels calculés avec les heures par défaut (read_hp_bounds)
+            rollup_hp_start=DEFAULT_HP_START,
+            rollup_hp_end=DEFAULT_HP_END,
             latitude=48.68,
             longitude=3.2199998,
             solar_wc=0,
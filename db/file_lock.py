@@ -0,0 +1,49 @@
+# db/file_lock.py
+"""
+Verrou exclusif entre processus (et entre threads) sur un fichier de verrou :
+Streamlit et la surveillance de dossier (main.py) peuvent écrire en même temps
+les mêmes fichiers hors base (partitions Parquet, cache en grille). Le verrou
+sérialise leurs lectures-modifications-écritures ; le système le libère aussi
+si le processus s'arrête en le tenant.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+def _acquire(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.05)
+
+def _release(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def file_lock(lock_path: str):
+    """ Bloque jusqu'à obtenir le verrou exclusif de `lock_path` (créé au besoin), le libère en sortie. """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _acquire(fd)
+        try:
+            yield
+        finally:
+            _release(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,376 @@
+# db/grid_cache.py
+"""
+Cache de la consommation en grille dense de demi-heures, un fichier par compteur :
+
+    <racine>/<meter_id encodé en URI>.grid
+
+En-tête (marque, premier créneau, nombre de créneaux n, empreinte de la source :
+nombre de lignes et somme de la consommation représentées, heures pleines des
+sommes cumulées en secondes depuis minuit), puis :
+- les sommes cumulées de la consommation, totale et en heures pleines
+  (n + 1 float64 chacune : la somme sur les créneaux [i, j) vaut P[j] - P[i]) ;
+- un float32 par créneau de 30 min depuis le premier (NaN pour les trous) ;
+- un bitmap de présence (un bit par créneau).
+Le fichier est projeté en mémoire à la lecture : une plage de dates est une
+simple tranche du tableau, et son total deux lectures et une soustraction.
+Toute écriture (reconstruction ou complément) se fait sous le verrou du fichier
+(<cache>.lock, partagé par Streamlit et la surveillance de dossier) et passe par
+un fichier temporaire propre au processus, remplacé atomiquement : un lecteur
+voit l'ancien ou le nouveau cache, jamais un mélange, et deux compléments
+concurrents s'appliquent l'un après l'autre. ensure_grid compare l'empreinte à
+celle de la source dès que le fichier a changé ou que la dernière comparaison
+date de plus de GRID_VERIFY_SECONDS, et reconstruit le cache s'il a pris du retard
+ou si les heures pleines demandées (paramètres) ne sont plus celles de l'en-tête.
+
+    python -m db.grid_cache [--db sqlite:///consumption.db] [--meter PDL]
+
+Activé par la variable d'environnement CONSO_ELEC_GRID_CACHE=1, le cache sert
+les lectures du tableau de bord et les totaux de consommation ; un cache
+existant est complété à chaque import validé.
+"""
+
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, time as day_time
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from db.database import (
+    get_engine, create_tables, get_session, get_meter_ids, datetime_to_slot, slot_range, read_hp_bounds,
+    time_to_seconds, SLOT_SECONDS, DEFAULT_HP_START, DEFAULT_HP_END, DEFAULT_DB_URL
+)
+from db.file_lock import file_lock
+from db.repository import read_consumption_arrays
+
+GRID_CACHE_ENABLED = os.environ.get("CONSO_ELEC_GRID_CACHE", "0") == "1"
+GRID_CACHE_DIR = os.environ.get("CONSO_ELEC_GRID_CACHE_DIR", "grid_cache")
+# Délai au-delà duquel ensure_grid compare de nouveau le cache à sa source, même
+# si le fichier n'a pas changé (source modifiée par un autre processus)
+GRID_VERIFY_SECONDS = float(os.environ.get("CONSO_ELEC_GRID_VERIFY_SECONDS", "60"))
+
+_MAGIC = b"CEGRID04"
+_HEADER = np.dtype([
+    ('magic', 'S8'), ('first_slot', '<i8'), ('length', '<i8'), ('rows', '<i8'), ('total', '<f8'),
+    ('hp_start', '<i8'), ('hp_end', '<i8')
+])
+
+# Caches comparés à leur source par ensure_grid dans ce processus :
+# (racine, compteur) -> (état du fichier vérifié, heures pleines, instant de la comparaison)
+_VERIFIED_GRIDS = {}
+
+def _grid_path(meter_id: str, root: str) -> str:
+    # Identifiant saisi librement : encodé pour rester un nom de fichier sous la racine
+    return os.path.join(root, f"{quote(meter_id, safe='')}.grid")
+
+def _file_state(path: str) -> tuple | None:
+    """ Identité et version du fichier (inode, taille, date de modification), None s'il n'existe pas. """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+def _to_slots(start_times) -> np.ndarray:
+    """ Numéros de créneau (secondes depuis l'epoch // 1800) d'un tableau de dates. """
+    seconds = np.asarray(start_times, dtype='datetime64[s]').astype(np.int64)
+    return seconds // SLOT_SECONDS
+
+def _hp_mask(slots: np.ndarray, hp_seconds: tuple[int, int]) -> np.ndarray:
+    """
+    Créneaux commençant en heures pleines [début, fin) (secondes depuis minuit, la
+    plage pouvant passer minuit), comme analytics.metrics.is_hp_time.
+    """
+    day_seconds = (slots % (86400 // SLOT_SECONDS)) * SLOT_SECONDS
+    start, end = hp_seconds
+    if start < end:
+        return (day_seconds >= start) & (day_seconds < end)
+    return (day_seconds >= start) | (day_seconds < end)
+
+def _read_header(path: str) -> np.void | None:
+    """ En-tête du cache, None s'il n'existe pas ou est d'un ancien format. """
+    if not os.path.exists(path):
+        return None
+    header = np.fromfile(path, dtype=_HEADER, count=1)
+    if not len(header) or header[0]['magic'] != _MAGIC:
+        return None
+    return header[0]
+
+def grid_exists(meter_id: str, root: str = GRID_CACHE_DIR) -> bool:
+    return os.path.exists(_grid_path(meter_id, root))
+
+def grid_fingerprint(meter_id: str, root: str = GRID_CACHE_DIR) -> tuple[int, float] | None:
+    """
+    Empreinte (nombre de lignes, somme en kWh) enregistrée dans l'en-tête du cache,
+    None si le cache n'existe pas ou est d'un ancien format.
+    """
+    header = _read_header(_grid_path(meter_id, root))
+    if header is None:
+        return None
+    return int(header['rows']), float(header['total'])
+
+def grid_hp_seconds(meter_id: str, root: str = GRID_CACHE_DIR) -> tuple[int, int] | None:
+    """
+    Heures pleines (début, fin en secondes depuis minuit) des sommes cumulées du
+    cache, None si le cache n'existe pas ou est d'un ancien format.
+    """
+    header = _read_header(_grid_path(meter_id, root))
+    if header is None:
+        return None
+    return int(header['hp_start']), int(header['hp_end'])
+
+def fingerprint_matches(fingerprint: tuple[int, float] | None, rows: int, total: float) -> bool:
+    """ Vrai si l'empreinte correspond au nombre de lignes et à la somme de la source. """
+    return fingerprint is not None and fingerprint[0] == rows \
+        and bool(np.isclose(fingerprint[1], total, rtol=1e-9, atol=1e-6))
+
+def open_grid(meter_id: str, root: str = GRID_CACHE_DIR, mode: str = "r") -> dict | None:
+    """
+    Projette en mémoire le cache du compteur : {'first_slot', 'values' (float32),
+    'present' (bitmap, uint8), 'cum_total', 'cum_hp' (sommes cumulées, float64)}.
+    Retourne None si le cache n'existe pas.
+    """
+    path = _grid_path(meter_id, root)
+    if not os.path.exists(path):
+        return None
+    header = np.fromfile(path, dtype=_HEADER, count=1)[0]
+    if header['magic'] != _MAGIC:
+        raise ValueError(f"Fichier de cache invalide : {path} (à reconstruire avec python -m db.grid_cache)")
+    first_slot, length = int(header['first_slot']), int(header['length'])
+    if length == 0:
+        return {
+            'first_slot': first_slot, 'values': np.empty(0, np.float32), 'present': np.empty(0, np.uint8),
+            'cum_total': np.zeros(1), 'cum_hp': np.zeros(1)
+        }
+    offset = _HEADER.itemsize
+    cumulative = np.memmap(path, dtype=np.float64, mode=mode, offset=offset, shape=(2, length + 1))
+    offset += cumulative.nbytes
+    values = np.memmap(path, dtype=np.float32, mode=mode, offset=offset, shape=(length,))
+    offset += values.nbytes
+    present = np.memmap(path, dtype=np.uint8, mode=mode, offset=offset, shape=((length + 7) // 8,))
+    return {
+        'first_slot': first_slot, 'values': values, 'present': present,
+        'cum_total': cumulative[0], 'cum_hp': cumulative[1]
+    }
+
+def _cumulative(first_slot: int, values: np.ndarray, hp_seconds: tuple[int, int]) -> np.ndarray:
+    """ Sommes cumulées (totale, heures pleines) d'une grille float64 à trous nuls, préfixées de 0. """
+    hp_values = np.where(_hp_mask(first_slot + np.arange(len(values)), hp_seconds), values, 0.0)
+    cumulative = np.zeros((2, len(values) + 1))
+    np.cumsum(values, out=cumulative[0, 1:])
+    np.cumsum(hp_values, out=cumulative[1, 1:])
+    return cumulative
+
+def _write_grid(path: str, first_slot: int, values: np.ndarray, present: np.ndarray, hp_seconds: tuple[int, int]) -> None:
+    """
+    Écrit un cache complet depuis la grille float64 `values` (0 pour les trous),
+    la présence des créneaux et les heures pleines des sommes cumulées (fichier
+    temporaire du processus puis remplacement atomique). À appeler sous le verrou du cache.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    cumulative = _cumulative(first_slot, values, hp_seconds)
+    header = np.array(
+        [(_MAGIC, first_slot, len(values), int(present.sum()), cumulative[0, -1], *hp_seconds)], dtype=_HEADER
+    )
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(header.tobytes())
+        file.write(cumulative.tobytes())
+        file.write(np.where(present, values, np.nan).astype(np.float32).tobytes())
+        file.write(np.packbits(present, bitorder='little').tobytes())
+    os.replace(tmp_path, path)
+
+def _series_grid(start_times, values) -> tuple[int, np.ndarray, np.ndarray]:
+    """ Premier créneau, grille float64 (0 pour les trous) et présence des créneaux d'une série (dates, kWh). """
+    slots = _to_slots(start_times)
+    first_slot = int(slots.min()) if len(slots) else 0
+    length = int(slots.max()) - first_slot + 1 if len(slots) else 0
+    grid = np.zeros(length)
+    present = np.zeros(length, dtype=bool)
+    grid[slots - first_slot] = values
+    present[slots - first_slot] = True
+    return first_slot, grid, present
+
+def _hp_seconds(hp_start: day_time, hp_end: day_time) -> tuple[int, int]:
+    return time_to_seconds(hp_start), time_to_seconds(hp_end)
+
+def rebuild_grid(
+        meter_id: str,
+        start_times,
+        values,
+        root: str = GRID_CACHE_DIR,
+        hp_start: day_time = DEFAULT_HP_START,
+        hp_end: day_time = DEFAULT_HP_END
+) -> None:
+    """
+    Reconstruit entièrement le cache du compteur à partir de ses séries (dates, kWh),
+    sommes en heures pleines sur [hp_start, hp_end).
+    """
+    path = _grid_path(meter_id, root)
+    with file_lock(path + ".lock"):
+        _write_grid(path, *_series_grid(start_times, values), _hp_seconds(hp_start, hp_end))
+
+def patch_grid(meter_id: str, start_times, values, root: str = GRID_CACHE_DIR) -> None:
+    """
+    Écrit dans le cache du compteur les valeurs des créneaux donnés, sur la plage
+    étendue si besoin. Le cache est relu puis réécrit en entier sous son verrou
+    (fichier temporaire puis remplacement atomique) : une lecture concurrente ne
+    voit jamais une mise à jour partielle, et un complément concurrent n'est pas
+    perdu. Les valeurs float64 des créneaux sont relues dans les sommes cumulées
+    (P[i + 1] - P[i]) ; les heures pleines restent celles de l'en-tête. Un cache
+    d'ancien format est supprimé, pour être reconstruit à la lecture suivante.
+    """
+    slots = _to_slots(start_times)
+    if not len(slots):
+        return
+    path = _grid_path(meter_id, root)
+    with file_lock(path + ".lock"):
+        _patch_grid_file(path, meter_id, slots, np.asarray(values, dtype=np.float64), root)
+
+def _patch_grid_file(path: str, meter_id: str, slots: np.ndarray, values: np.ndarray, root: str) -> None:
+    """ Lecture-modification-écriture de patch_grid, sous le verrou du cache. """
+    hp_seconds = grid_hp_seconds(meter_id, root)
+    if hp_seconds is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    grid = open_grid(meter_id, root)
+    first, end = int(slots.min()), int(slots.max()) + 1
+
+    old_values = np.diff(grid['cum_total'])
+    old_present = np.unpackbits(grid['present'], count=len(old_values), bitorder='little').astype(bool)
+    if len(old_values):
+        first = min(first, grid['first_slot'])
+        end = max(end, grid['first_slot'] + len(old_values))
+    new_values = np.zeros(end - first)
+    new_present = np.zeros(end - first, dtype=bool)
+    if len(old_values):
+        offset = grid['first_slot'] - first
+        new_values[offset:offset + len(old_values)] = old_values
+        new_present[offset:offset + len(old_values)] = old_present
+    new_values[slots - first] = values
+    new_present[slots - first] = True
+    del grid
+    _write_grid(path, first, new_values, new_present, hp_seconds)
+
+def ensure_grid(
+        meter_id: str,
+        read_fingerprint,
+        read_series,
+        root: str = GRID_CACHE_DIR,
+        hp_start: day_time = DEFAULT_HP_START,
+        hp_end: day_time = DEFAULT_HP_END
+) -> None:
+    """
+    Construit ou vérifie le cache du compteur avant lecture. L'empreinte du cache
+    est comparée à celle de la source, `read_fingerprint()` -> (nombre de lignes,
+    somme), à la première demande du processus, puis dès que le fichier a été
+    réécrit (par ce processus ou un autre) ou que la dernière comparaison date de
+    plus de GRID_VERIFY_SECONDS. Un cache absent, d'ancien format, en retard
+    (écriture hors de ce code, complément perdu ou interrompu) ou dont les heures
+    pleines ne sont pas [hp_start, hp_end) est reconstruit depuis `read_series()`
+    -> (dates, kWh), sous le verrou du cache.
+    """
+    path = _grid_path(meter_id, root)
+    hp_seconds = _hp_seconds(hp_start, hp_end)
+    verified = _VERIFIED_GRIDS.get((root, meter_id))
+    if verified is not None and verified[:2] == (_file_state(path), hp_seconds) \
+            and time.monotonic() - verified[2] < GRID_VERIFY_SECONDS:
+        return
+    with file_lock(path + ".lock"):
+        if grid_hp_seconds(meter_id, root) != hp_seconds \
+                or not fingerprint_matches(grid_fingerprint(meter_id, root), *read_fingerprint()):
+            start_times, values = read_series()
+            _write_grid(path, *_series_grid(start_times, values), hp_seconds)
+            logging.info(f"Cache en grille du compteur {meter_id} reconstruit ({len(values)} créneaux).")
+        _VERIFIED_GRIDS[(root, meter_id)] = (_file_state(path), hp_seconds, time.monotonic())
+
+def _slot_bounds(grid: dict, start_dt, end_dt, inclusive_end: bool) -> tuple[int, int]:
+    """ Positions [début, fin) dans la grille des créneaux commençant dans la plage. """
+    first_slot, length = grid['first_slot'], len(grid['values'])
+    start, end = 0, length
+    if start_dt is not None:
+        start = min(max(slot_range(start_dt, start_dt)[0] - first_slot, 0), length)
+    if end_dt is not None:
+        end_slot = datetime_to_slot(end_dt) + 1 if inclusive_end else slot_range(end_dt, end_dt)[0]
+        end = min(max(end_slot - first_slot, start), length)
+    return start, end
+
+def read_grid(
+        meter_id: str,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+        inclusive_end: bool = False,
+        root: str = GRID_CACHE_DIR
+) -> dict | None:
+    """
+    Créneaux du compteur dont le début est dans [start_dt, end_dt) (ou [start_dt, end_dt]
+    si `inclusive_end`), bornes optionnelles : {'first_slot', 'values' (tranche float32
+    de la projection, sans copie), 'present' (booléens)}. None si le cache n'existe pas.
+    """
+    grid = open_grid(meter_id, root)
+    if grid is None:
+        return None
+    start, end = _slot_bounds(grid, start_dt, end_dt, inclusive_end)
+    bits = np.unpackbits(grid['present'][start // 8:(end + 7) // 8], bitorder='little')
+    return {
+        'first_slot': grid['first_slot'] + start,
+        'values': grid['values'][start:end],
+        'present': bits[start % 8:start % 8 + end - start].astype(bool)
+    }
+
+def range_sums(
+        meter_id: str,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+        inclusive_end: bool = False,
+        root: str = GRID_CACHE_DIR
+) -> dict | None:
+    """
+    Consommation du compteur sur la plage (mêmes bornes que read_grid), lue dans
+    les sommes cumulées : {'total', 'hp', 'hc'} en kWh, heures pleines de l'en-tête
+    (voir ensure_grid). None si le cache n'existe pas.
+    """
+    grid = open_grid(meter_id, root)
+    if grid is None:
+        return None
+    start, end = _slot_bounds(grid, start_dt, end_dt, inclusive_end)
+    total = float(grid['cum_total'][end] - grid['cum_total'][start])
+    hp = float(grid['cum_hp'][end] - grid['cum_hp'][start])
+    return {'total': total, 'hp': hp, 'hc': total - hp}
+
+def grid_frame(grid: dict) -> pd.DataFrame:
+    """ Créneaux présents d'une tranche de read_grid, en DataFrame indexé par start_time (consumption_kwh). """
+    slots = grid['first_slot'] + np.flatnonzero(grid['present'])
+    start_times = (slots * SLOT_SECONDS).astype('datetime64[s]').astype('datetime64[us]')
+    return pd.DataFrame(
+        {'consumption_kwh': np.asarray(grid['values'][grid['present']], dtype=np.float64)},
+        index=pd.DatetimeIndex(start_times, name='start_time')
+    )
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Reconstruit le cache en grille de demi-heures depuis la base.")
+    parser.add_argument("--db", default=DEFAULT_DB_URL, help="URL de la base de données (SQLite)")
+    parser.add_argument("--meter", default=None, help="Compteur (PDL) à reconstruire, tous par défaut")
+    args = parser.parse_args()
+
+    engine = get_engine(args.db)
+    create_tables(engine)
+    session = get_session(engine)
+    try:
+        hp_start, hp_end = read_hp_bounds(session)
+        for meter_id in [args.meter] if args.meter else get_meter_ids(session):
+            started = time.perf_counter()
+            series = read_consumption_arrays(session, meter_id)
+            rebuild_grid(meter_id, series['start_time'], series['consumption_kwh'], hp_start=hp_start, hp_end=hp_end)
+            size = os.path.getsize(_grid_path(meter_id, GRID_CACHE_DIR))
+            logging.info(
+                f"{meter_id} : {len(series['start_time'])} lignes, cache de {size / 1e6:.2f} Mo "
+                f"en {time.perf_counter() - started:.2f} s"
+            )
+    finally:
+        session.close()
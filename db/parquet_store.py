@@ -0,0 +1,139 @@
+# db/parquet_store.py
+"""
+Stockage de séries temporelles en Parquet partitionné (style Hive) :
+
+    <racine>/<jeu de données>/[meter_id=<PDL>/]year=<AAAA>/month=<M>/part.parquet
+
+Chaque partition mensuelle est un fichier trié par date, réécrit en entier
+(fichier temporaire propre à l'écrivain puis remplacement atomique) lorsqu'il
+reçoit de nouvelles lignes, sous un verrou de la partition : deux imports
+concurrents (Streamlit, surveillance de dossier) ne perdent pas leurs lignes. Les lectures filtrent sur la plage de dates : les partitions hors plage
+ne sont pas ouvertes et les statistiques des row groups écartent le reste.
+Les valeurs de partition (identifiants de compteur saisis librement) sont
+encodées en URI dans les noms de dossiers : « / », « \\ » ou « .. » ne peuvent
+pas sortir du jeu de données, et pyarrow les décode à la lecture.
+"""
+
+import os
+from urllib.parse import quote, unquote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from db.file_lock import file_lock
+
+# Dossier racine du stockage Parquet, modifiable par variable d'environnement
+PARQUET_STORE_DIR = os.environ.get("CONSO_ELEC_PARQUET_DIR", "parquet_store")
+
+def _partitioning(partition_keys: list[str]) -> ds.Partitioning:
+    """ Schéma de partitionnement explicite (les identifiants de compteur restent des chaînes). """
+    fields = [(key, pa.string()) for key in partition_keys] + [("year", pa.int32()), ("month", pa.int32())]
+    return ds.partitioning(pa.schema(fields), flavor="hive")
+
+def _partition_dir(dataset_dir: str, partition_values: dict, year: int, month: int) -> str:
+    parts = [f"{key}={quote(str(value), safe='')}" for key, value in partition_values.items()]
+    parts += [f"year={year}", f"month={month}"]
+    return os.path.join(dataset_dir, *parts)
+
+def upsert_partitioned(
+        dataset: str,
+        df: pd.DataFrame,
+        time_column: str,
+        partition_values: dict | None = None,
+        policy: str = "keep",
+        compare_column: str | None = None,
+        root: str = PARQUET_STORE_DIR
+) -> pd.DataFrame:
+    """
+    Ajoute les lignes de `df` au jeu de données, dans les partitions mensuelles
+    de `time_column` (sous les partitions `partition_values`, ex. {'meter_id': ...}).
+    Une ligne dont la date existe déjà conserve la valeur existante (policy="keep")
+    ou la remplace (policy="overwrite").
+
+    Retourne les conflits : lignes existantes dont `compare_column` diffère de
+    la nouvelle valeur (colonnes time_column, existing_value, new_value).
+    """
+    partition_values = partition_values or {}
+    dataset_dir = os.path.join(root, dataset)
+    conflicts = []
+    times = df[time_column]
+    for (year, month), new_rows in df.groupby([times.dt.year, times.dt.month], sort=True):
+        directory = _partition_dir(dataset_dir, partition_values, year, month)
+        path = os.path.join(directory, "part.parquet")
+        # Lecture, fusion et réécriture sous le verrou de la partition ; les fichiers
+        # préfixés par « . » sont ignorés par les lectures du jeu de données
+        with file_lock(os.path.join(directory, ".part.lock")):
+            combined = new_rows
+            if os.path.exists(path):
+                existing = pd.read_parquet(path)
+                if compare_column is not None:
+                    both = existing.merge(new_rows, on=time_column, suffixes=("_existing", "_new"))
+                    differs = (both[f"{compare_column}_existing"] - both[f"{compare_column}_new"]).abs() >= 1e-6
+                    conflicts.append(pd.DataFrame({
+                        time_column: both.loc[differs, time_column],
+                        'existing_value': both.loc[differs, f"{compare_column}_existing"],
+                        'new_value': both.loc[differs, f"{compare_column}_new"],
+                    }))
+                ordered = [existing, new_rows] if policy == "keep" else [new_rows, existing]
+                combined = pd.concat(ordered, ignore_index=True).drop_duplicates(subset=[time_column], keep="first")
+
+            table = pa.Table.from_pandas(combined.sort_values(time_column), preserve_index=False)
+            tmp_path = os.path.join(directory, f".part.{os.getpid()}.tmp")
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+
+    if not conflicts:
+        return pd.DataFrame(columns=[time_column, 'existing_value', 'new_value'])
+    return pd.concat(conflicts, ignore_index=True)
+
+def list_partition_values(dataset: str, partition_key: str, root: str = PARQUET_STORE_DIR) -> list[str]:
+    """ Valeurs (triées) du premier niveau de partition `partition_key` du jeu de données. """
+    dataset_dir = os.path.join(root, dataset)
+    if not os.path.isdir(dataset_dir):
+        return []
+    prefix = f"{partition_key}="
+    return sorted(unquote(name[len(prefix):]) for name in os.listdir(dataset_dir) if name.startswith(prefix))
+
+def read_partitioned(
+        dataset: str,
+        time_column: str,
+        start_dt=None,
+        end_dt=None,
+        partition_values: dict | None = None,
+        partition_keys: list[str] | None = None,
+        columns: list[str] | None = None,
+        root: str = PARQUET_STORE_DIR
+) -> pd.DataFrame:
+    """
+    Lit le jeu de données sur [start_dt, end_dt) (bornes optionnelles), restreint
+    aux partitions `partition_values`. Le filtre porte à la fois sur les
+    partitions year/month (élagage des fichiers) et sur `time_column`.
+    `partition_keys` liste les niveaux de partition au-dessus de year/month.
+    """
+    partition_values = partition_values or {}
+    partition_keys = partition_keys or list(partition_values)
+    dataset_dir = os.path.join(root, dataset)
+    if not os.path.isdir(dataset_dir):
+        return pd.DataFrame(columns=columns or [time_column])
+
+    conditions = [ds.field(key) == value for key, value in partition_values.items()]
+    year, month = ds.field("year"), ds.field("month")
+    if start_dt is not None:
+        conditions += [
+            (year > start_dt.year) | ((year == start_dt.year) & (month >= start_dt.month)),
+            ds.field(time_column) >= start_dt,
+        ]
+    if end_dt is not None:
+        conditions += [
+            (year < end_dt.year) | ((year == end_dt.year) & (month <= end_dt.month)),
+            ds.field(time_column) < end_dt,
+        ]
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+
+    dataset_obj = ds.dataset(dataset_dir, format="parquet", partitioning=_partitioning(partition_keys))
+    table = dataset_obj.to_table(columns=columns, filter=condition)
+    return table.to_pandas().sort_values(time_column, ignore_index=True)
@@ -0,0 +1,98 @@
+# db/query_plans.py
+"""
+Vérifie, via EXPLAIN QUERY PLAN, que les requêtes chaudes sur les tables
+consumption et weather utilisent un index plutôt qu'un parcours complet.
+
+    python -m db.query_plans [--db sqlite:///consumption.db]
+
+Le code de sortie est non nul si une requête parcourt une table sans index.
+"""
+
+import argparse
+import logging
+import sys
+from datetime import datetime
+
+from sqlalchemy import select, func
+
+from db.database import get_engine, create_tables, ConsumptionRecord, Weather, DEFAULT_DB_URL, DEFAULT_METER_ID
+
+logging.basicConfig(level=logging.INFO)
+
+def hot_queries() -> dict:
+    """
+    Requêtes à contrôler, paramétrées comme dans l'application, associées à
+    l'index attendu dans leur plan.
+    """
+    start_dt, end_dt = datetime(2024, 1, 1), datetime(2024, 2, 1)
+    consumption = ConsumptionRecord.__table__
+    weather = Weather.__table__
+    return {
+        # calculate_total_consumption
+        "total_consumption": (
+            select(func.sum(consumption.c.consumption_kwh)).where(
+                consumption.c.meter_id == DEFAULT_METER_ID,
+                consumption.c.start_time >= start_dt,
+                consumption.c.start_time < end_dt,
+            ),
+            "ix_consumption_meter_start_value",
+        ),
+        # calculate_base_load
+        "base_load": (
+            select(consumption.c.consumption_kwh).where(consumption.c.meter_id == DEFAULT_METER_ID),
+            "ix_consumption_meter_start_value",
+        ),
+        # Filtre de dates du tableau de bord Dash, plot_consumption_over_time_plotly
+        # (lecture en colonnes de db.repository : début et valeur seulement)
+        "dash_range": (
+            select(consumption.c.start_time, consumption.c.consumption_kwh).where(
+                consumption.c.meter_id == DEFAULT_METER_ID,
+                consumption.c.start_time >= start_dt,
+                consumption.c.start_time <= end_dt,
+            ).order_by(consumption.c.start_time),
+            "ix_consumption_meter_start_value",
+        ),
+        # get_consumption_days
+        "consumption_days": (
+            select(consumption.c.start_time).distinct(),
+            "ix_consumption_start_time",
+        ),
+        # Données météo du tableau de bord Dash
+        "weather_range": (
+            select(weather).where(weather.c.time >= start_dt, weather.c.time <= end_dt).order_by(weather.c.time),
+            "sqlite_autoindex_weather_1",
+        ),
+    }
+
+def explain(conn, statement) -> list[str]:
+    """ Retourne les lignes (colonne 'detail') du plan SQLite de la requête. """
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")]
+
+def check_query_plans(engine) -> dict:
+    """
+    Contrôle le plan de chaque requête chaude. Retourne, par requête :
+    {'plan': [...], 'expected_index': str, 'ok': bool}, 'ok' indiquant que
+    l'index attendu est utilisé et qu'aucune table n'est parcourue sans index.
+    """
+    results = {}
+    with engine.connect() as conn:
+        for name, (statement, expected_index) in hot_queries().items():
+            plan = explain(conn, statement)
+            full_scan = any(line.startswith("SCAN") and "INDEX" not in line for line in plan)
+            uses_index = any(expected_index in line for line in plan)
+            results[name] = {"plan": plan, "expected_index": expected_index, "ok": uses_index and not full_scan}
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vérifie les plans d'exécution des requêtes chaudes.")
+    parser.add_argument("--db", default=DEFAULT_DB_URL, help="URL de la base de données (SQLite)")
+    args = parser.parse_args()
+
+    engine = get_engine(args.db)
+    create_tables(engine)
+    results = check_query_plans(engine)
+    for name, result in results.items():
+        status = "OK" if result["ok"] else "ÉCHEC"
+        logging.info(f"{status:<5} {name:<20} {' | '.join(result['plan'])}")
+    sys.exit(0 if all(result["ok"] for result in results.values()) else 1)
@@ -0,0 +1,128 @@
+# db/repository.py
+"""
+Lectures en colonnes des séries de consommation et de météo : des SELECT Core
+dont le résultat est converti directement en tableaux NumPy (un par colonne),
+sans hydrater d'objets ORM. Les dates sont lues telles que stockées par SQLite
+(texte ISO) puis converties en une seule passe vectorisée par NumPy.
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, type_coerce, String, DateTime
+
+from db.database import Weather, consumption_storage, consumption_time_filters, DEFAULT_METER_ID
+
+def _raw_column(column):
+    """ Colonne DateTime lue en texte brut, sans conversion ligne à ligne par SQLAlchemy. """
+    if isinstance(column.type, DateTime):
+        return type_coerce(column, String).label(column.name)
+    return column
+
+def fetch_columns(session, columns: list, *filters, order_by=None) -> dict[str, np.ndarray]:
+    """
+    Exécute SELECT `columns` WHERE `filters` ORDER BY `order_by` et retourne
+    {nom de colonne: tableau NumPy} : datetime64 pour les colonnes DateTime,
+    float64 pour les colonnes numériques, objets pour le reste.
+    """
+    statement = select(*[_raw_column(column) for column in columns]).where(*filters)
+    if order_by is not None:
+        statement = statement.order_by(order_by)
+    result = session.execute(statement)
+    try:
+        # Tuples bruts du curseur DBAPI : ni objets Row, ni conversion par valeur
+        rows = result.cursor.fetchall()
+    finally:
+        result.close()
+    table = np.array(rows, dtype=object).reshape(len(rows), len(columns))
+
+    arrays = {}
+    for position, column in enumerate(columns):
+        values = table[:, position]
+        if isinstance(column.type, DateTime):
+            arrays[column.name] = values.astype('datetime64[us]')
+        elif column.type.python_type in (int, float):
+            arrays[column.name] = values.astype(np.float64)
+        else:
+            arrays[column.name] = values
+    return arrays
+
+def _range_filters(column, start_dt, end_dt, inclusive_end: bool) -> list:
+    filters = []
+    if start_dt is not None:
+        filters.append(column >= start_dt)
+    if end_dt is not None:
+        filters.append(column <= end_dt if inclusive_end else column < end_dt)
+    return filters
+
+def read_consumption_arrays(
+        session,
+        meter_id: str | None = DEFAULT_METER_ID,
+        start_dt=None,
+        end_dt=None,
+        columns: tuple[str, ...] = ('start_time', 'consumption_kwh'),
+        inclusive_end: bool = False
+) -> dict[str, np.ndarray]:
+    """
+    Colonnes `columns` de la consommation du compteur (tous les compteurs si None),
+    triées par date, sur [start_dt, end_dt) ou [start_dt, end_dt] si `inclusive_end`,
+    lues dans la table de stockage (consumption ou schéma compact).
+    """
+    storage = consumption_storage()
+    filters = consumption_time_filters(start_dt, end_dt, inclusive_end)
+    if meter_id is not None:
+        filters.append(storage['meter_id'] == meter_id)
+    return fetch_columns(session, [storage[name] for name in columns], *filters, order_by=storage['time_key'])
+
+def read_consumption_values(session, meter_id: str = DEFAULT_METER_ID) -> np.ndarray:
+    """ Valeurs de consommation du compteur, sans tri (lues depuis l'index couvrant ou la clé compacte). """
+    storage = consumption_storage()
+    return fetch_columns(session, [storage['consumption_kwh']], storage['meter_id'] == meter_id)['consumption_kwh']
+
+def read_consumption_fingerprint(session, meter_id: str = DEFAULT_METER_ID) -> tuple[int, float]:
+    """ Nombre de lignes et somme de la consommation du compteur (empreinte du cache en grille). """
+    storage = consumption_storage()
+    rows, total = session.execute(
+        select(func.count(), func.total(storage['consumption_kwh'])).where(storage['meter_id'] == meter_id)
+    ).one()
+    return rows, total
+
+def read_consumption_frame(
+        session,
+        meter_id: str = DEFAULT_METER_ID,
+        start_dt=None,
+        end_dt=None,
+        inclusive_end: bool = False
+) -> pd.DataFrame:
+    """ Consommation du compteur en DataFrame indexé par start_time (colonne consumption_kwh). """
+    arrays = read_consumption_arrays(session, meter_id, start_dt, end_dt, inclusive_end=inclusive_end)
+    return pd.DataFrame(
+        {'consumption_kwh': arrays['consumption_kwh']},
+        index=pd.DatetimeIndex(arrays['start_time'], name='start_time')
+    )
+
+def read_weather_arrays(
+        session,
+        variables: list[str],
+        start_dt=None,
+        end_dt=None,
+        inclusive_end: bool = False
+) -> dict[str, np.ndarray]:
+    """ Colonne 'time' et `variables` météo, triées par date, sur la plage donnée. """
+    weather = Weather.__table__
+    filters = _range_filters(weather.c.time, start_dt, end_dt, inclusive_end)
+    columns = [weather.c.time] + [weather.c[name] for name in variables]
+    return fetch_columns(session, columns, *filters, order_by=weather.c.time)
+
+def read_weather_frame(
+        session,
+        variables: list[str],
+        start_dt=None,
+        end_dt=None,
+        inclusive_end: bool = False
+) -> pd.DataFrame:
+    """ Variables météo en DataFrame indexé par time. """
+    arrays = read_weather_arrays(session, variables, start_dt, end_dt, inclusive_end)
+    return pd.DataFrame(
+        {name: arrays[name] for name in variables},
+        index=pd.DatetimeIndex(arrays['time'], name='time')
+    )
@@ -0,0 +1,55 @@
+# extraction/csv_extractor.py
+from typing import Iterator
+
+import pandas as pd
+
+from extraction.excel_extractor import ENEDIS_DATE_COLUMNS, ENEDIS_VALUE_COLUMN, type_enedis_columns
+
+# Les colonnes Enedis sont lues en texte puis typées explicitement (dates françaises, virgule décimale)
+ENEDIS_CSV_DTYPES = {**{col: str for col in ENEDIS_DATE_COLUMNS}, ENEDIS_VALUE_COLUMN: str}
+
+def read_csv_and_return_df(
+        file_path,
+        skip_rows: int = 0,
+        sep: str = ";",
+        encoding: str = "utf-8",
+        engine: str = "c"
+) -> pd.DataFrame:
+    """
+    Lit un export CSV Enedis (courbe de charge) et renvoie un DataFrame avec les
+    mêmes colonnes que read_xlsx_and_return_df ('Début', 'Fin', 'Valeur (en kW)'),
+    typées : dates en datetime, valeur en float.
+    `engine` accepte "c" (par défaut) ou "pyarrow" (lecture multi-thread).
+    """
+    df = pd.read_csv(
+        file_path,
+        sep=sep,
+        skiprows=skip_rows,
+        dtype=ENEDIS_CSV_DTYPES,
+        encoding=encoding,
+        engine=engine
+    )
+    return type_enedis_columns(df)
+
+def iter_csv_chunks(
+        file_path,
+        skip_rows: int = 0,
+        sep: str = ";",
+        encoding: str = "utf-8",
+        chunk_size: int = 10_000
+) -> Iterator[pd.DataFrame]:
+    """
+    Lit un export CSV Enedis par blocs de `chunk_size` lignes (moteur C de pandas)
+    et renvoie des DataFrames typés, comme iter_xlsx_chunks.
+    """
+    with pd.read_csv(
+            file_path,
+            sep=sep,
+            skiprows=skip_rows,
+            dtype=ENEDIS_CSV_DTYPES,
+            encoding=encoding,
+            engine="c",
+            chunksize=chunk_size
+    ) as reader:
+        for chunk in reader:
+            yield type_enedis_columns(chunk)
@@ -1,6 +1,16 @@
 # extraction/excel_extractor.py
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterator
+
 import pandas as pd
+from openpyxl import load_workbook
+
+# Format des dates dans les exports Enedis ("dd/mm/YYYY HH:MM:SS")
+ENEDIS_DATE_FORMAT = "%d/%m/%Y %H:%M:%S"
+ENEDIS_DATE_COLUMNS = ("Début", "Fin")
+ENEDIS_VALUE_COLUMN = "Valeur (en kW)"
 
 def read_xlsx_and_return_df(file_path: str, skip_rows: int = 15, sheet_index: int = 1) -> pd.DataFrame:
     """
@@ -10,21 +20,127 @@ def read_xlsx_and_return_df(file_path: str, skip_rows: int = 15, sheet_index: in
     df = pd.read_excel(file_path, sheet_name=sheet_index, skiprows=skip_rows)
     return df
 
+def iter_xlsx_chunks(
+        file_path,
+        skip_rows: int = 15,
+        sheet_index: int = 1,
+        chunk_size: int = 10_000
+) -> Iterator[pd.DataFrame]:
+    """
+    Lit la feuille `sheet_index` en streaming (openpyxl en lecture seule) et renvoie,
+    sous forme de générateur, des DataFrames d'au plus `chunk_size` lignes.
+    La ligne qui suit les `skip_rows` premières sert d'en-tête, comme pour
+    read_xlsx_and_return_df. Les colonnes Enedis sont typées : 'Début'/'Fin'
+    en datetime, 'Valeur (en kW)' en float. La mémoire utilisée ne dépend
+    que de `chunk_size`, pas de la taille du classeur.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[sheet_index].iter_rows(min_row=skip_rows + 1, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+        chunk = []
+        for row in rows:
+            # Lignes entièrement vides (fin de feuille mal délimitée)
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield type_enedis_columns(pd.DataFrame(chunk, columns=columns))
+                chunk = []
+        if chunk:
+            yield type_enedis_columns(pd.DataFrame(chunk, columns=columns))
+    finally:
+        workbook.close()
+
+def type_enedis_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """ Type les colonnes Enedis d'un DataFrame brut : 'Début'/'Fin' en datetime, 'Valeur (en kW)' en float. """
+    for col in ENEDIS_DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format=ENEDIS_DATE_FORMAT)
+    if ENEDIS_VALUE_COLUMN in df.columns:
+        values = df[ENEDIS_VALUE_COLUMN]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_numeric(values.astype(str).str.replace(',', '.', regex=False))
+        # Toujours en float : un chunk de valeurs entières serait sinon typé int64
+        df[ENEDIS_VALUE_COLUMN] = values.astype(float)
+    return df
+
 def convert_df_to_csv(df: pd.DataFrame, csv_path: str) -> None:
     """
     Convertit un DataFrame en fichier CSV.
+    Pour réutiliser un classeur déjà parsé, préférer le cache Parquet
+    (extraction/parsed_cache.py) qui conserve les types et se relit bien plus vite.
     """
     df.to_csv(csv_path, index=False)
 
+def list_xlsx_files(folder_path: str) -> list[str]:
+    """ Liste (triés) les fichiers .xlsx d'un dossier. """
+    return sorted(f for f in os.listdir(folder_path) if f.lower().endswith(".xlsx"))
+
 def read_xlsx_from_folder(folder_path: str, skip_rows: int = 15, sheet_index: int = 1):
     """
     Parcourt un dossier, lit chaque fichier .xlsx et
     renvoie une liste de DataFrames.
     """
     dfs = []
-    for file_name in os.listdir(folder_path):
-        if file_name.lower().endswith(".xlsx"):
-            full_path = os.path.join(folder_path, file_name)
-            df = pd.read_excel(full_path, sheet_name=sheet_index, skiprows=skip_rows)
-            dfs.append((file_name, df))
-    return dfs
\ No newline at end of file
+    for file_name in list_xlsx_files(folder_path):
+        full_path = os.path.join(folder_path, file_name)
+        df = pd.read_excel(full_path, sheet_name=sheet_index, skiprows=skip_rows)
+        dfs.append((file_name, df))
+    return dfs
+
+def _timed_read_xlsx(reader: Callable, file_path: str, skip_rows: int, sheet_index: int) -> tuple[pd.DataFrame, float]:
+    """ Lit un fichier Excel (dans un processus du pool) et mesure la durée du parsing. """
+    start = time.perf_counter()
+    df = reader(file_path, skip_rows=skip_rows, sheet_index=sheet_index)
+    return df, time.perf_counter() - start
+
+def iter_xlsx_files_parallel(
+        file_paths: list[str],
+        skip_rows: int = 15,
+        sheet_index: int = 1,
+        max_workers: int | None = None,
+        reader: Callable = read_xlsx_and_return_df
+) -> Iterator[dict]:
+    """
+    Parse en parallèle (pool de processus) une liste de fichiers .xlsx et
+    renvoie les résultats au fil de l'eau, dans l'ordre où ils se terminent.
+    `reader` (fonction de niveau module, pour être transmise aux processus)
+    a la signature de read_xlsx_and_return_df.
+
+    Chaque résultat est un dictionnaire :
+    {'file_name', 'file_path', 'df' (None en cas d'échec), 'parse_seconds', 'error' (None si succès)}.
+    """
+    if not file_paths:
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_timed_read_xlsx, reader, file_path, skip_rows, sheet_index): file_path
+            for file_path in file_paths
+        }
+        for future in as_completed(futures):
+            file_path = futures[future]
+            result = {'file_name': os.path.basename(file_path), 'file_path': file_path}
+            try:
+                df, parse_seconds = future.result()
+                result.update(df=df, parse_seconds=parse_seconds, error=None)
+            except Exception as e:
+                result.update(df=None, parse_seconds=None, error=str(e))
+            yield result
+
+def iter_xlsx_from_folder_parallel(
+        folder_path: str,
+        skip_rows: int = 15,
+        sheet_index: int = 1,
+        max_workers: int | None = None
+) -> Iterator[dict]:
+    """
+    Parse en parallèle les fichiers .xlsx d'un dossier (voir iter_xlsx_files_parallel).
+    """
+    file_paths = [os.path.join(folder_path, file_name) for file_name in list_xlsx_files(folder_path)]
+    yield from iter_xlsx_files_parallel(file_paths, skip_rows, sheet_index, max_workers)
@@ -0,0 +1,71 @@
+# extraction/file_reader.py
+import os
+from typing import Iterator
+
+import pandas as pd
+
+from extraction.csv_extractor import read_csv_and_return_df, iter_csv_chunks
+from extraction.excel_extractor import iter_xlsx_chunks, iter_xlsx_files_parallel
+from extraction.parsed_cache import iter_xlsx_chunks_cached, read_xlsx_cached
+
+# Formats d'export Enedis pris en charge, et lignes d'en-tête à sauter par défaut
+SUPPORTED_EXTENSIONS = (".xlsx", ".csv")
+DEFAULT_SKIP_ROWS = {".xlsx": 15, ".csv": 0}
+
+def get_file_format(file_name: str) -> str:
+    """ Retourne l'extension (".xlsx" ou ".csv") d'un export Enedis, ou lève une ValueError. """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Format de fichier non pris en charge : {file_name} (attendu : {', '.join(SUPPORTED_EXTENSIONS)})")
+    return extension
+
+def list_consumption_files(folder_path: str) -> list[str]:
+    """ Liste (triés) les exports Enedis (.xlsx, .csv) d'un dossier. """
+    return sorted(f for f in os.listdir(folder_path) if f.lower().endswith(SUPPORTED_EXTENSIONS))
+
+def read_consumption_file(file_path: str, skip_rows: int | None = None, sheet_index: int = 1) -> pd.DataFrame:
+    """
+    Lit un export Enedis en choisissant l'extracteur selon l'extension.
+    `skip_rows` à None prend la valeur par défaut du format. Les classeurs
+    Excel passent par le cache Parquet.
+    """
+    file_format = get_file_format(file_path)
+    if skip_rows is None:
+        skip_rows = DEFAULT_SKIP_ROWS[file_format]
+    if file_format == ".csv":
+        return read_csv_and_return_df(file_path, skip_rows=skip_rows)
+    return read_xlsx_cached(file_path, skip_rows=skip_rows, sheet_index=sheet_index)
+
+def iter_consumption_chunks(
+        file,
+        file_name: str,
+        skip_rows: int | None = None,
+        sheet_index: int = 1,
+        chunk_size: int = 10_000,
+        file_hash: str | None = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Lit un export Enedis par blocs typés en choisissant l'extracteur selon
+    l'extension de `file_name`. Pour un classeur Excel, le cache Parquet est
+    utilisé si l'empreinte `file_hash` est fournie.
+    """
+    file_format = get_file_format(file_name)
+    if skip_rows is None:
+        skip_rows = DEFAULT_SKIP_ROWS[file_format]
+    if file_format == ".csv":
+        yield from iter_csv_chunks(file, skip_rows=skip_rows, chunk_size=chunk_size)
+    elif file_hash is not None:
+        yield from iter_xlsx_chunks_cached(file, file_hash, skip_rows=skip_rows, sheet_index=sheet_index, chunk_size=chunk_size)
+    else:
+        yield from iter_xlsx_chunks(file, skip_rows=skip_rows, sheet_index=sheet_index, chunk_size=chunk_size)
+
+def iter_consumption_files_parallel(
+        file_paths: list[str],
+        skip_rows: int | None = None,
+        sheet_index: int = 1,
+        max_workers: int | None = None
+) -> Iterator[dict]:
+    """
+    Parse en parallèle des exports Enedis de formats mélangés (voir iter_xlsx_files_parallel).
+    """
+    yield from iter_xlsx_files_parallel(file_paths, skip_rows, sheet_index, max_workers, reader=read_consumption_file)
@@ -0,0 +1,108 @@
+# extraction/parsed_cache.py
+import hashlib
+import io
+import os
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from extraction.excel_extractor import iter_xlsx_chunks
+
+# Dossier du cache des classeurs parsés (un fichier Parquet par classeur et paramètres d'extraction)
+PARSED_CACHE_DIR = ".parsed_cache"
+
+def compute_file_hash(data: bytes) -> str:
+    """ Empreinte SHA-256 du contenu d'un fichier. """
+    return hashlib.sha256(data).hexdigest()
+
+def get_cache_path(file_hash: str, skip_rows: int, sheet_index: int, cache_dir: str = PARSED_CACHE_DIR) -> str:
+    """ Chemin du fichier Parquet associé à un classeur et à ses paramètres d'extraction. """
+    return os.path.join(cache_dir, f"{file_hash}-skip{skip_rows}-sheet{sheet_index}.parquet")
+
+def load_cached_df(
+        file_hash: str,
+        skip_rows: int = 15,
+        sheet_index: int = 1,
+        cache_dir: str = PARSED_CACHE_DIR
+) -> pd.DataFrame | None:
+    """ Retourne le DataFrame parsé en cache pour ce classeur, ou None s'il n'a jamais été parsé. """
+    path = get_cache_path(file_hash, skip_rows, sheet_index, cache_dir)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+def _normalize_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Type les colonnes pour un schéma Parquet stable d'un chunk à l'autre (fixé par
+    le premier) : colonnes objet (types mélangés) en chaînes, colonnes entières en
+    float, un chunk de valeurs entières pouvant précéder des valeurs décimales.
+    """
+    dtypes = {col: "string" for col in df.select_dtypes(include="object").columns}
+    dtypes.update({col: "float64" for col in df.select_dtypes(include="integer").columns})
+    if dtypes:
+        df = df.astype(dtypes)
+    return df
+
+def iter_xlsx_chunks_cached(
+        file,
+        file_hash: str,
+        skip_rows: int = 15,
+        sheet_index: int = 1,
+        chunk_size: int = 10_000,
+        cache_dir: str = PARSED_CACHE_DIR
+) -> Iterator[pd.DataFrame]:
+    """
+    Équivalent de iter_xlsx_chunks, avec un cache Parquet indexé par l'empreinte
+    du fichier et les paramètres d'extraction (skip_rows, sheet_index) :
+    - si le classeur a déjà été parsé, les chunks sont relus depuis le Parquet
+      (types conservés, sans ouvrir le XLSX) ;
+    - sinon le classeur est lu en streaming et chaque chunk est écrit dans le
+      cache au fil de l'eau. Le fichier n'est publié que si la lecture va au bout.
+    """
+    path = get_cache_path(file_hash, skip_rows, sheet_index, cache_dir)
+    if os.path.exists(path):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    completed = False
+    try:
+        for chunk in iter_xlsx_chunks(file, skip_rows=skip_rows, sheet_index=sheet_index, chunk_size=chunk_size):
+            chunk = _normalize_chunk(chunk)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            yield chunk
+        completed = True
+    finally:
+        if writer is not None:
+            writer.close()
+            if completed:
+                # Remplacement atomique : plusieurs processus peuvent parser le même fichier
+                os.replace(tmp_path, path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def read_xlsx_cached(
+        file_path: str,
+        skip_rows: int = 15,
+        sheet_index: int = 1,
+        cache_dir: str = PARSED_CACHE_DIR
+) -> pd.DataFrame:
+    """
+    Lit un classeur Excel en passant par le cache Parquet et renvoie le DataFrame complet.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    chunks = list(iter_xlsx_chunks_cached(
+        io.BytesIO(data), compute_file_hash(data), skip_rows=skip_rows, sheet_index=sheet_index, cache_dir=cache_dir
+    ))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
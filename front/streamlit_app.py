@@ -1,43 +1,87 @@
+import datetime
+
+import pandas as pd
 import streamlit as st
-from extraction.excel_extractor import read_xlsx_and_return_df
-from analytics.calculations import (
-    import_data_with_duplicates_management,
-    calculate_base_load
-)
+from analytics.calculations import calculate_base_load, resolve_conflicts
+from analytics.ingestion import import_file_with_ledger
+from analytics.storage import list_meters
 from analytics.weather_to_consumption import integrate_weather_with_consumption
-from db.database import get_engine, create_tables, get_session, get_or_create_settings
-from db.database import ConsumptionRecord
+from db.database import get_engine, create_tables, get_session, get_or_create_settings, sync_rollup_hp_bounds, get_pending_conflicts, DEFAULT_METER_ID, METER_ID_PATTERN
+
+IMPORT_MODES = {
+    "Signaler les conflits": None,
+    "Conserver les valeurs existantes": "keep",
+    "Écraser avec les nouvelles valeurs": "overwrite",
+}
+
+# Libellés de la table des conflits <-> décisions de resolve_conflicts
+CONFLICT_CHOICE_LABELS = {"Existante": "existing", "Nouvelle": "new"}
+
 
-def handle_conflict_block(conflict, session):
+def conflicts_to_table(file_conflicts) -> pd.DataFrame:
     """
-    Affiche un bloc de conflit et propose la résolution simple.
+    Construit la table éditable des conflits à partir d'une liste de (nom de fichier, conflit).
     """
-    col1, col2 = st.columns([2, 1])
-    with col1:
-        st.write(
-            f"- Intervalle : [{conflict['start_time']} - {conflict['end_time']}]"
-            f" | existant={conflict['existing_value']:.3f}, nouveau={conflict['new_value']:.3f}"
-        )
-    with col2:
-        choice = st.selectbox(
-            "Quelle valeur conserver ?",
-            ["Existante", "Nouvelle", "Ignorer"],
-            key=f"{conflict['start_time']}-{conflict['end_time']}"
-        )
-        if st.button("Valider", key=f"validate-{conflict['start_time']}-{conflict['end_time']}"):
-            if choice == "Nouvelle":
-                rec = session.query(ConsumptionRecord).filter(
-                    ConsumptionRecord.start_time == conflict['start_time'],
-                    ConsumptionRecord.end_time == conflict['end_time']
-                ).one_or_none()
-                if rec:
-                    rec.consumption_kwh = conflict['new_value']
-                    session.commit()
-                    st.success("Valeur mise à jour avec la nouvelle consommation.")
-            elif choice == "Existante":
-                st.info("Valeur existante conservée.")
-            else:
-                st.info("Conflit ignoré (pas de modification).")
+    return pd.DataFrame({
+        "Fichier": [file_name for file_name, _ in file_conflicts],
+        "Compteur": [c['meter_id'] for _, c in file_conflicts],
+        "Début": [c['start_time'] for _, c in file_conflicts],
+        "Fin": [c['end_time'] for _, c in file_conflicts],
+        "Existante": [c['existing_value'] for _, c in file_conflicts],
+        "Nouvelle": [c['new_value'] for _, c in file_conflicts],
+        "Choix": ["Existante"] * len(file_conflicts),
+    })
+
+
+def conflict_resolution_block(session):
+    """
+    Affiche les conflits en attente dans une table éditable et applique
+    les décisions en masse (un seul UPDATE) via resolve_conflicts.
+    """
+    if "pending_conflicts" not in st.session_state:
+        # Conflits enregistrés en base (ex. doublons divergents écartés par la migration)
+        st.session_state["pending_conflicts"] = [("(base)", c) for c in get_pending_conflicts(session)]
+    file_conflicts = st.session_state["pending_conflicts"]
+    if not file_conflicts:
+        return
+
+    st.warning(f"{len(file_conflicts)} conflits à résoudre.")
+    edited = st.data_editor(
+        conflicts_to_table(file_conflicts),
+        column_config={
+            "Choix": st.column_config.SelectboxColumn("Valeur à conserver", options=list(CONFLICT_CHOICE_LABELS))
+        },
+        disabled=["Fichier", "Compteur", "Début", "Fin", "Existante", "Nouvelle"],
+        hide_index=True,
+        key="conflicts-editor"
+    )
+    conflicts = [c for _, c in file_conflicts]
+
+    col1, col2, col3 = st.columns(3)
+    decided = None
+    if col1.button("Tout conserver (existantes)"):
+        decided = [dict(c, choice="existing") for c in conflicts]
+    if col2.button("Tout remplacer (nouvelles)"):
+        decided = [dict(c, choice="new") for c in conflicts]
+    if col3.button("Appliquer les choix du tableau"):
+        decided = [dict(c, choice=CONFLICT_CHOICE_LABELS[label]) for c, label in zip(conflicts, edited["Choix"])]
+
+    with st.expander("Règle par plage de dates"):
+        range_start = st.date_input("Du", value=min(c['start_time'] for c in conflicts).date())
+        range_end = st.date_input("Au (inclus)", value=max(c['start_time'] for c in conflicts).date())
+        range_label = st.radio("Valeur à conserver sur la plage", list(CONFLICT_CHOICE_LABELS), horizontal=True)
+        if st.button("Appliquer à la plage"):
+            start_dt = datetime.datetime.combine(range_start, datetime.time.min)
+            end_dt = datetime.datetime.combine(range_end + datetime.timedelta(days=1), datetime.time.min)
+            updated = resolve_conflicts(session, conflicts, range_choices=[(start_dt, end_dt, CONFLICT_CHOICE_LABELS[range_label])])
+            remaining = [(f, c) for f, c in file_conflicts if not (start_dt <= c['start_time'] < end_dt)]
+            st.session_state["pending_conflicts"] = remaining
+            st.success(f"{updated} valeurs mises à jour sur la plage.")
+
+    if decided is not None:
+        updated = resolve_conflicts(session, decided)
+        st.session_state["pending_conflicts"] = []
+        st.success(f"Conflits résolus : {updated} valeurs mises à jour.")
 
 
 def main():
@@ -47,81 +91,106 @@ def main():
     engine = get_engine()
     create_tables(engine)
     session = get_session(engine)
-
-    # Récupérer ou initialiser les Settings
-    settings = get_or_create_settings(session)
-
-    # --- Sidebar Paramètres ---
-    with st.sidebar:
-        st.header("Paramètres HP/HC")
-        hp_cost = st.number_input("Tarif Heures Pleines (€ / kWh)", value=settings.hp_cost, min_value=0.0, format="%.4f")
-        hc_cost = st.number_input("Tarif Heures Creuses (€ / kWh)", value=settings.hc_cost, min_value=0.0, format="%.4f")
-
-        hp_start = st.time_input("Début HP", value=settings.hp_start)
-        hp_end = st.time_input("Fin HP", value=settings.hp_end)
-
-        st.header("Localisation")
-        latitude = st.number_input("Latitude", value=settings.latitude, format="%.6f")
-        longitude = st.number_input("Longitude", value=settings.longitude, format="%.6f")
-
-        st.header("Photovoltaïque")
-        solar_wc = st.number_input("Watt crète (Wc)", value=settings.solar_wc, format="%.0f")
-        solar_efficiency = st.number_input("Efficacité", value=settings.solar_efficiency,format="%.2f")
-        solar_cost = st.number_input("Coût", value=settings.solar_cost, format="%.2f")
-
-        if st.button("Sauvegarder paramètres"):
-            settings.hp_cost = hp_cost
-            settings.hc_cost = hc_cost
-            settings.hp_start = hp_start
-            settings.hp_end = hp_end
-            settings.latitude = latitude
-            settings.longitude = longitude
-            settings.solar_wc = solar_wc
-            settings.solar_efficiency = solar_efficiency
-            settings.solar_cost = solar_cost
-            session.commit()
-            st.success("Paramètres sauvegardés !")
-
-    st.markdown("---")
-    st.subheader("Import de données Excel")
-
-    files = st.file_uploader("Choisissez un ou plusieurs fichiers .xlsx", type=["xlsx"], accept_multiple_files=True)
-    if files:
-        if st.button("Importer ces fichiers"):
-            total_conflicts = []
-            for f in files:
-                df = read_xlsx_and_return_df(f, skip_rows=15, sheet_index=1)
-                st.write(f"Fichier importé : {f.name}")
-                st.write(df.head())
-
-                conflicts = import_data_with_duplicates_management(df, session)
-                if conflicts:
-                    st.warning(f"Conflits détectés dans {f.name}")
-                    total_conflicts.extend([(f.name, c) for c in conflicts])
-                else:
-                    st.success(f"Import réussi pour {f.name}")
-
-            if total_conflicts:
-                st.warning("Des conflits existent sur plusieurs fichiers.")
-                for file_name, conflict in total_conflicts:
-                    st.write(f"**Fichier** : {file_name}")
-                    handle_conflict_block(conflict, session)
-
-    st.markdown("---")
-    st.subheader("Récupération des données météos")
-    if st.button("Importer les données météo"):
-        integrate_weather_with_consumption(session, settings.latitude, settings.longitude)
-        st.success("Données météo importées et associées aux jours de consommation.")
-
-    st.markdown("---")
-    st.subheader("Calcul du talon (global)")
-
-    if st.button("Calculer talon global"):
-        b_load = calculate_base_load(session)
-        st.write(f"Talon estimé : {b_load:.2f} kW")
-
-    st.markdown("---")
-    st.write("Pour la visualisation avancée, rendez-vous sur [Dash](http://localhost:8050) par exemple.")
+    # Session rendue au pool du moteur partagé à la fin de chaque exécution du script
+    try:
+        # Récupérer ou initialiser les Settings
+        settings = get_or_create_settings(session)
+
+        # --- Sidebar Paramètres ---
+        with st.sidebar:
+            st.header("Compteur")
+            known_meters = list_meters(session)
+            if known_meters:
+                st.caption("Compteurs en base : " + ", ".join(known_meters))
+            meter_id = st.text_input("Identifiant du compteur (PDL)", value=settings.meter_id).strip() or DEFAULT_METER_ID
+            if not METER_ID_PATTERN.fullmatch(meter_id):
+                st.error("Identifiant de compteur invalide : lettres, chiffres, « - » ou « _ » (64 caractères au plus).")
+                st.stop()
+
+            st.header("Paramètres HP/HC")
+            hp_cost = st.number_input("Tarif Heures Pleines (€ / kWh)", value=settings.hp_cost, min_value=0.0, format="%.4f")
+            hc_cost = st.number_input("Tarif Heures Creuses (€ / kWh)", value=settings.hc_cost, min_value=0.0, format="%.4f")
+
+            hp_start = st.time_input("Début HP", value=settings.hp_start)
+            hp_end = st.time_input("Fin HP", value=settings.hp_end)
+
+            st.header("Localisation")
+            latitude = st.number_input("Latitude", value=settings.latitude, format="%.6f")
+            longitude = st.number_input("Longitude", value=settings.longitude, format="%.6f")
+
+            st.header("Photovoltaïque")
+            solar_wc = st.number_input("Watt crète (Wc)", value=settings.solar_wc, format="%.0f")
+            solar_efficiency = st.number_input("Efficacité", value=settings.solar_efficiency,format="%.2f")
+            solar_cost = st.number_input("Coût", value=settings.solar_cost, format="%.2f")
+
+            if st.button("Sauvegarder paramètres"):
+                settings.hp_cost = hp_cost
+                settings.hc_cost = hc_cost
+                settings.hp_start = hp_start
+                settings.hp_end = hp_end
+                settings.latitude = latitude
+                settings.longitude = longitude
+                settings.solar_wc = solar_wc
+                settings.solar_efficiency = solar_efficiency
+                settings.solar_cost = solar_cost
+                settings.meter_id = meter_id
+                session.flush()
+                # Heures pleines modifiées : répartition HP/HC des agrégats recalculée
+                sync_rollup_hp_bounds(session.connection())
+                session.commit()
+                st.success("Paramètres sauvegardés !")
+
+        st.markdown("---")
+        st.subheader("Import de données Excel / CSV")
+        st.caption(f"Les fichiers sont importés pour le compteur : {meter_id}")
+
+        files = st.file_uploader("Choisissez un ou plusieurs fichiers .xlsx ou .csv", type=["xlsx", "csv"], accept_multiple_files=True)
+        import_mode = st.radio("En cas de données déjà présentes :", list(IMPORT_MODES.keys()), horizontal=True)
+        if files:
+            if st.button("Importer ces fichiers"):
+                total_conflicts = []
+                for f in files:
+                    # Le registre d'import évite de re-parser un fichier déjà importé
+                    result = import_file_with_ledger(
+                        f.getvalue(), f.name, session, policy=IMPORT_MODES[import_mode], meter_id=meter_id
+                    )
+                    if result['skipped']:
+                        st.info(f"Fichier déjà importé, ignoré : {f.name}")
+                        continue
+
+                    st.write(f"Fichier importé : {f.name} ({result['new_rows']} nouvelles lignes sur {result['rows']})")
+                    if result['preview'] is not None:
+                        st.write(result['preview'])
+                    conflicts = result['conflicts']
+
+                    if conflicts:
+                        st.warning(f"Conflits détectés dans {f.name}")
+                        total_conflicts.extend([(f.name, c) for c in conflicts])
+                    else:
+                        st.success(f"Import réussi pour {f.name}")
+
+                # Conservés d'un rerun à l'autre pour la table de résolution
+                st.session_state["pending_conflicts"] = total_conflicts
+
+        conflict_resolution_block(session)
+
+        st.markdown("---")
+        st.subheader("Récupération des données météos")
+        if st.button("Importer les données météo"):
+            integrate_weather_with_consumption(session, settings.latitude, settings.longitude)
+            st.success("Données météo importées et associées aux jours de consommation.")
+
+        st.markdown("---")
+        st.subheader("Calcul du talon (global)")
+
+        if st.button("Calculer talon global"):
+            b_load = calculate_base_load(session, meter_id)
+            st.write(f"Talon estimé : {b_load:.2f} kW")
+
+        st.markdown("---")
+        st.write("Pour la visualisation avancée, rendez-vous sur [Dash](http://localhost:8050) par exemple.")
+    finally:
+        session.close()
 
 
 if __name__ == "__main__":
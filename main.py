@@ -11,15 +11,27 @@ def launch_dash():
     """Lance l'application Dash."""
     os.system("python dash_app/app.py")
 
+def launch_watcher(folder_path):
+    """Lance l'import automatique du dossier de dépôt."""
+    os.system(f'python -m analytics.watch_folder "{folder_path}"')
+
 if __name__ == "__main__":
     # Lancer Streamlit et Dash en parallèle
     streamlit_process = Process(target=launch_streamlit)
     dash_process = Process(target=launch_dash)
 
-    # Démarrer les deux processus
+    # Import automatique optionnel d'un dossier de dépôt
+    watch_folder = os.environ.get("CONSO_ELEC_WATCH_FOLDER")
+    watcher_process = Process(target=launch_watcher, args=(watch_folder,)) if watch_folder else None
+
+    # Démarrer les processus
     streamlit_process.start()
     dash_process.start()
+    if watcher_process:
+        watcher_process.start()
 
-    # Attendre que les deux processus terminent (optionnel)
+    # Attendre que les processus terminent (optionnel)
     streamlit_process.join()
-    dash_process.join()
\ No newline at end of file
+    dash_process.join()
+    if watcher_process:
+        watcher_process.join()
\ No newline at end of file
@@ -0,0 +1,150 @@
+# tests/test_consumption_import.py
+"""
+Import de la consommation par la table de staging (analytics.calculations), avec
+le stockage habituel et le schéma compact : politiques d'import face aux
+intervalles déjà présents, détection des conflits, puis résolution des conflits
+qui doit laisser les tables d'agrégats et le cache en grille égaux à un recalcul
+complet depuis le stockage.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+import db.database
+import db.grid_cache
+from analytics.calculations import import_dataframe, load_consumption_rollup, resolve_conflicts
+from db.consumption_store import ensure_consumption_grid
+from db.database import get_engine, create_tables, get_session, dispose_engines, refresh_rollups, ROLLUP_TABLES
+from db.grid_cache import grid_fingerprint, range_sums
+from db.repository import read_consumption_arrays, read_consumption_fingerprint
+from extraction.excel_extractor import ENEDIS_DATE_FORMAT
+
+METER_ID = "PDL001"
+START = datetime(2024, 1, 1)
+# Puissances du premier import (kW) : deux jours de demi-heures
+VALUES = np.arange(96) % 5 + 1.0
+# Créneaux du second import dont la valeur diffère de la valeur enregistrée
+CHANGED = [10, 11, 40, 95]
+
+def _enedis(start: datetime, values) -> pd.DataFrame:
+    """ Export Enedis de demi-heures consécutives depuis `start` (puissances en kW). """
+    starts = pd.date_range(start, periods=len(values), freq="30min")
+    return pd.DataFrame({
+        'Début': starts.strftime(ENEDIS_DATE_FORMAT),
+        'Fin': (starts + pd.Timedelta(minutes=30)).strftime(ENEDIS_DATE_FORMAT),
+        'Valeur (en kW)': values,
+    })
+
+def _second_import() -> pd.DataFrame:
+    """ Reprend les deux jours (valeurs de CHANGED modifiées) et ajoute une journée. """
+    values = np.concatenate([VALUES, np.full(48, 2.0)])
+    values[CHANGED] += 10.0
+    return _enedis(START, values)
+
+@pytest.fixture(params=["standard", "compact"])
+def session(tmp_path, monkeypatch, request):
+    """ Base sous tmp_path, stockage habituel ou compact, et premier import fait. """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db.database, "COMPACT_STORAGE_ENABLED", request.param == "compact")
+    monkeypatch.setattr(db.grid_cache, "_VERIFIED_GRIDS", {})
+    engine = get_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    create_tables(engine)
+    session = get_session(engine)
+    assert import_dataframe(_enedis(START, VALUES), session, meter_id=METER_ID) == []
+    yield session
+    session.close()
+    dispose_engines()
+
+def _stored(session) -> pd.Series:
+    series = read_consumption_arrays(session, METER_ID)
+    return pd.Series(series['consumption_kwh'], index=pd.DatetimeIndex(series['start_time']))
+
+def _rollup_rows(session) -> dict:
+    return {
+        granularity: session.execute(select(rollup).order_by(rollup.c.meter_id, rollup.c.bucket)).all()
+        for granularity, rollup in ROLLUP_TABLES.items()
+    }
+
+def _assert_rollups_in_sync(session):
+    """ Agrégats tenus à jour identiques à un recalcul complet depuis le stockage. """
+    maintained = _rollup_rows(session)
+    refresh_rollups(session.connection())
+    rebuilt = _rollup_rows(session)
+    session.rollback()
+    for granularity in ROLLUP_TABLES:
+        assert len(maintained[granularity]) == len(rebuilt[granularity])
+        for row, expected in zip(maintained[granularity], rebuilt[granularity]):
+            assert row[:2] == expected[:2]
+            assert row[2:] == pytest.approx(expected[2:])
+
+def _assert_grid_in_sync(session):
+    """ Cache en grille complété par les imports identique à sa source. """
+    assert grid_fingerprint(METER_ID) == pytest.approx(read_consumption_fingerprint(session, METER_ID))
+    stored = _stored(session)
+    for start_dt, end_dt in [(None, None), (START + timedelta(hours=5), START + timedelta(days=1, hours=20))]:
+        window = stored.loc[start_dt:end_dt]
+        assert range_sums(METER_ID, start_dt, end_dt, inclusive_end=True)['total'] == pytest.approx(window.sum())
+
+@pytest.mark.parametrize("policy, returns_conflicts, kept", [
+    (None, True, True),
+    ("keep", False, True),
+    ("report", True, True),
+    ("overwrite", False, False),
+])
+def test_import_policies(session, policy, returns_conflicts, kept):
+    conflicts = import_dataframe(_second_import(), session, policy=policy, meter_id=METER_ID)
+
+    changed_starts = [START + timedelta(minutes=30 * i) for i in CHANGED]
+    if returns_conflicts:
+        assert [c['start_time'] for c in conflicts] == changed_starts
+        assert [c['existing_value'] for c in conflicts] == pytest.approx(list(VALUES[CHANGED] / 2))
+        assert [c['new_value'] for c in conflicts] == pytest.approx(list((VALUES[CHANGED] + 10) / 2))
+        assert all(c['meter_id'] == METER_ID and c['end_time'] - c['start_time'] == timedelta(minutes=30) for c in conflicts)
+    else:
+        assert conflicts == []
+
+    stored = _stored(session)
+    assert len(stored) == 96 + 48
+    expected = VALUES[CHANGED] / 2 if kept else (VALUES[CHANGED] + 10) / 2
+    assert stored.loc[changed_starts].to_numpy() == pytest.approx(expected)
+    assert stored.iloc[96:].to_numpy() == pytest.approx(np.full(48, 1.0))
+    _assert_rollups_in_sync(session)
+
+def test_reimport_is_idempotent(session):
+    before = _stored(session)
+    assert import_dataframe(_enedis(START, VALUES), session, policy="report", meter_id=METER_ID) == []
+    pd.testing.assert_series_equal(_stored(session), before)
+
+def test_invalid_interval_rejected(session):
+    df = _enedis(START + timedelta(days=5), [1.0, 2.0])
+    df.loc[1, 'Fin'] = df.loc[1, 'Début']
+    with pytest.raises(ValueError):
+        import_dataframe(df, session, policy="keep", meter_id=METER_ID)
+    assert len(_stored(session)) == 96
+
+def test_resolve_conflicts_keeps_rollups_and_grid_in_sync(session):
+    ensure_consumption_grid(session, METER_ID)
+    conflicts = import_dataframe(_second_import(), session, policy="report", meter_id=METER_ID)
+    _assert_grid_in_sync(session)
+
+    # Nouvelles valeurs sur le premier jour seulement, valeurs existantes ailleurs
+    first_day = (START, START + timedelta(days=1), "new")
+    updated = resolve_conflicts(session, conflicts, default_choice="existing", range_choices=[first_day])
+
+    assert updated == 3
+    stored = _stored(session)
+    for conflict in conflicts:
+        expected = conflict['new_value'] if conflict['start_time'] < first_day[1] else conflict['existing_value']
+        assert stored.loc[conflict['start_time']] == pytest.approx(expected)
+    _assert_rollups_in_sync(session)
+    _assert_grid_in_sync(session)
+
+    # Période coupée en milieu de journée : mêmes sommes que les demi-heures stockées
+    rollup = load_consumption_rollup(session, METER_ID, "D", START + timedelta(hours=5), START + timedelta(days=1, hours=5))
+    window = stored.loc[START + timedelta(hours=5):START + timedelta(days=1, hours=5)]
+    assert rollup['kwh_sum'].sum() == pytest.approx(window.sum())
+    assert rollup['row_count'].sum() == len(window)
@@ -0,0 +1,159 @@
+# tests/test_grid_cache.py
+"""
+Cache en grille de demi-heures (db.grid_cache) : les sommes lues dans les sommes
+cumulées doivent être celles de SQLite sur les mêmes plages (fin exclue ou
+incluse, bornes hors créneau ou hors données), avant et après un complément qui
+étend la grille, et le cache doit suivre sa source et les heures pleines.
+"""
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics.calculations
+import db.grid_cache
+from analytics.calculations import import_dataframe, calculate_consumption_hp_hc
+from db.consumption_store import ensure_consumption_grid
+from db.database import (
+    get_engine, create_tables, get_session, get_or_create_settings, dispose_engines, ConsumptionRecord
+)
+from db.grid_cache import open_grid, read_grid, range_sums, patch_grid, rebuild_grid, grid_fingerprint, _slot_bounds
+from db.repository import read_consumption_fingerprint
+from extraction.excel_extractor import ENEDIS_DATE_FORMAT
+
+METER_ID = "PDL001"
+START = datetime(2024, 1, 1)
+
+# Plages comparées : alignées, entre deux créneaux, à la microseconde, débordant
+# des données ou hors des données, sans borne
+WINDOWS = [
+    (datetime(2024, 1, 1), datetime(2024, 1, 2)),
+    (datetime(2024, 1, 1, 7, 10), datetime(2024, 1, 2, 9, 45)),
+    (datetime(2024, 1, 2, 7, 30), datetime(2024, 1, 2, 7, 30)),
+    (datetime(2024, 1, 2, 7, 30), datetime(2024, 1, 2, 7, 30, 0, 1)),
+    (datetime(2023, 12, 25), datetime(2024, 1, 2, 12)),
+    (datetime(2024, 1, 2, 12), datetime(2024, 2, 1)),
+    (datetime(2024, 3, 1), datetime(2024, 3, 2)),
+    (None, None),
+]
+
+def _enedis(start: datetime, values) -> pd.DataFrame:
+    """ Export Enedis de demi-heures consécutives depuis `start` (puissances en kW). """
+    starts = pd.date_range(start, periods=len(values), freq="30min")
+    return pd.DataFrame({
+        'Début': starts.strftime(ENEDIS_DATE_FORMAT),
+        'Fin': (starts + pd.Timedelta(minutes=30)).strftime(ENEDIS_DATE_FORMAT),
+        'Valeur (en kW)': values,
+    })
+
+def _without_slots(df: pd.DataFrame, positions) -> pd.DataFrame:
+    return df.drop(index=list(positions)).reset_index(drop=True)
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """ Base d'un compteur sur trois jours, avec des trous ; cache en grille sous tmp_path. """
+    monkeypatch.chdir(tmp_path)
+    # Vérifications des caches propres au test (racine relative identique d'un test à l'autre)
+    monkeypatch.setattr(db.grid_cache, "_VERIFIED_GRIDS", {})
+    engine = get_engine(f"sqlite:///{tmp_path / 'grid.db'}")
+    create_tables(engine)
+    session = get_session(engine)
+    values = np.arange(48 * 3) % 7 + 1.0
+    import_dataframe(_without_slots(_enedis(START, values), [5, 6, 60]), session, meter_id=METER_ID)
+    yield session
+    session.close()
+    dispose_engines()
+
+def _sql_sums(session, start_dt, end_dt, inclusive_end: bool) -> dict:
+    """ Sommes de référence calculées par SQLite (cache en grille désactivé). """
+    return calculate_consumption_hp_hc(session, start_dt, end_dt, METER_ID, inclusive_end=inclusive_end)
+
+def _grid_sums(session, start_dt, end_dt, inclusive_end: bool) -> dict:
+    ensure_consumption_grid(session, METER_ID)
+    return range_sums(METER_ID, start_dt, end_dt, inclusive_end)
+
+def _assert_grid_matches_sql(session):
+    for inclusive_end in (False, True):
+        for start_dt, end_dt in WINDOWS:
+            expected = _sql_sums(session, start_dt, end_dt, inclusive_end)
+            actual = _grid_sums(session, start_dt, end_dt, inclusive_end)
+            for key in ('total', 'hp', 'hc'):
+                assert actual[key] == pytest.approx(expected[key]), (start_dt, end_dt, inclusive_end, key)
+
+def test_range_sums_match_sql(session):
+    _assert_grid_matches_sql(session)
+
+def test_slot_bounds_exclusive_and_inclusive_end(session):
+    ensure_consumption_grid(session, METER_ID)
+    grid = open_grid(METER_ID)
+
+    assert _slot_bounds(grid, START, START + timedelta(hours=1), False) == (0, 2)
+    assert _slot_bounds(grid, START, START + timedelta(hours=1), True) == (0, 3)
+    # Début entre deux créneaux : le créneau commencé avant est exclu
+    assert _slot_bounds(grid, START + timedelta(minutes=10), START + timedelta(hours=1), True) == (1, 3)
+    # Bornes hors des données : rognées à la grille
+    assert _slot_bounds(grid, datetime(2023, 1, 1), datetime(2023, 1, 2), False) == (0, 0)
+    assert _slot_bounds(grid, datetime(2025, 1, 1), None, False) == (len(grid['values']),) * 2
+    assert _slot_bounds(grid, None, None, True) == (0, len(grid['values']))
+
+def test_patch_grid_extends_range(session):
+    ensure_consumption_grid(session, METER_ID)
+    before = read_grid(METER_ID)
+
+    # Un jour avant et un jour après les données : complétés par les imports
+    import_dataframe(_enedis(START - timedelta(days=1), [4.0] * 48), session, meter_id=METER_ID)
+    import_dataframe(_enedis(START + timedelta(days=4), [6.0] * 48), session, meter_id=METER_ID)
+    after = read_grid(METER_ID)
+
+    assert after['first_slot'] == before['first_slot'] - 48
+    # Jour ajouté avant, jour sans donnée puis jour ajouté après
+    assert len(after['values']) == len(before['values']) + 48 * 3
+    # Valeurs et trous d'origine conservés, jour intermédiaire sans donnée absent
+    np.testing.assert_array_equal(after['present'][48:48 + len(before['values'])], before['present'])
+    np.testing.assert_array_equal(after['values'][48:48 + len(before['values'])], before['values'])
+    assert not after['present'][48 + len(before['values']):-48].any()
+    assert grid_fingerprint(METER_ID) == pytest.approx(read_consumption_fingerprint(session, METER_ID))
+    _assert_grid_matches_sql(session)
+
+def test_patch_grid_without_cache_does_nothing(tmp_path):
+    patch_grid(METER_ID, np.array([np.datetime64(START)]), np.array([1.0]), root=str(tmp_path))
+    assert open_grid(METER_ID, root=str(tmp_path)) is None
+
+def test_patch_grid_keeps_header_hp_bounds(tmp_path):
+    root = str(tmp_path)
+    starts = pd.date_range(START, periods=48, freq="30min").to_numpy()
+    rebuild_grid(METER_ID, starts, np.ones(48), root=root, hp_start=time(8), hp_end=time(20))
+    patch_grid(METER_ID, starts[:1] - np.timedelta64(1, 'D'), np.array([2.0]), root=root)
+
+    sums = range_sums(METER_ID, root=root)
+    assert sums['total'] == pytest.approx(50.0)
+    assert sums['hp'] == pytest.approx(24.0)
+
+def test_ensure_grid_follows_source_and_hp_bounds(session, monkeypatch):
+    ensure_consumption_grid(session, METER_ID)
+
+    # Écriture hors des imports : rattrapée à la vérification suivante
+    session.add(ConsumptionRecord(
+        meter_id=METER_ID, start_time=datetime(2024, 1, 1, 2, 30), end_time=datetime(2024, 1, 1, 3), consumption_kwh=9.0
+    ))
+    session.commit()
+    monkeypatch.setattr(db.grid_cache, "GRID_VERIFY_SECONDS", 0.0)
+    _assert_grid_matches_sql(session)
+
+    # Heures pleines modifiées dans les paramètres : sommes cumulées reconstruites
+    settings = get_or_create_settings(session)
+    settings.hp_start, settings.hp_end = time(22), time(6)
+    session.commit()
+    monkeypatch.setattr(db.grid_cache, "GRID_VERIFY_SECONDS", 60.0)
+    _assert_grid_matches_sql(session)
+
+def test_calculations_read_grid_when_enabled(session, monkeypatch):
+    expected = [_sql_sums(session, start_dt, end_dt, True) for start_dt, end_dt in WINDOWS]
+    monkeypatch.setattr(analytics.calculations, "GRID_CACHE_ENABLED", True)
+    actual = [_sql_sums(session, start_dt, end_dt, True) for start_dt, end_dt in WINDOWS]
+
+    assert open_grid(METER_ID) is not None
+    for actual_sums, expected_sums in zip(actual, expected):
+        assert actual_sums == pytest.approx(expected_sums)
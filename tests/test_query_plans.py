@@ -0,0 +1,45 @@
+# tests/test_query_plans.py
+"""
+Plans d'exécution (EXPLAIN QUERY PLAN) des requêtes chaudes de db.query_plans :
+chacune doit utiliser son index, sans parcours complet de table, sur une base
+vide comme sur une base remplie et analysée (ANALYZE).
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from db.database import get_engine, create_tables, migrate_schema, dispose_engines, ConsumptionRecord
+from db.query_plans import hot_queries, explain
+
+def _fill(engine):
+    """ Deux compteurs, un mois de demi-heures chacun, puis mise à jour des statistiques. """
+    start = datetime(2024, 1, 1)
+    rows = [
+        {'meter_id': meter_id, 'start_time': start + timedelta(minutes=30 * i),
+         'end_time': start + timedelta(minutes=30 * (i + 1)), 'consumption_kwh': 0.5}
+        for meter_id in ("default", "PDL001") for i in range(48 * 31)
+    ]
+    with engine.begin() as conn:
+        conn.execute(ConsumptionRecord.__table__.insert(), rows)
+        conn.execute(text("ANALYZE"))
+
+@pytest.fixture(params=["empty", "filled"])
+def engine(tmp_path, request):
+    engine = get_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    create_tables(engine)
+    if request.param == "filled":
+        _fill(engine)
+    migrate_schema(engine)
+    yield engine
+    dispose_engines()
+
+@pytest.mark.parametrize("name", list(hot_queries()))
+def test_hot_query_uses_expected_index(engine, name):
+    statement, expected_index = hot_queries()[name]
+    with engine.connect() as conn:
+        plan = explain(conn, statement)
+
+    assert any(expected_index in line for line in plan), plan
+    assert not any(line.startswith("SCAN") and "INDEX" not in line for line in plan), plan